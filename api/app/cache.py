@@ -0,0 +1,110 @@
+"""In-process caches for finished jobs and their presigned download URLs.
+
+Job records never change once a job is completed, or failed on its last
+delivery (earlier failures are retried), so they can be served from memory
+instead of DynamoDB.  Presigned URLs are reused until
+less than ``presign_refresh_fraction`` of their lifetime remains, so repeated
+polls of a finished job hand out the same URL instead of re-signing.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Callable, Hashable
+from typing import Any, Generic, TypeVar
+
+from app.settings import settings
+
+V = TypeVar("V")
+
+
+class TTLCache(Generic[V]):
+    """Thread-safe LRU cache bounded by entry count, with per-entry expiry."""
+
+    def __init__(
+        self,
+        max_entries: int,
+        ttl_seconds: float,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self._max_entries = max_entries
+        self._ttl = ttl_seconds
+        self._clock = clock
+        self._entries: OrderedDict[Hashable, tuple[float, V]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable) -> V | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, value = entry
+            if expires_at <= self._clock():
+                del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: Hashable, value: V, ttl_seconds: float | None = None) -> None:
+        ttl = self._ttl if ttl_seconds is None else ttl_seconds
+        with self._lock:
+            self._entries[key] = (self._clock() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+# Finished job records, keyed by job ID.
+terminal_jobs: TTLCache[dict[str, Any]] = TTLCache(
+    max_entries=settings.job_cache_max_entries,
+    ttl_seconds=settings.job_cache_ttl_seconds,
+)
+
+# Presigned download URLs, keyed by (object key, expires_in).
+download_urls: TTLCache[str] = TTLCache(
+    max_entries=settings.job_cache_max_entries,
+    ttl_seconds=settings.presign_expires_in,
+    clock=time.time,  # URL expiry is wall-clock time
+)
+
+
+def cached_download_url(
+    key: str,
+    sign: Callable[[str, int], str],
+    expires_in: int | None = None,
+) -> str:
+    """
+    Return a presigned GET URL for *key*, re-signing with *sign* only when
+    less than ``presign_refresh_fraction`` of its lifetime remains.
+    """
+    expires_in = settings.presign_expires_in if expires_in is None else expires_in
+    url = download_urls.get((key, expires_in))
+    if url is None:
+        url = sign(key, expires_in)
+        reuse_for = expires_in * (1 - settings.presign_refresh_fraction)
+        download_urls.put((key, expires_in), url, ttl_seconds=reuse_for)
+    return url
+
+
+def cache_stats() -> dict[str, dict[str, int]]:
+    return {"jobs": terminal_jobs.stats(), "download_urls": download_urls.stats()}
@@ -0,0 +1,26 @@
+"""Dedicated thread pool for blocking AWS calls made from async routes."""
+
+from __future__ import annotations
+
+import asyncio
+import functools
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+from typing import TypeVar
+
+from app.settings import settings
+
+T = TypeVar("T")
+
+# Kept separate from Starlette's default threadpool so slow AWS calls cannot
+# starve sync routes, and sized to match the boto3 connection pool.
+_executor = ThreadPoolExecutor(
+    max_workers=settings.aws_executor_workers,
+    thread_name_prefix="aws",
+)
+
+
+async def run_blocking(func: Callable[..., T], *args, **kwargs) -> T:
+    """Run a blocking call on the AWS executor without blocking the event loop."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, functools.partial(func, *args, **kwargs))
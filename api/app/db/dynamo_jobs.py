@@ -2,31 +2,116 @@
 
 from __future__ import annotations
 
+import asyncio
+import time
+from collections.abc import Sequence
 from typing import Any
 
-import boto3
+from boto3.dynamodb.types import TypeDeserializer
 from botocore.client import BaseClient
 
+from shared.aws import get_client
+from shared.iterutils import chunked
+
+from app.concurrency import run_blocking
 from app.settings import settings
 
 
+# BatchWriteItem accepts at most 25 put/delete requests per call.
+BATCH_WRITE_LIMIT = 25
+# BatchGetItem accepts at most 100 keys per call.
+BATCH_GET_LIMIT = 100
+# Attempts (with exponential backoff) before unprocessed items are an error.
+BATCH_MAX_ATTEMPTS = 5
+BATCH_BACKOFF_SECONDS = 0.05
+
+
 def get_dynamo_client() -> BaseClient:
-    kwargs: dict = {"region_name": settings.aws_region}
-    if settings.aws_endpoint_url:
-        kwargs["endpoint_url"] = settings.aws_endpoint_url
-    return boto3.client("dynamodb", **kwargs)
+    return get_client("dynamodb", settings)
+
+
+_deserializer = TypeDeserializer()
+
+
+def _job_item(
+    job_id: str,
+    status: str,
+    input_key: str,
+    styles: Sequence[str] | None = None,
+    quality: str | None = None,
+) -> dict:
+    item = {
+        "job_id": {"S": job_id},
+        "status": {"S": status},
+        "input_key": {"S": input_key},
+    }
+    if styles:
+        item["styles"] = {"L": [{"S": style} for style in styles]}
+    if quality:
+        item["quality"] = {"S": quality}
+    return item
+
+
+def _batch_write(requests: Sequence[dict]) -> None:
+    """Apply write requests with BatchWriteItem, retrying unprocessed items."""
+    client = get_dynamo_client()
+    table = settings.dynamodb_jobs_table
+    for chunk in chunked(requests, BATCH_WRITE_LIMIT):
+        pending: dict = {table: list(chunk)}
+        for attempt in range(BATCH_MAX_ATTEMPTS):
+            if attempt:
+                time.sleep(BATCH_BACKOFF_SECONDS * 2 ** (attempt - 1))
+            response = client.batch_write_item(RequestItems=pending)
+            pending = response.get("UnprocessedItems") or {}
+            if not pending:
+                break
+        else:
+            raise RuntimeError(
+                f"{len(pending[table])} job write(s) still unprocessed after "
+                f"{BATCH_MAX_ATTEMPTS} attempts"
+            )
 
 
-def put_job(job_id: str, status: str, input_key: str) -> None:
-    """Create a new job record in DynamoDB."""
+def put_job(
+    job_id: str,
+    status: str,
+    input_key: str,
+    styles: Sequence[str] | None = None,
+    quality: str | None = None,
+) -> None:
+    """Create a new job record in DynamoDB (*styles* for multi-style jobs)."""
     client = get_dynamo_client()
     client.put_item(
         TableName=settings.dynamodb_jobs_table,
-        Item={
-            "job_id": {"S": job_id},
-            "status": {"S": status},
-            "input_key": {"S": input_key},
-        },
+        Item=_job_item(job_id, status, input_key, styles, quality),
+    )
+
+
+def put_jobs(
+    jobs: Sequence[tuple[str, str]], status: str, quality: str | None = None
+) -> None:
+    """Create many job records from ``(job_id, input_key)`` pairs."""
+    _batch_write(
+        [
+            {"PutRequest": {"Item": _job_item(job_id, status, input_key, quality=quality)}}
+            for job_id, input_key in jobs
+        ]
+    )
+
+
+def delete_job(job_id: str) -> None:
+    """Delete a job record (used to roll back a partially created job)."""
+    client = get_dynamo_client()
+    client.delete_item(
+        TableName=settings.dynamodb_jobs_table,
+        Key={"job_id": {"S": job_id}},
+    )
+
+
+def delete_jobs(job_ids: Sequence[str]) -> None:
+    """Delete many job records (used to roll back a failed bulk creation)."""
+    _batch_write(
+        [{"DeleteRequest": {"Key": {"job_id": {"S": job_id}}}} for job_id in job_ids]
     )
 
 
@@ -40,4 +125,51 @@ def get_job(job_id: str) -> dict[str, Any] | None:
     item = response.get("Item")
     if item is None:
         return None
-    return {k: list(v.values())[0] for k, v in item.items()}
+    return _deserialize(item)
+
+
+def get_jobs(job_ids: Sequence[str]) -> dict[str, dict[str, Any]]:
+    """
+    Retrieve many job records with BatchGetItem, keyed by job ID.
+
+    Unknown IDs are simply absent from the result. Unprocessed keys are
+    retried with backoff.
+    """
+    client = get_dynamo_client()
+    table = settings.dynamodb_jobs_table
+    found: dict[str, dict[str, Any]] = {}
+    for chunk in chunked(list(dict.fromkeys(job_ids)), BATCH_GET_LIMIT):
+        pending: dict = {
+            table: {"Keys": [{"job_id": {"S": job_id}} for job_id in chunk]}
+        }
+        for attempt in range(BATCH_MAX_ATTEMPTS):
+            if attempt:
+                time.sleep(BATCH_BACKOFF_SECONDS * 2 ** (attempt - 1))
+            response = client.batch_get_item(RequestItems=pending)
+            for item in response.get("Responses", {}).get(table, []):
+                record = _deserialize(item)
+                found[record["job_id"]] = record
+            pending = response.get("UnprocessedKeys") or {}
+            if not pending:
+                break
+        else:
+            raise RuntimeError(
+                f"{len(pending[table]['Keys'])} job read(s) still unprocessed after "
+                f"{BATCH_MAX_ATTEMPTS} attempts"
+            )
+    return found
+
+
+async def get_jobs_async(job_ids: Sequence[str]) -> dict[str, dict[str, Any]]:
+    """Async :func:`get_jobs` that issues its BatchGetItem chunks concurrently."""
+    chunks = await asyncio.gather(
+        *(
+            run_blocking(get_jobs, chunk)
+            for chunk in chunked(list(dict.fromkeys(job_ids)), BATCH_GET_LIMIT)
+        )
+    )
+    return {job_id: item for chunk in chunks for job_id, item in chunk.items()}
+
+
+def _deserialize(item: dict) -> dict[str, Any]:
+    return {k: _deserializer.deserialize(v) for k, v in item.items()}
@@ -1,19 +1,50 @@
 """FastAPI application entry-point."""
 
-from fastapi import FastAPI
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, Response
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+
+from shared import memory
+
+from app.cache import cache_stats
+from app.metrics import MetricsMiddleware
+from app.routes import blobs, jobs, uploads
+from app.settings import settings
+from app.watcher import job_watcher
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    job_watcher.start()
+    yield
+    await job_watcher.stop()
 
-from app.routes import jobs, uploads
 
 app = FastAPI(
     title="TrueTone API",
     description="Submit greyscale images for AI-driven colourisation.",
     version="0.1.0",
+    lifespan=lifespan,
 )
 
+app.add_middleware(MetricsMiddleware)
 app.include_router(uploads.router)
 app.include_router(jobs.router)
 
+if settings.aws_backend == "memory":
+    # Presigned URLs from the in-process backend resolve to these routes.
+    memory.store.blob_url = settings.memory_blob_url.rstrip("/")
+    app.include_router(blobs.router)
+
 
 @app.get("/health", tags=["health"])
 def health() -> dict:
-    return {"status": "ok"}
+    return {"status": "ok", "cache": cache_stats()}
+
+
+@app.get("/metrics", tags=["health"], include_in_schema=False)
+def metrics() -> Response:
+    """Prometheus exposition of request and cache metrics."""
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
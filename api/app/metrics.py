@@ -0,0 +1,81 @@
+"""Prometheus metrics for the API: request latency and in-process cache stats."""
+
+from __future__ import annotations
+
+import time
+from collections.abc import Iterator
+
+from prometheus_client import REGISTRY, Counter, Histogram
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.cache import cache_stats
+
+request_seconds = Histogram(
+    "truetone_api_request_seconds",
+    "HTTP request latency",
+    ["method", "route"],
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0),
+)
+requests_total = Counter(
+    "truetone_api_requests_total",
+    "HTTP requests, by response status",
+    ["method", "route", "status"],
+)
+
+# Long-lived responses would swamp the latency histogram.
+_UNTIMED_ROUTES = frozenset({"/jobs/stream", "/jobs/{job_id}/wait", "/metrics"})
+
+
+class MetricsMiddleware:
+    """ASGI middleware: count every request and time the short-lived ones."""
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status = 500
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            # Label by route template, not raw path, to keep cardinality bounded.
+            route = getattr(scope.get("route"), "path", "unmatched")
+            method = scope["method"]
+            requests_total.labels(method, route, status).inc()
+            if route not in _UNTIMED_ROUTES:
+                request_seconds.labels(method, route).observe(time.perf_counter() - start)
+
+
+class CacheCollector:
+    """Export the job and presigned-URL cache counters at scrape time."""
+
+    def collect(self) -> Iterator[CounterMetricFamily | GaugeMetricFamily]:
+        stats = cache_stats()
+        size = GaugeMetricFamily("truetone_api_cache_entries", "Cached entries", labels=["cache"])
+        counters = {
+            name: CounterMetricFamily(
+                f"truetone_api_cache_{name}", f"Cache {name}", labels=["cache"]
+            )
+            for name in ("hits", "misses", "evictions")
+        }
+        for cache, values in stats.items():
+            size.add_metric([cache], values["size"])
+            for name, family in counters.items():
+                family.add_metric([cache], values[name])
+        yield size
+        yield from counters.values()
+
+
+REGISTRY.register(CacheCollector())
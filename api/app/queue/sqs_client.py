@@ -3,26 +3,147 @@
 from __future__ import annotations
 
 import json
+import time
+from collections.abc import Sequence
 
-import boto3
 from botocore.client import BaseClient
 
+from shared.aws import get_client
+from shared.iterutils import chunked
+
 from app.settings import settings
 
+# SendMessageBatch accepts at most 10 entries per call.
+SEND_BATCH_LIMIT = 10
+# Attempts (with exponential backoff) before failed entries are an error.
+SEND_MAX_ATTEMPTS = 5
+SEND_BACKOFF_SECONDS = 0.05
+
+
+class EnqueueError(RuntimeError):
+    """A bulk send that left the jobs in ``job_ids`` unqueued."""
+
+    def __init__(self, message: str, job_ids: list[str]) -> None:
+        super().__init__(message)
+        self.job_ids = job_ids
+
+
+def queue_url(lane: str) -> str:
+    """The queue URL of *lane*; unconfigured lanes fall back to the standard queue."""
+    urls = {
+        "interactive": settings.sqs_interactive_queue_url,
+        "bulk": settings.sqs_bulk_queue_url,
+    }
+    return urls.get(lane) or settings.sqs_queue_url
+
+
+def choose_lane(
+    quality: str | None,
+    styles: int = 1,
+    content_length: int | None = None,
+) -> str:
+    """
+    Pick a single job's lane from cheap cost estimates, shortest jobs first.
+
+    Inputs declared larger than ``lane_bulk_min_bytes`` go to ``bulk``.
+    Single-style jobs that are drafts or declared no larger than
+    ``lane_interactive_max_bytes`` go to ``interactive``, unless they are
+    high quality. Everything else, including jobs without a size, is
+    ``standard``. (Batch uploads always go to ``bulk``.)
+    """
+    if (content_length or 0) > settings.lane_bulk_min_bytes:
+        return "bulk"
+    small = content_length is not None and content_length <= settings.lane_interactive_max_bytes
+    if styles == 1 and quality != "high" and (quality == "draft" or small):
+        return "interactive"
+    return "standard"
+
 
 def get_sqs_client() -> BaseClient:
-    kwargs: dict = {"region_name": settings.aws_region}
-    if settings.aws_endpoint_url:
-        kwargs["endpoint_url"] = settings.aws_endpoint_url
-    return boto3.client("sqs", **kwargs)
+    return get_client("sqs", settings)
 
 
-def enqueue_job(job_id: str, input_key: str, style: str) -> None:
-    """Send a job message to the SQS queue."""
+def _job_message(
+    job_id: str,
+    input_key: str,
+    style: str,
+    styles: Sequence[str] | None = None,
+    quality: str | None = None,
+) -> str:
+    body: dict = {"job_id": job_id, "input_key": input_key, "style": style}
+    if styles:
+        body["styles"] = list(styles)
+    if quality:
+        body["quality"] = quality
+    return json.dumps(body)
+
+
+def enqueue_job(
+    job_id: str,
+    input_key: str,
+    style: str,
+    styles: Sequence[str] | None = None,
+    quality: str | None = None,
+    lane: str = "standard",
+) -> None:
+    """Send a job message to *lane*'s queue (*styles* for multi-style jobs)."""
     client = get_sqs_client()
     client.send_message(
-        QueueUrl=settings.sqs_queue_url,
-        MessageBody=json.dumps(
-            {"job_id": job_id, "input_key": input_key, "style": style}
-        ),
+        QueueUrl=queue_url(lane),
+        MessageBody=_job_message(job_id, input_key, style, styles, quality),
+    )
+
+
+def enqueue_jobs(
+    jobs: Sequence[tuple[str, str, str]],
+    quality: str | None = None,
+    lane: str = "bulk",
+) -> None:
+    """
+    Send many job messages from ``(job_id, input_key, style)`` tuples, all
+    with the same *quality* tier, to *lane*'s queue.
+
+    Messages go out with SendMessageBatch; entries that fail on the service
+    side are retried, while sender faults are raised immediately. Any
+    failure raises :class:`EnqueueError` naming every job left unqueued.
+    """
+    client = get_sqs_client()
+    chunks = list(chunked(jobs, SEND_BATCH_LIMIT))
+    for index, chunk in enumerate(chunks):
+        entries = [
+            {"Id": str(i), "MessageBody": _job_message(*job, quality=quality)}
+            for i, job in enumerate(chunk)
+        ]
+        try:
+            _send_batch(client, queue_url(lane), entries)
+        except Exception as exc:
+            unsent = [chunk[int(entry["Id"])][0] for entry in entries]
+            unsent += [job[0] for later in chunks[index + 1 :] for job in later]
+            raise EnqueueError(str(exc), unsent) from exc
+
+
+def _send_batch(client: BaseClient, url: str, entries: list[dict]) -> None:
+    """
+    Send one SendMessageBatch chunk, retrying service-side failures.
+
+    *entries* is narrowed in place to the entries not yet sent, so that a
+    caller catching the error knows which ones never went out.
+    """
+    for attempt in range(SEND_MAX_ATTEMPTS):
+        if attempt:
+            time.sleep(SEND_BACKOFF_SECONDS * 2 ** (attempt - 1))
+        response = client.send_message_batch(QueueUrl=url, Entries=entries)
+        failed = response.get("Failed", [])
+        failed_ids = {f["Id"] for f in failed}
+        entries[:] = [e for e in entries if e["Id"] in failed_ids]
+        if not failed:
+            return
+        sender_faults = [f for f in failed if f.get("SenderFault")]
+        if sender_faults:
+            raise RuntimeError(
+                f"SQS rejected {len(sender_faults)} message(s): "
+                f"{sender_faults[0].get('Message', sender_faults[0]['Code'])}"
+            )
+    raise RuntimeError(
+        f"{len(entries)} message(s) still failing after {SEND_MAX_ATTEMPTS} attempts"
     )
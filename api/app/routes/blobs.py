@@ -0,0 +1,36 @@
+"""Object upload/download routes standing in for S3 presigned URLs.
+
+Only mounted with the in-process backend (``AWS_BACKEND=memory``), where the
+"presigned" URLs handed to clients point here instead of at S3.
+"""
+
+from __future__ import annotations
+
+from botocore.exceptions import ClientError
+from fastapi import APIRouter, HTTPException, Request, Response
+
+from app.storage.s3_client import get_s3_client
+
+router = APIRouter(prefix="/blobs", tags=["blobs"], include_in_schema=False)
+
+
+@router.put("/{bucket}/{key:path}")
+async def put_blob(bucket: str, key: str, request: Request) -> Response:
+    """Store the request body under *key*, like a presigned PUT."""
+    get_s3_client().put_object(
+        Bucket=bucket,
+        Key=key,
+        Body=await request.body(),
+        ContentType=request.headers.get("content-type", "binary/octet-stream"),
+    )
+    return Response(status_code=200)
+
+
+@router.get("/{bucket}/{key:path}")
+def get_blob(bucket: str, key: str) -> Response:
+    """Return the object stored under *key*, like a presigned GET."""
+    try:
+        response = get_s3_client().get_object(Bucket=bucket, Key=key)
+    except ClientError as exc:
+        raise HTTPException(status_code=404, detail="Not found") from exc
+    return Response(response["Body"].read(), media_type=response["ContentType"])
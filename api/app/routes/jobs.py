@@ -2,32 +2,251 @@
 
 from __future__ import annotations
 
-from fastapi import APIRouter, HTTPException
+import asyncio
+import contextlib
+import time
+from collections.abc import AsyncIterator
+from typing import Any
 
-from app.db.dynamo_jobs import get_job
-from app.schemas.jobs import JobStatus, JobStatusResponse
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import StreamingResponse
+
+from app.cache import cached_download_url, terminal_jobs
+from app.db.dynamo_jobs import get_job, get_jobs_async
+from app.schemas.jobs import (
+    JobLookupRequest,
+    JobStatus,
+    JobStatusListResponse,
+    JobStatusResponse,
+    Quality,
+)
+from app.settings import settings
 from app.storage.s3_client import generate_presigned_download_url
+from app.watcher import is_final, job_watcher
 
 router = APIRouter(prefix="/jobs", tags=["jobs"])
 
 
-@router.get("/{job_id}", response_model=JobStatusResponse)
-def get_job_status(job_id: str) -> JobStatusResponse:
-    """Retrieve the current status of a colouring job."""
-    item = get_job(job_id)
+def _remember(item: dict[str, Any]) -> None:
+    if is_final(item):
+        terminal_jobs.put(item["job_id"], item)
+
+
+def _get_job_cached(job_id: str) -> dict[str, Any] | None:
+    item = terminal_jobs.get(job_id)
     if item is None:
-        raise HTTPException(status_code=404, detail="Job not found")
+        item = get_job(job_id)
+        if item is not None:
+            _remember(item)
+    return item
 
+
+async def _get_jobs_cached(job_ids: list[str]) -> dict[str, dict[str, Any]]:
+    """Serve finished jobs from memory and read only the rest from DynamoDB."""
+    items: dict[str, dict[str, Any]] = {}
+    missing: list[str] = []
+    for job_id in job_ids:
+        item = terminal_jobs.get(job_id)
+        if item is None:
+            missing.append(job_id)
+        else:
+            items[job_id] = item
+
+    if missing:
+        fetched = await get_jobs_async(missing)
+        for item in fetched.values():
+            _remember(item)
+        items.update(fetched)
+    return items
+
+
+def _to_response(
+    job_id: str, item: dict[str, Any], include_timings: bool = False
+) -> JobStatusResponse:
     status = JobStatus(item["status"])
     result_url: str | None = None
+    results: dict[str, str] | None = None
+    preview_url: str | None = None
+
+    if "preview_key" in item:
+        preview_url = cached_download_url(item["preview_key"], generate_presigned_download_url)
 
     if status == JobStatus.completed:
         output_key = item.get("output_key", f"outputs/{job_id}.jpg")
-        result_url = generate_presigned_download_url(output_key)
+        result_url = cached_download_url(output_key, generate_presigned_download_url)
+        if "output_keys" in item:
+            results = {
+                style: cached_download_url(key, generate_presigned_download_url)
+                for style, key in item["output_keys"].items()
+            }
 
     return JobStatusResponse(
         job_id=job_id,
         status=status,
         result_url=result_url,
+        results=results,
+        preview_url=preview_url,
+        quality=Quality(item.get("quality", Quality.standard.value)),
         error=item.get("error"),
+        timings=(
+            {stage: int(ms) for stage, ms in item["timings"].items()}
+            if include_timings and "timings" in item
+            else None
+        ),
+        peak_rss_mb=int(item["peak_rss_mb"]) if "peak_rss_mb" in item else None,
     )
+
+
+async def _lookup(job_ids: list[str], include_timings: bool = False) -> JobStatusListResponse:
+    job_ids = list(dict.fromkeys(job_ids))
+    if len(job_ids) > settings.batch_status_max_jobs:
+        raise HTTPException(
+            status_code=422,
+            detail=f"At most {settings.batch_status_max_jobs} job IDs per lookup",
+        )
+
+    try:
+        items = await _get_jobs_cached(job_ids)
+    except Exception as exc:
+        raise HTTPException(status_code=503, detail="Service temporarily unavailable") from exc
+
+    # Presigning is local signing with the shared client, so one pass is cheap.
+    return JobStatusListResponse(
+        jobs=[
+            _to_response(job_id, items[job_id], include_timings)
+            for job_id in job_ids
+            if job_id in items
+        ],
+        not_found=[job_id for job_id in job_ids if job_id not in items],
+    )
+
+
+def _parse_ids(ids: str) -> list[str]:
+    job_ids = [job_id for job_id in (part.strip() for part in ids.split(",")) if job_id]
+    if not job_ids:
+        raise HTTPException(status_code=422, detail="No job IDs given")
+    return job_ids
+
+
+@router.get("", response_model=JobStatusListResponse)
+async def list_job_statuses(
+    ids: str = Query(description="Comma-separated job IDs"),
+    include_timings: bool = Query(default=False, description="Add per-stage timings"),
+) -> JobStatusListResponse:
+    """Retrieve the status of many jobs in one round trip."""
+    return await _lookup(_parse_ids(ids), include_timings)
+
+
+@router.post("/lookup", response_model=JobStatusListResponse)
+async def lookup_job_statuses(
+    request: JobLookupRequest,
+    include_timings: bool = Query(default=False, description="Add per-stage timings"),
+) -> JobStatusListResponse:
+    """Body variant of ``GET /jobs?ids=...`` for long ID lists."""
+    return await _lookup(request.ids, include_timings)
+
+
+def _sse_event(response: JobStatusResponse) -> str:
+    return f"event: status\ndata: {response.model_dump_json()}\n\n"
+
+
+async def _stream_events(
+    job_ids: list[str], snapshot: dict[str, dict[str, Any]]
+) -> AsyncIterator[str]:
+    for job_id in job_ids:
+        yield _sse_event(_to_response(job_id, snapshot[job_id]))
+
+    deadline = time.monotonic() + settings.sse_max_seconds
+    async with job_watcher.subscribe(snapshot.values()) as subscription:
+        while not subscription.done:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = await asyncio.wait_for(
+                    subscription.updates.get(),
+                    timeout=min(remaining, settings.sse_keepalive_seconds),
+                )
+            except asyncio.TimeoutError:
+                # Comment line keeps proxies from closing an idle stream.
+                yield ": keepalive\n\n"
+                continue
+            yield _sse_event(_to_response(item["job_id"], item))
+    yield "event: end\ndata: {}\n\n"
+
+
+@router.get("/stream")
+async def stream_job_statuses(
+    ids: str = Query(description="Comma-separated job IDs"),
+) -> StreamingResponse:
+    """
+    Server-Sent Events stream of status changes for the given jobs.
+
+    Emits the current status of every job, then one ``status`` event per
+    change (a new preview counts as one), and an ``end`` event once all jobs
+    are completed or have failed for good (a failed job may still be retried).
+    """
+    job_ids = list(dict.fromkeys(_parse_ids(ids)))
+    if len(job_ids) > settings.batch_status_max_jobs:
+        raise HTTPException(
+            status_code=422,
+            detail=f"At most {settings.batch_status_max_jobs} job IDs per stream",
+        )
+    try:
+        snapshot = await _get_jobs_cached(job_ids)
+    except Exception as exc:
+        raise HTTPException(status_code=503, detail="Service temporarily unavailable") from exc
+    missing = [job_id for job_id in job_ids if job_id not in snapshot]
+    if missing:
+        raise HTTPException(status_code=404, detail=f"Jobs not found: {', '.join(missing)}")
+
+    return StreamingResponse(
+        _stream_events(job_ids, snapshot),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.get("/{job_id}/wait", response_model=JobStatusResponse)
+async def wait_for_job(
+    job_id: str,
+    timeout: float = Query(
+        default=20.0,
+        ge=0,
+        le=settings.long_poll_max_seconds,
+        description="Seconds to wait for the job to complete or fail for good",
+    ),
+    include_timings: bool = Query(default=False, description="Add per-stage timings"),
+) -> JobStatusResponse:
+    """
+    Long-poll a job: return as soon as it completes or fails with no retry
+    left, or with its current status once *timeout* elapses.
+    """
+    try:
+        snapshot = await _get_jobs_cached([job_id])
+    except Exception as exc:
+        raise HTTPException(status_code=503, detail="Service temporarily unavailable") from exc
+    item = snapshot.get(job_id)
+    if item is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    async with job_watcher.subscribe([item]) as subscription:
+        with contextlib.suppress(asyncio.TimeoutError):
+            async with asyncio.timeout(timeout):
+                while not subscription.done:
+                    item = await subscription.updates.get()
+
+    return _to_response(job_id, item, include_timings)
+
+
+@router.get("/{job_id}", response_model=JobStatusResponse)
+def get_job_status(
+    job_id: str,
+    include_timings: bool = Query(default=False, description="Add per-stage timings"),
+) -> JobStatusResponse:
+    """Retrieve the current status of a colouring job."""
+    item = _get_job_cached(job_id)
+    if item is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    return _to_response(job_id, item, include_timings)
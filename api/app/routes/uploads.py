@@ -2,41 +2,224 @@
 
 from __future__ import annotations
 
+import asyncio
 import uuid
+from typing import Optional
 
 from fastapi import APIRouter, HTTPException, Query
 
-from app.db.dynamo_jobs import put_job
-from app.queue.sqs_client import enqueue_job
-from app.schemas.jobs import JobCreateResponse, JobStatus
+from shared.iterutils import chunked
+from shared.logging import get_logger
+
+from app.concurrency import run_blocking
+from app.db.dynamo_jobs import (
+    BATCH_WRITE_LIMIT,
+    delete_job,
+    delete_jobs,
+    put_job,
+    put_jobs,
+)
+from app.queue.sqs_client import (
+    SEND_BATCH_LIMIT,
+    EnqueueError,
+    choose_lane,
+    enqueue_job,
+    enqueue_jobs,
+)
+from app.schemas.jobs import (
+    BatchJobCreateResponse,
+    BatchUploadRequest,
+    JobCreateResponse,
+    JobStatus,
+    Quality,
+    Style,
+)
 from app.settings import settings
 from app.storage.s3_client import generate_presigned_upload_url
 
+logger = get_logger(__name__)
+
 router = APIRouter(prefix="/uploads", tags=["uploads"])
 
 
+async def _rollback(job_id: str, put_result: object, send_result: object) -> None:
+    """Undo whichever half of job creation succeeded."""
+    if not isinstance(put_result, BaseException):
+        # Record written but nothing queued: remove it so it never sits pending.
+        try:
+            await run_blocking(delete_job, job_id)
+        except Exception:
+            logger.exception("Rollback of job %s record failed", job_id)
+    elif not isinstance(send_result, BaseException):
+        # Queued without a record: SQS messages cannot be recalled. The worker
+        # waits for a record to appear, as it does for a late upload, and
+        # discards the message once the upload window has passed.
+        logger.warning("Job %s enqueued without a record; worker will discard it", job_id)
+
+
 @router.post("", response_model=JobCreateResponse, status_code=201)
-def create_upload(
-    style: str = Query(default="natural", description="Target colour style"),
+async def create_upload(
+    style: Style = Query(default=Style.natural, description="Target colour style"),
+    styles: Optional[list[Style]] = Query(
+        default=None,
+        description="Render the one input in several styles (overrides *style*)",
+    ),
+    quality: Quality = Query(
+        default=Quality.standard,
+        description="Speed/quality tier: draft renders several times faster",
+    ),
+    content_length: Optional[int] = Query(
+        default=None,
+        ge=0,
+        description="Size of the image to be uploaded, in bytes (a scheduling hint)",
+    ),
 ) -> JobCreateResponse:
     """
     Create a new colouring job.
 
     Returns a pre-signed S3 PUT URL so the client can upload the image
-    directly to S3, and a *job_id* to poll for results.
+    directly to S3, and a *job_id* to poll for results. Passing *styles*
+    several times creates a multi-style job: the worker downloads and
+    segments the input once and renders every style in one batched call.
+    *quality* selects the worker's scheduler, step count and guidance scale.
+    Drafts and small images (by *content_length*) are queued ahead of
+    larger or slower jobs.
     """
+    job_styles = [s.value for s in dict.fromkeys(styles)] if styles else [style.value]
+    if len(job_styles) > settings.max_styles_per_job:
+        raise HTTPException(
+            status_code=422,
+            detail=f"At most {settings.max_styles_per_job} styles per job",
+        )
+    multi_styles = job_styles if len(job_styles) > 1 else None
+    lane = choose_lane(quality.value, len(job_styles), content_length)
+
     job_id = str(uuid.uuid4())
     input_key = f"inputs/{job_id}.jpg"
 
     try:
+        # Presigning is local signing with the cached client – no network.
         upload_url = generate_presigned_upload_url(input_key)
-        put_job(job_id=job_id, status=JobStatus.pending.value, input_key=input_key)
-        enqueue_job(job_id=job_id, input_key=input_key, style=style)
     except Exception as exc:
         raise HTTPException(status_code=503, detail="Service temporarily unavailable") from exc
 
+    put_result, send_result = await asyncio.gather(
+        run_blocking(
+            put_job,
+            job_id=job_id,
+            status=JobStatus.pending.value,
+            input_key=input_key,
+            styles=multi_styles,
+            quality=quality.value,
+        ),
+        run_blocking(
+            enqueue_job,
+            job_id=job_id,
+            input_key=input_key,
+            style=job_styles[0],
+            styles=multi_styles,
+            quality=quality.value,
+            lane=lane,
+        ),
+        return_exceptions=True,
+    )
+    for result in (put_result, send_result):
+        if isinstance(result, BaseException):
+            await _rollback(job_id, put_result, send_result)
+            raise HTTPException(
+                status_code=503, detail="Service temporarily unavailable"
+            ) from result
+
     return JobCreateResponse(
         job_id=job_id,
         upload_url=upload_url,
         status=JobStatus.pending,
+        styles=job_styles,
+        quality=quality,
+    )
+
+
+async def _rollback_batch(job_ids: list[str]) -> None:
+    """Remove the records of batch jobs that were never queued."""
+    try:
+        await run_blocking(delete_jobs, job_ids)
+    except Exception:
+        logger.exception("Rollback of %d batch job record(s) failed", len(job_ids))
+
+
+@router.post("/batch", response_model=BatchJobCreateResponse, status_code=201)
+async def create_upload_batch(request: BatchUploadRequest) -> BatchJobCreateResponse:
+    """
+    Create many colouring jobs in one call (e.g. a photo album).
+
+    Records are written with BatchWriteItem and messages sent with
+    SendMessageBatch to the bulk lane, so that large batches do not hold up
+    interactive jobs; chunks are issued concurrently. Every record is
+    written before any message is sent. If a write fails, every record is
+    rolled back; if a send fails, only the records of the jobs left
+    unqueued are, since the others may already be with a worker. Either
+    way the request fails as a whole.
+    """
+    # Checked before job_styles(), which would expand a huge *count* in memory.
+    if request.job_count() > settings.batch_upload_max_jobs:
+        raise HTTPException(
+            status_code=422,
+            detail=f"At most {settings.batch_upload_max_jobs} jobs per batch",
+        )
+    styles = request.job_styles()
+
+    job_ids = [str(uuid.uuid4()) for _ in styles]
+    input_keys = [f"inputs/{job_id}.jpg" for job_id in job_ids]
+
+    try:
+        upload_urls = [generate_presigned_upload_url(key) for key in input_keys]
+    except Exception as exc:
+        raise HTTPException(status_code=503, detail="Service temporarily unavailable") from exc
+
+    records = list(zip(job_ids, input_keys))
+    results = await asyncio.gather(
+        *(
+            run_blocking(put_jobs, chunk, JobStatus.pending.value, request.quality.value)
+            for chunk in chunked(records, BATCH_WRITE_LIMIT)
+        ),
+        return_exceptions=True,
+    )
+    errors = [r for r in results if isinstance(r, BaseException)]
+    if errors:
+        await _rollback_batch(job_ids)
+        raise HTTPException(
+            status_code=503, detail="Service temporarily unavailable"
+        ) from errors[0]
+
+    message_chunks = list(chunked(list(zip(job_ids, input_keys, styles)), SEND_BATCH_LIMIT))
+    results = await asyncio.gather(
+        *(run_blocking(enqueue_jobs, chunk, request.quality.value) for chunk in message_chunks),
+        return_exceptions=True,
+    )
+    unsent: list[str] = []
+    for chunk, result in zip(message_chunks, results):
+        if isinstance(result, EnqueueError):
+            unsent += result.job_ids
+        elif isinstance(result, BaseException):
+            unsent += [job_id for job_id, _, _ in chunk]
+    errors = [r for r in results if isinstance(r, BaseException)]
+    if errors:
+        logger.warning(
+            "Batch of %d job(s) failed with %d unqueued", len(job_ids), len(unsent)
+        )
+        await _rollback_batch(unsent)
+        raise HTTPException(
+            status_code=503, detail="Service temporarily unavailable"
+        ) from errors[0]
+
+    return BatchJobCreateResponse(
+        jobs=[
+            JobCreateResponse(
+                job_id=job_id,
+                upload_url=url,
+                status=JobStatus.pending,
+                quality=request.quality,
+            )
+            for job_id, url in zip(job_ids, upload_urls)
+        ]
     )
@@ -5,7 +5,7 @@ from __future__ import annotations
 from enum import Enum
 from typing import Optional
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, model_validator
 
 
 class JobStatus(str, Enum):
@@ -15,10 +15,64 @@ class JobStatus(str, Enum):
     failed = "failed"
 
 
+class Quality(str, Enum):
+    """Speed/quality tier: fewer, cheaper denoising steps for drafts."""
+
+    draft = "draft"
+    standard = "standard"
+    high = "high"
+
+
+class Style(str, Enum):
+    """Target colour style; mirrors the worker's ``STYLE_PROMPTS``."""
+
+    natural = "natural"
+    vivid = "vivid"
+    vintage = "vintage"
+    cool = "cool"
+    warm = "warm"
+
+
 class JobCreateResponse(BaseModel):
     job_id: str
     upload_url: str = Field(description="Pre-signed S3 URL for image upload")
     status: JobStatus = JobStatus.pending
+    styles: Optional[list[str]] = Field(
+        default=None, description="Styles the job will be rendered in"
+    )
+    quality: Quality = Quality.standard
+
+
+class BatchUploadRequest(BaseModel):
+    """Create several jobs at once: either one per entry in *styles*, or *count* jobs of *style*."""
+
+    styles: Optional[list[Style]] = Field(
+        default=None, min_length=1, description="Target colour style for each job"
+    )
+    count: Optional[int] = Field(
+        default=None, ge=1, description="Number of jobs to create with *style*"
+    )
+    style: Style = Field(default=Style.natural, description="Style used with *count*")
+    quality: Quality = Field(default=Quality.standard, description="Tier for every job")
+
+    @model_validator(mode="after")
+    def _styles_or_count(self) -> BatchUploadRequest:
+        if (self.styles is None) == (self.count is None):
+            raise ValueError("Provide exactly one of 'styles' or 'count'")
+        return self
+
+    def job_count(self) -> int:
+        """Number of jobs requested, without building the list of styles."""
+        return len(self.styles) if self.styles is not None else self.count
+
+    def job_styles(self) -> list[str]:
+        if self.styles is not None:
+            return [style.value for style in self.styles]
+        return [self.style.value] * self.count
+
+
+class BatchJobCreateResponse(BaseModel):
+    jobs: list[JobCreateResponse]
 
 
 class JobStatusResponse(BaseModel):
@@ -28,4 +82,32 @@ class JobStatusResponse(BaseModel):
         default=None,
         description="Pre-signed S3 URL for the processed image (when completed)",
     )
+    results: Optional[dict[str, str]] = Field(
+        default=None,
+        description="Multi-style jobs: pre-signed S3 URL per style (when completed)",
+    )
+    preview_url: Optional[str] = Field(
+        default=None,
+        description="Pre-signed S3 URL for a low-res preview, available while processing",
+    )
+    quality: Quality = Quality.standard
     error: Optional[str] = None
+    timings: Optional[dict[str, int]] = Field(
+        default=None,
+        description="Milliseconds per pipeline stage (with include_timings, once finished)",
+    )
+    peak_rss_mb: Optional[int] = Field(
+        default=None,
+        description="Peak memory of the worker process while the job ran, in MiB (once finished)",
+    )
+
+
+class JobLookupRequest(BaseModel):
+    ids: list[str] = Field(min_length=1, description="Job IDs to look up")
+
+
+class JobStatusListResponse(BaseModel):
+    jobs: list[JobStatusResponse]
+    not_found: list[str] = Field(
+        default_factory=list, description="Requested IDs with no job record"
+    )
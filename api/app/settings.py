@@ -1,5 +1,7 @@
 """API application settings loaded from environment variables."""
 
+from typing import Literal
+
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
@@ -15,11 +17,58 @@ class Settings(BaseSettings):
     # DynamoDB
     dynamodb_jobs_table: str = "truetone-jobs"
 
-    # SQS
+    # SQS: sqs_queue_url is the "standard" lane; jobs are routed to the
+    # optional interactive and bulk lanes when their URLs are set (see
+    # app/queue/sqs_client.py for the rules)
     sqs_queue_url: str = ""
+    sqs_interactive_queue_url: str = ""
+    sqs_bulk_queue_url: str = ""
+    # Declared upload sizes (content_length) at or below which a job counts as
+    # interactive, and above which it goes to the bulk lane
+    lane_interactive_max_bytes: int = 2_000_000
+    lane_bulk_min_bytes: int = 8_000_000
+
+    # Maximum number of styles in one multi-style job
+    max_styles_per_job: int = 8
+
+    # Maximum number of jobs accepted by POST /uploads/batch
+    batch_upload_max_jobs: int = 500
+
+    # Maximum number of IDs accepted by the batch job status lookup
+    batch_status_max_jobs: int = 200
+
+    # Terminal job cache and presigned download URL reuse
+    job_cache_max_entries: int = 10_000
+    job_cache_ttl_seconds: float = 3600.0
+    presign_expires_in: int = 3600
+    # Re-sign a cached URL once less than this share of its lifetime remains
+    presign_refresh_fraction: float = 0.5
+
+    # Long-poll / SSE: watcher tick, longest wait and stream lifetimes
+    job_watch_interval_seconds: float = 1.0
+    long_poll_max_seconds: float = 60.0
+    sse_max_seconds: float = 900.0
+    sse_keepalive_seconds: float = 15.0
 
     # Optional LocalStack / custom endpoint for local dev
     aws_endpoint_url: str | None = None
 
+    # "memory" replaces S3, DynamoDB and SQS with in-process stand-ins (see
+    # shared/memory.py and run_local.py); presigned URLs then point at this
+    # API's /blobs routes under memory_blob_url.
+    aws_backend: Literal["boto3", "memory"] = "boto3"
+    memory_blob_url: str = "http://127.0.0.1:8000/blobs"
+
+    # Shared boto3 client tuning (see shared/aws.py)
+    aws_max_pool_connections: int = 50
+    aws_connect_timeout: float = 5.0
+    aws_read_timeout: float = 60.0
+    aws_retry_mode: Literal["legacy", "standard", "adaptive"] = "standard"
+    aws_max_attempts: int = 3
+    aws_tcp_keepalive: bool = True
+
+    # Threads for blocking AWS calls issued from async routes
+    aws_executor_workers: int = 50
+
 
 settings = Settings()
@@ -2,18 +2,16 @@
 
 from __future__ import annotations
 
-import boto3
 from botocore.client import BaseClient
 
+from shared.aws import get_client
+
 from app.settings import settings
 
 
 def get_s3_client() -> BaseClient:
-    """Return a boto3 S3 client, optionally pointed at a local endpoint."""
-    kwargs: dict = {"region_name": settings.aws_region}
-    if settings.aws_endpoint_url:
-        kwargs["endpoint_url"] = settings.aws_endpoint_url
-    return boto3.client("s3", **kwargs)
+    """Return the shared boto3 S3 client, optionally pointed at a local endpoint."""
+    return get_client("s3", settings)
 
 
 def generate_presigned_upload_url(key: str, expires_in: int = 3600) -> str:
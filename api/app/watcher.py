@@ -0,0 +1,138 @@
+"""Coalesced watcher that serves long-poll and SSE job subscriptions.
+
+Every API process runs a single background task.  On each tick it reads the
+union of all watched job IDs with one round of BatchGetItem calls and fans
+status (and preview) changes out to subscribers, so DynamoDB read traffic
+scales with the number of distinct jobs being watched rather than with the
+number of waiting clients or their poll rate.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import contextlib
+from collections.abc import AsyncIterator, Iterable
+from typing import Any
+
+from shared.logging import get_logger
+
+from app.cache import terminal_jobs
+from app.db.dynamo_jobs import get_jobs_async
+from app.schemas.jobs import JobStatus
+from app.settings import settings
+
+logger = get_logger(__name__)
+
+
+def is_final(item: dict[str, Any]) -> bool:
+    """
+    Whether a job record will not change again: completed, or failed with
+    no retry left (the worker retries other failures on redelivery).
+    """
+    if item["status"] == JobStatus.completed.value:
+        return True
+    return item["status"] == JobStatus.failed.value and bool(item.get("final"))
+
+
+def _version(item: dict[str, Any]) -> tuple[str, str | None, bool]:
+    """What subscribers are told about: status changes, a new preview and finality."""
+    return item["status"], item.get("preview_key"), is_final(item)
+
+
+class Subscription:
+    """Status changes for a set of jobs, delivered through :attr:`updates`."""
+
+    def __init__(self, snapshot: Iterable[dict[str, Any]]) -> None:
+        self.pending: set[str] = set()
+        self.updates: asyncio.Queue[dict[str, Any]] = asyncio.Queue()
+        self._last_seen: dict[str, tuple[str, str | None, bool]] = {}
+        for item in snapshot:
+            self._last_seen[item["job_id"]] = _version(item)
+            if not is_final(item):
+                self.pending.add(item["job_id"])
+
+    @property
+    def done(self) -> bool:
+        return not self.pending
+
+    def offer(self, item: dict[str, Any]) -> None:
+        """Queue *item* if its status or preview differs from the last one seen."""
+        job_id = item["job_id"]
+        version = _version(item)
+        if self._last_seen.get(job_id) == version:
+            return
+        self._last_seen[job_id] = version
+        if is_final(item):
+            self.pending.discard(job_id)
+        self.updates.put_nowait(item)
+
+
+class JobWatcher:
+    """Poll the jobs table once per tick on behalf of every subscriber."""
+
+    def __init__(self, interval_seconds: float) -> None:
+        self._interval = interval_seconds
+        self._subscriptions: set[Subscription] = set()
+        self._wakeup = asyncio.Event()
+        self._task: asyncio.Task | None = None
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(), name="job-watcher")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+
+    @contextlib.asynccontextmanager
+    async def subscribe(
+        self, snapshot: Iterable[dict[str, Any]]
+    ) -> AsyncIterator[Subscription]:
+        """
+        Watch the jobs in *snapshot* for the lifetime of the context.
+
+        *snapshot* holds the records the caller has already seen; only later
+        status changes are delivered.
+        """
+        subscription = Subscription(snapshot)
+        self._subscriptions.add(subscription)
+        self._wakeup.set()
+        try:
+            yield subscription
+        finally:
+            self._subscriptions.discard(subscription)
+
+    async def _run(self) -> None:
+        while True:
+            if not self._subscriptions:
+                await self._wakeup.wait()
+                self._wakeup.clear()
+
+            # Subscribers arrive with a fresh snapshot, so sleeping first never
+            # delays news and keeps reads at one round per interval.
+            await asyncio.sleep(self._interval)
+            try:
+                await self._tick()
+            except Exception:
+                logger.exception("Job watcher tick failed")
+
+    async def _tick(self) -> None:
+        subscriptions = list(self._subscriptions)
+        job_ids = {job_id for sub in subscriptions for job_id in sub.pending}
+        if not job_ids:
+            return
+        items = await get_jobs_async(list(job_ids))
+        for item in items.values():
+            if is_final(item):
+                terminal_jobs.put(item["job_id"], item)
+        for sub in subscriptions:
+            for job_id in list(sub.pending):
+                item = items.get(job_id)
+                if item is not None:
+                    sub.offer(item)
+
+
+job_watcher = JobWatcher(interval_seconds=settings.job_watch_interval_seconds)
@@ -0,0 +1,128 @@
+"""Compare inference backends: load time, seconds per denoising step, peak RSS.
+
+Each backend runs in its own subprocess so peak RSS and torch/ONNX Runtime
+state do not leak between measurements.  Usage (from the repository root)::
+
+    python benchmarks/bench_backends.py --backends eager compile bf16 onnx --steps 20
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import resource
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path[:0] = [str(ROOT), str(ROOT / "worker")]
+
+DEFAULT_MODEL = "runwayml/stable-diffusion-inpainting"
+
+
+def _peak_rss_mb() -> float:
+    # ru_maxrss is reported in KiB on Linux.
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _run_child(args: argparse.Namespace) -> dict:
+    import torch
+    from PIL import Image
+
+    from app.pipeline.backends import get_backend
+
+    torch.set_num_threads(args.threads or torch.get_num_threads())
+    device = "cuda" if torch.cuda.is_available() else "cpu"
+    width, height = args.size
+
+    start = time.perf_counter()
+    try:
+        backend = get_backend(args.child, device, args.onnx_cache_dir)
+    except RuntimeError as exc:
+        return {"backend": args.child, "error": str(exc)}
+    pipe = backend.load(args.model, device)
+    cond, uncond = backend.encode_prompt(pipe, "natural colours, photorealistic")
+    load_seconds = time.perf_counter() - start
+
+    image = Image.new("RGB", (width, height), (128, 128, 128))
+    mask = Image.new("L", (width, height), 0)
+    mask.paste(255, (width // 4, height // 4, 3 * width // 4, 3 * height // 4))
+
+    def call(steps: int) -> float:
+        begin = time.perf_counter()
+        with backend.inference_context():
+            pipe(
+                prompt_embeds=cond,
+                negative_prompt_embeds=uncond,
+                image=image,
+                mask_image=mask,
+                height=height,
+                width=width,
+                num_inference_steps=steps,
+            )
+        return time.perf_counter() - begin
+
+    # Warm-up covers compilation and allocator growth.
+    warmup_seconds = call(args.warmup_steps)
+    run_seconds = call(args.steps)
+    return {
+        "backend": args.child,
+        "device": device,
+        "load_seconds": round(load_seconds, 2),
+        "warmup_seconds": round(warmup_seconds, 2),
+        "seconds_per_step": round(run_seconds / args.steps, 4),
+        "peak_rss_mb": round(_peak_rss_mb(), 1),
+    }
+
+
+def _parse_size(text: str) -> tuple[int, int]:
+    width, height = text.lower().split("x")
+    return int(width), int(height)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--backends", nargs="+", default=["eager", "compile", "bf16", "onnx"])
+    parser.add_argument("--model", default=DEFAULT_MODEL)
+    parser.add_argument("--size", type=_parse_size, default=(512, 512))
+    parser.add_argument("--steps", type=int, default=20)
+    parser.add_argument("--warmup-steps", type=int, default=2)
+    parser.add_argument("--threads", type=int, default=0, help="torch threads (0 = default)")
+    parser.add_argument("--onnx-cache-dir", default="~/.cache/truetone/onnx")
+    parser.add_argument("--json", type=Path, help="Also write results to this file")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(_run_child(args)))
+        return
+
+    results = []
+    for name in args.backends:
+        command = [sys.executable, __file__, "--child", name, *sys.argv[1:]]
+        proc = subprocess.run(command, capture_output=True, text=True)
+        lines = proc.stdout.strip().splitlines()
+        if proc.returncode != 0 or not lines:
+            stderr = proc.stderr.strip().splitlines() or ["no output"]
+            result = {"backend": name, "error": stderr[-1]}
+        else:
+            result = json.loads(lines[-1])
+        results.append(result)
+
+    print(f"{'backend':>8} {'load s':>8} {'warmup s':>9} {'s/step':>8} {'peak RSS MB':>12}")
+    for r in results:
+        if "error" in r:
+            print(f"{r['backend']:>8}  error: {r['error']}")
+            continue
+        print(
+            f"{r['backend']:>8} {r['load_seconds']:>8} {r['warmup_seconds']:>9} "
+            f"{r['seconds_per_step']:>8} {r['peak_rss_mb']:>12}"
+        )
+    if args.json:
+        args.json.write_text(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
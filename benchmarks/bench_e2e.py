@@ -0,0 +1,554 @@
+"""End-to-end throughput and latency: the API and worker against local AWS.
+
+A moto server stands in for S3, DynamoDB and SQS; the API (under uvicorn) and
+the worker loop run in their own processes, configured only through their
+environment, exactly as deployed.  Concurrent clients then drive the real
+flow – create a job, PUT the image to the presigned URL, poll until the job
+finishes – and the harness reports request latency per route, end-to-end job
+latency, overall throughput and the worker's per-stage timings (read back
+with ``include_timings``).
+
+The model stages are fast stubs by default (see ``stubs.py``); ``--real``
+loads MediaPipe and Stable Diffusion on CPU instead.  Usage (from the
+repository root)::
+
+    python benchmarks/bench_e2e.py --jobs 200 --concurrency 16 --output e2e.json
+    python benchmarks/bench_e2e.py --worker-mode batched --worker-env BATCH_MAX_SIZE=8
+    python benchmarks/bench_e2e.py --real --jobs 4 --concurrency 1 --quality draft
+    python benchmarks/bench_e2e.py --lanes --bulk-backlog 2000  # interactive vs a bulk backlog
+    python benchmarks/bench_e2e.py --output new.json --baseline e2e.json  # exit 1 on regression
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import io
+import json
+import os
+import platform
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+BENCH_DIR = Path(__file__).resolve().parent
+
+TERMINAL = ("completed", "failed")
+PERCENTILES = (50, 95, 99)
+
+
+# -- worker process -------------------------------------------------------
+
+
+def _run_worker() -> None:
+    sys.path[:0] = [str(ROOT / "worker"), str(ROOT), str(BENCH_DIR)]
+    import stubs
+    from app import worker
+
+    worker.run(stubs.build_from_env)
+
+
+# -- environment ------------------------------------------------------------
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _start_aws(port: int, lanes: bool) -> tuple[object, dict[str, str]]:
+    """Start a moto server and create the bucket, table and queue(s)."""
+    import logging
+
+    import boto3
+    from moto.server import ThreadedMotoServer
+
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)  # one line per AWS call
+    server = ThreadedMotoServer(ip_address="127.0.0.1", port=port, verbose=False)
+    server.start()
+    endpoint = f"http://127.0.0.1:{port}"
+    env = {
+        "AWS_ACCESS_KEY_ID": "bench",
+        "AWS_SECRET_ACCESS_KEY": "bench",
+        "AWS_DEFAULT_REGION": "us-east-1",
+        "AWS_REGION": "us-east-1",
+        "AWS_ENDPOINT_URL": endpoint,
+        "S3_BUCKET": "truetone-bench",
+        "DYNAMODB_JOBS_TABLE": "truetone-bench-jobs",
+    }
+    kwargs = {
+        "region_name": "us-east-1",
+        "endpoint_url": endpoint,
+        "aws_access_key_id": "bench",
+        "aws_secret_access_key": "bench",
+    }
+    boto3.client("s3", **kwargs).create_bucket(Bucket=env["S3_BUCKET"])
+    boto3.client("dynamodb", **kwargs).create_table(
+        TableName=env["DYNAMODB_JOBS_TABLE"],
+        KeySchema=[{"AttributeName": "job_id", "KeyType": "HASH"}],
+        AttributeDefinitions=[{"AttributeName": "job_id", "AttributeType": "S"}],
+        BillingMode="PAY_PER_REQUEST",
+    )
+    sqs = boto3.client("sqs", **kwargs)
+    env["SQS_QUEUE_URL"] = sqs.create_queue(QueueName="truetone-bench-jobs")["QueueUrl"]
+    if lanes:
+        for lane in ("interactive", "bulk"):
+            env[f"SQS_{lane.upper()}_QUEUE_URL"] = sqs.create_queue(
+                QueueName=f"truetone-bench-{lane}"
+            )["QueueUrl"]
+    return server, env
+
+
+def _parse_env(pairs: list[str]) -> dict[str, str]:
+    env = {}
+    for pair in pairs:
+        key, sep, value = pair.partition("=")
+        if not sep:
+            raise SystemExit(f"Expected KEY=VALUE, got {pair!r}")
+        env[key] = value
+    return env
+
+
+def _start_process(
+    command: list[str], cwd: Path, env: dict[str, str], log_path: Path
+) -> subprocess.Popen:
+    log = open(log_path, "w")
+    return subprocess.Popen(
+        command,
+        cwd=cwd,
+        env={**os.environ, **env},
+        stdout=log,
+        stderr=subprocess.STDOUT,
+        start_new_session=True,  # so supervised-mode children are stopped too
+    )
+
+
+def _stop_process(proc: subprocess.Popen) -> None:
+    if proc.poll() is None:
+        os.killpg(proc.pid, signal.SIGTERM)
+        try:
+            proc.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            os.killpg(proc.pid, signal.SIGKILL)
+
+
+def _wait_for(check, timeout: float, what: str, proc: subprocess.Popen, log_path: Path) -> None:
+    deadline = time.monotonic() + timeout
+    while not check():
+        if proc.poll() is not None:
+            tail = log_path.read_text().strip().splitlines()[-20:]
+            raise SystemExit(f"{what} exited during startup:\n" + "\n".join(tail))
+        if time.monotonic() > deadline:
+            raise SystemExit(f"{what} not ready after {timeout:.0f} s (see {log_path})")
+        time.sleep(0.2)
+
+
+def _api_ready(url: str) -> bool:
+    import httpx
+
+    try:
+        return httpx.get(f"{url}/health", timeout=1.0).status_code == 200
+    except httpx.HTTPError:
+        return False
+
+
+def _input_image(size: tuple[int, int]) -> bytes:
+    """A greyscale portrait-like test card: gradient background, bright subject."""
+    from PIL import Image, ImageDraw
+
+    width, height = size
+    image = Image.linear_gradient("L").resize(size).convert("RGB")
+    ImageDraw.Draw(image).ellipse(
+        (width // 3, height // 5, 2 * width // 3, 4 * height // 5), fill=(190, 190, 190)
+    )
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=90)
+    return buffer.getvalue()
+
+
+# -- load -------------------------------------------------------------------
+
+
+class Recorder:
+    """Per-route request latencies and errors, plus per-job results."""
+
+    def __init__(self) -> None:
+        self.requests: dict[str, list[float]] = defaultdict(list)
+        self.errors: dict[str, int] = defaultdict(int)
+        self.job_seconds: list[float] = []
+        self.statuses: dict[str, int] = defaultdict(int)
+        self.timings: list[dict[str, int]] = []
+        self.peak_rss_mb: list[int] = []
+
+    async def call(self, route: str, send) -> object:
+        start = time.perf_counter()
+        try:
+            response = await send()
+            response.raise_for_status()
+        except Exception:
+            self.errors[route] += 1
+            raise
+        finally:
+            self.requests[route].append(time.perf_counter() - start)
+        return response
+
+
+async def _run_job(client, args: argparse.Namespace, image: bytes, rec: Recorder) -> None:
+    start = time.perf_counter()
+    created = await rec.call(
+        "create",
+        lambda: client.post(
+            "/uploads",
+            params={
+                "style": args.style,
+                "quality": args.quality,
+                "content_length": len(image),
+            },
+        ),
+    )
+    job = created.json()
+    await rec.call("upload", lambda: client.put(job["upload_url"], content=image))
+
+    job_id = job["job_id"]
+    while True:
+        if args.poll == "wait":
+            response = await rec.call(
+                "wait",
+                lambda: client.get(f"/jobs/{job_id}/wait", params={"timeout": 20}),
+            )
+        else:
+            await asyncio.sleep(args.poll_interval)
+            response = await rec.call("status", lambda: client.get(f"/jobs/{job_id}"))
+        status = response.json()["status"]
+        if status in TERMINAL:
+            break
+    rec.job_seconds.append(time.perf_counter() - start)
+    rec.statuses[status] += 1
+
+    # Not timed: the stage breakdown is bookkeeping, not load.
+    detail = (
+        await client.get(f"/jobs/{job_id}", params={"include_timings": "true"})
+    ).json()
+    if detail.get("timings"):
+        rec.timings.append(detail["timings"])
+    if detail.get("peak_rss_mb") is not None:
+        rec.peak_rss_mb.append(detail["peak_rss_mb"])
+
+
+async def _drive(
+    api_url: str, args: argparse.Namespace, jobs: int, image: bytes
+) -> tuple[Recorder, float]:
+    """Run *jobs* jobs through *concurrency* closed-loop clients."""
+    import httpx
+
+    rec = Recorder()
+    remaining = iter(range(jobs))
+    limits = httpx.Limits(max_connections=args.concurrency * 2)
+
+    async with httpx.AsyncClient(base_url=api_url, limits=limits, timeout=60.0) as client:
+
+        async def client_loop() -> None:
+            for _ in remaining:
+                try:
+                    await _run_job(client, args, image, rec)
+                except Exception:
+                    rec.statuses["error"] += 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(client_loop() for _ in range(args.concurrency)))
+        return rec, time.perf_counter() - start
+
+
+async def _fill_backlog(api_url: str, args: argparse.Namespace, image: bytes) -> None:
+    """Create and upload ``--bulk-backlog`` jobs through POST /uploads/batch, untimed."""
+    import httpx
+
+    async with httpx.AsyncClient(base_url=api_url, timeout=60.0) as client:
+        remaining = args.bulk_backlog
+        while remaining:
+            count = min(remaining, 500)
+            response = await client.post(
+                "/uploads/batch", json={"count": count, "quality": args.bulk_quality}
+            )
+            response.raise_for_status()
+            urls = [job["upload_url"] for job in response.json()["jobs"]]
+            for start in range(0, len(urls), 32):
+                await asyncio.gather(
+                    *(client.put(url, content=image) for url in urls[start : start + 32])
+                )
+            remaining -= count
+
+
+# -- report -----------------------------------------------------------------
+
+
+def _summary(seconds: list[float]) -> dict[str, float]:
+    import numpy as np
+
+    if not seconds:
+        return {"count": 0}
+    ms = np.asarray(seconds) * 1000
+    summary = {"count": len(seconds), "mean_ms": round(float(ms.mean()), 2)}
+    for p in PERCENTILES:
+        summary[f"p{p}_ms"] = round(float(np.percentile(ms, p)), 2)
+    summary["max_ms"] = round(float(ms.max()), 2)
+    return summary
+
+
+def _stage_summary(timings: list[dict[str, int]]) -> dict[str, dict[str, float]]:
+    """
+    Per-stage latency and single-lane capacity (jobs/s one worker thread
+    could push through the stage: 1 / mean duration).
+    """
+    stages: dict[str, list[float]] = defaultdict(list)
+    for record in timings:
+        for stage, ms in record.items():
+            stages[stage].append(ms / 1000)
+    report = {}
+    for stage, seconds in stages.items():
+        summary = _summary(seconds)
+        mean = summary["mean_ms"] / 1000
+        summary["jobs_per_sec"] = round(1 / mean, 2) if mean > 0 else None
+        report[stage] = summary
+    return report
+
+
+def _git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=ROOT,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _report(args: argparse.Namespace, rec: Recorder, wall: float) -> dict:
+    completed = rec.statuses.get("completed", 0)
+    return {
+        "config": {
+            key: value
+            for key, value in vars(args).items()
+            if key not in ("output", "baseline", "role")
+        },
+        "environment": {
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+        },
+        "wall_seconds": round(wall, 3),
+        "jobs": {
+            **dict(rec.statuses),
+            "jobs_per_sec": round(completed / wall, 3) if wall else None,
+        },
+        "job_latency": _summary(rec.job_seconds),
+        "requests": {
+            route: {**_summary(seconds), "errors": rec.errors.get(route, 0)}
+            for route, seconds in sorted(rec.requests.items())
+        },
+        "stages": _stage_summary(rec.timings),
+        "worker_peak_rss_mb": max(rec.peak_rss_mb, default=None),
+    }
+
+
+def _print_report(report: dict) -> None:
+    jobs = report["jobs"]
+    print(
+        f"\n{jobs.get('completed', 0)} completed, {jobs.get('failed', 0)} failed, "
+        f"{jobs.get('error', 0)} client errors in {report['wall_seconds']} s "
+        f"({jobs['jobs_per_sec']} jobs/s)"
+    )
+    if report.get("worker_peak_rss_mb") is not None:
+        print(f"worker peak RSS {report['worker_peak_rss_mb']} MiB")
+    header = f"{'':>14} {'count':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}"
+    print(header)
+    rows = [("job (e2e)", report["job_latency"])]
+    rows += [(f"req {route}", s) for route, s in report["requests"].items()]
+    rows += [(f"stage {stage}", s) for stage, s in report["stages"].items()]
+    for name, s in rows:
+        if not s.get("count"):
+            continue
+        print(
+            f"{name:>14} {s['count']:>6} {s['p50_ms']:>9} {s['p95_ms']:>9} {s['p99_ms']:>9}"
+            + (f"  {s['jobs_per_sec']} jobs/s/lane" if s.get("jobs_per_sec") else "")
+        )
+
+
+def _regressions(
+    report: dict, baseline: dict, tolerance: float, min_delta_ms: float
+) -> list[str]:
+    """
+    Hot-path figures that got worse than *baseline* by more than *tolerance*;
+    latencies must also have grown by *min_delta_ms*, so that jitter on
+    millisecond stages is not reported.
+    """
+    found = []
+
+    def check(name: str, new: float | None, old: float | None, higher_is_better: bool) -> None:
+        if not new or not old:
+            return
+        if not higher_is_better and new - old < min_delta_ms:
+            return
+        change = (old - new) / old if higher_is_better else (new - old) / old
+        if change > tolerance:
+            found.append(f"{name}: {old} -> {new} ({change:+.0%})")
+
+    check("jobs_per_sec", report["jobs"]["jobs_per_sec"], baseline["jobs"]["jobs_per_sec"], True)
+    check(
+        "job p95_ms",
+        report["job_latency"].get("p95_ms"),
+        baseline["job_latency"].get("p95_ms"),
+        False,
+    )
+    for group in ("requests", "stages"):
+        for name, new in report[group].items():
+            old = baseline.get(group, {}).get(name)
+            if old:
+                check(f"{group}.{name} p95_ms", new.get("p95_ms"), old.get("p95_ms"), False)
+    return found
+
+
+# -- main -------------------------------------------------------------------
+
+
+def _parse_size(text: str) -> tuple[int, int]:
+    width, height = text.lower().split("x")
+    return int(width), int(height)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--jobs", type=int, default=100)
+    parser.add_argument("--warmup-jobs", type=int, default=5)
+    parser.add_argument("--concurrency", type=int, default=8, help="closed-loop clients")
+    parser.add_argument("--poll", choices=("get", "wait"), default="wait")
+    parser.add_argument("--poll-interval", type=float, default=0.25, help="seconds (--poll get)")
+    parser.add_argument("--style", default="natural")
+    parser.add_argument("--quality", default="draft", choices=("draft", "standard", "high"))
+    parser.add_argument("--size", type=_parse_size, default=(1024, 768))
+    parser.add_argument("--lanes", action="store_true", help="separate interactive/bulk queues")
+    parser.add_argument(
+        "--bulk-backlog", type=int, default=0, help="batch-uploaded jobs queued before the run"
+    )
+    parser.add_argument(
+        "--bulk-quality", default="standard", choices=("draft", "standard", "high")
+    )
+    parser.add_argument(
+        "--worker-mode", default="serial", choices=("serial", "batched", "pipelined", "supervised")
+    )
+    parser.add_argument("--api-workers", type=int, default=1, help="uvicorn worker processes")
+    parser.add_argument("--real", action="store_true", help="real models on CPU instead of stubs")
+    parser.add_argument("--step-ms", type=float, default=5.0, help="stub cost per denoising step")
+    parser.add_argument("--row-ms", type=float, default=0.0, help="stub cost per batch row")
+    parser.add_argument("--segment-ms", type=float, default=0.0, help="stub segmentation cost")
+    parser.add_argument("--stub-postprocessor", action="store_true")
+    parser.add_argument("--result-cache", action="store_true", help="keep the result cache on")
+    parser.add_argument("--api-env", action="append", default=[], metavar="KEY=VALUE")
+    parser.add_argument("--worker-env", action="append", default=[], metavar="KEY=VALUE")
+    parser.add_argument("--startup-timeout", type=float, default=600.0)
+    parser.add_argument("--output", type=Path, help="write the JSON report here")
+    parser.add_argument("--baseline", type=Path, help="compare with an earlier JSON report")
+    parser.add_argument("--max-regression", type=float, default=0.15)
+    parser.add_argument("--min-delta-ms", type=float, default=5.0)
+    parser.add_argument("--role", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.role == "worker":
+        _run_worker()
+        return
+
+    server, aws_env = _start_aws(_free_port(), args.lanes)
+    logs = Path(tempfile.mkdtemp(prefix="truetone-bench-"))
+    api_port = _free_port()
+    api_url = f"http://127.0.0.1:{api_port}"
+    api = _start_process(
+        [
+            sys.executable, "-m", "uvicorn", "app.main:app",
+            "--host", "127.0.0.1", "--port", str(api_port),
+            "--workers", str(args.api_workers), "--log-level", "warning",
+        ],
+        cwd=ROOT / "api",
+        env={
+            **aws_env,
+            "PYTHONPATH": os.pathsep.join([str(ROOT / "api"), str(ROOT)]),
+            **_parse_env(args.api_env),
+        },
+        log_path=logs / "api.log",
+    )
+    worker_env = {
+        **aws_env,
+        "PYTHONPATH": os.pathsep.join([str(ROOT / "worker"), str(ROOT), str(BENCH_DIR)]),
+        "WORKER_MODE": args.worker_mode,
+        "METRICS_PORT": "0",
+        "RESULT_CACHE_ENABLED": str(args.result_cache).lower(),
+        "BENCH_SEGMENTER": "real" if args.real else "stub",
+        "BENCH_GENERATOR": "real" if args.real else "stub",
+        "BENCH_POSTPROCESSOR": "stub" if args.stub_postprocessor else "real",
+        "BENCH_STEP_MS": str(args.step_ms),
+        "BENCH_ROW_MS": str(args.row_ms),
+        "BENCH_SEGMENT_MS": str(args.segment_ms),
+        "SQS_WAIT_TIME_SECONDS": "1",
+        **({"CUDA_VISIBLE_DEVICES": ""} if args.real else {}),
+        **_parse_env(args.worker_env),
+    }
+    worker = _start_process(
+        [sys.executable, str(Path(__file__).resolve()), "--role", "worker"],
+        cwd=ROOT / "worker",
+        env=worker_env,
+        log_path=logs / "worker.log",
+    )
+
+    try:
+        _wait_for(lambda: _api_ready(api_url), 60, "API", api, logs / "api.log")
+        _wait_for(
+            lambda: "BENCH_WORKER_READY" in (logs / "worker.log").read_text(),
+            args.startup_timeout,
+            "Worker",
+            worker,
+            logs / "worker.log",
+        )
+        image = _input_image(args.size)
+        if args.warmup_jobs:
+            asyncio.run(_drive(api_url, args, args.warmup_jobs, image))
+        if args.bulk_backlog:
+            asyncio.run(_fill_backlog(api_url, args, image))
+        rec, wall = asyncio.run(_drive(api_url, args, args.jobs, image))
+    finally:
+        _stop_process(worker)
+        _stop_process(api)
+        server.stop()
+
+    report = _report(args, rec, wall)
+    report["logs"] = str(logs)
+    _print_report(report)
+    if args.output:
+        args.output.write_text(json.dumps(report, indent=2))
+
+    if args.baseline:
+        regressions = _regressions(
+            report,
+            json.loads(args.baseline.read_text()),
+            args.max_regression,
+            args.min_delta_ms,
+        )
+        if regressions:
+            print(f"\nRegressions beyond {args.max_regression:.0%}:")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print(f"\nNo regressions beyond {args.max_regression:.0%} against {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""Compare post-processing cost per megapixel: PIL LAB path vs NumPy path.
+
+The NumPy rows also report how far their output is from the PIL path's, as
+the mean and maximum absolute difference in 8-bit levels.
+
+Usage (from the repository root)::
+
+    python benchmarks/bench_postprocess.py --sizes 512x512 1024x768 2048x1536
+"""
+
+from __future__ import annotations
+
+import argparse
+import statistics
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path[:0] = [str(ROOT), str(ROOT / "worker")]
+
+import numpy as np  # noqa: E402
+from PIL import Image, ImageFilter  # noqa: E402
+
+from app.pipeline.postprocess import BlendPostprocessor, NumpyBlendPostprocessor  # noqa: E402
+
+
+def _parse_size(text: str) -> tuple[int, int]:
+    width, height = text.lower().split("x")
+    return int(width), int(height)
+
+
+def _inputs(size: tuple[int, int], seed: int = 0):
+    rng = np.random.default_rng(seed)
+    width, height = size
+    noise = rng.integers(0, 256, (height, width, 3), dtype=np.uint8)
+    original = Image.fromarray(noise).filter(ImageFilter.GaussianBlur(2))
+    generated = Image.new("RGB", size, (200, 120, 90))
+    mask = Image.new("L", size, 0)
+    mask.paste(255, (width // 4, height // 4, 3 * width // 4, 3 * height // 4))
+    return original, generated, mask
+
+
+def _time(fn, repeats: int) -> float:
+    fn()  # warm-up (buffer allocation, lazy imports)
+    samples = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", nargs="+", default=["512x512", "1024x768", "2048x1536"])
+    parser.add_argument("--batch", type=int, default=4, help="Images per process_batch call")
+    parser.add_argument("--repeats", type=int, default=10)
+    parser.add_argument("--no-mask", action="store_true", help="Blend without a mask")
+    args = parser.parse_args()
+
+    implementations = {"pil": BlendPostprocessor(), "numpy": NumpyBlendPostprocessor()}
+
+    print(
+        f"{'size':>11} {'impl':>6} {'ms/image':>10} {'ms/MP':>8} {'batch ms/MP':>12} "
+        f"{'mean diff':>10} {'max diff':>9}"
+    )
+    for text in args.sizes:
+        size = _parse_size(text)
+        original, generated, mask = _inputs(size)
+        mask = None if args.no_mask else mask
+        megapixels = size[0] * size[1] / 1e6
+        reference = np.asarray(
+            implementations["pil"].process(original, generated, mask), dtype=np.int16
+        )
+
+        for name, post in implementations.items():
+            output = np.asarray(post.process(original, generated, mask), dtype=np.int16)
+            diff = np.abs(output - reference)
+            single = _time(lambda: post.process(original, generated, mask), args.repeats)
+            batch = _time(
+                lambda: post.process_batch(
+                    [original] * args.batch, [generated] * args.batch, [mask] * args.batch
+                ),
+                args.repeats,
+            )
+            print(
+                f"{text:>11} {name:>6} {single * 1e3:>10.1f} "
+                f"{single * 1e3 / megapixels:>8.1f} "
+                f"{batch * 1e3 / (megapixels * args.batch):>12.1f} "
+                f"{diff.mean():>10.3f} {diff.max():>9d}"
+            )
+
+
+if __name__ == "__main__":
+    main()
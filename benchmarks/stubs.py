@@ -0,0 +1,132 @@
+"""Fast stand-ins for the ML pipeline stages, used by the end-to-end benchmark.
+
+The stubs exercise everything around the models – queueing, storage, job
+state, batching, resizing, blending – while the model stages cost a fixed,
+configurable amount of time.  :func:`build_from_env` is the worker's pipeline
+factory; it reads its choices from ``BENCH_*`` environment variables so that
+supervised-mode children (which only receive a picklable factory) build the
+same pipeline as the parent.
+"""
+
+from __future__ import annotations
+
+import os
+import time
+
+from PIL import Image, ImageDraw
+
+from app.pipeline.interfaces import Generator, Postprocessor, PreviewCallback, Segmenter
+from app.pipeline.tiers import DEFAULT_QUALITY, get_tier
+
+
+class StubSegmenter(Segmenter):
+    """An ellipse covering the centre of the frame, after a fixed delay."""
+
+    def __init__(self, delay_ms: float = 0.0) -> None:
+        self._delay = delay_ms / 1000
+
+    def segment(self, image: Image.Image) -> Image.Image:
+        time.sleep(self._delay)
+        mask = Image.new("L", image.size, 0)
+        width, height = image.size
+        ImageDraw.Draw(mask).ellipse(
+            (width // 4, height // 6, 3 * width // 4, 5 * height // 6), fill=255
+        )
+        return mask
+
+
+class StubGenerator(Generator):
+    """
+    A flat tint at the model's resolution, costing ``step_ms`` per denoising
+    step of the job's tier (the whole batch shares each step, like the real
+    pipeline) plus ``row_ms`` per batch row.
+    """
+
+    def __init__(
+        self, step_ms: float = 5.0, row_ms: float = 0.0, native_resolution: int | None = 512
+    ) -> None:
+        self._step = step_ms / 1000
+        self._row = row_ms / 1000
+        self._native = native_resolution
+
+    @property
+    def native_resolution(self) -> int | None:
+        return self._native
+
+    def output_size(self, image: Image.Image) -> tuple[int, int]:
+        return image.width - image.width % 8, image.height - image.height % 8
+
+    def generate(
+        self,
+        image: Image.Image,
+        mask: Image.Image,
+        prompt: str,
+        quality: str = DEFAULT_QUALITY,
+    ) -> Image.Image:
+        return self.generate_batch([image], [mask], [prompt], quality)[0]
+
+    def generate_batch(
+        self,
+        images: list[Image.Image],
+        masks: list[Image.Image],
+        prompts: list[str],
+        quality: str = DEFAULT_QUALITY,
+        preview: PreviewCallback | None = None,
+        step_times: list[float] | None = None,
+    ) -> list[Image.Image]:
+        steps = get_tier(quality).steps
+        time.sleep(self._row * len(images))
+        for _ in range(steps):
+            start = time.perf_counter()
+            time.sleep(self._step)
+            if step_times is not None:
+                step_times.append(time.perf_counter() - start)
+        return [
+            Image.new("RGB", self.output_size(image), (200, 140, 110)) for image in images
+        ]
+
+
+class StubPostprocessor(Postprocessor):
+    """Return the generated image unchanged."""
+
+    def process(
+        self,
+        original: Image.Image,
+        generated: Image.Image,
+        mask: Image.Image | None = None,
+    ) -> Image.Image:
+        return generated
+
+
+def build_from_env() -> tuple[Segmenter, Generator, Postprocessor]:
+    """
+    Build the benchmark pipeline selected by ``BENCH_SEGMENTER``,
+    ``BENCH_GENERATOR`` (``stub`` or ``real``) and ``BENCH_POSTPROCESSOR``
+    (``stub`` or ``real``, i.e. the worker's configured postprocessor).
+    """
+    from app.worker import build_postprocessor
+
+    if os.environ.get("BENCH_SEGMENTER", "stub") == "real":
+        from app.pipeline.segmenter_mediapipe import MediaPipeSegmenter
+
+        segmenter: Segmenter = MediaPipeSegmenter()
+    else:
+        segmenter = StubSegmenter(float(os.environ.get("BENCH_SEGMENT_MS", "0")))
+
+    if os.environ.get("BENCH_GENERATOR", "stub") == "real":
+        from app.pipeline.generator_diffusion_inpaint import DiffusionInpaintGenerator
+
+        generator: Generator = DiffusionInpaintGenerator()
+    else:
+        generator = StubGenerator(
+            step_ms=float(os.environ.get("BENCH_STEP_MS", "5")),
+            row_ms=float(os.environ.get("BENCH_ROW_MS", "0")),
+        )
+
+    if os.environ.get("BENCH_POSTPROCESSOR", "real") == "real":
+        postprocessor = build_postprocessor()
+    else:
+        postprocessor = StubPostprocessor()
+
+    print("BENCH_WORKER_READY", flush=True)
+    return segmenter, generator, postprocessor
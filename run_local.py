@@ -0,0 +1,85 @@
+"""Run the API and N worker loops in one process on the in-process backend.
+
+S3, DynamoDB and SQS are replaced by the stand-ins in ``shared/memory.py``
+(``AWS_BACKEND=memory``), so no AWS account, LocalStack or network round trip
+is involved: what remains is the cost of the services and the pipeline
+themselves.  Usage (from the repository root)::
+
+    python run_local.py --workers 2 --worker-mode batched
+    python run_local.py --stubs   # fast stub models from benchmarks/stubs.py
+
+Both services are packages called ``app``.  The API is imported first and its
+modules are then moved out of the way in ``sys.modules`` so that the worker's
+``app`` can be imported next to it; each side keeps the module objects it
+was bound to at import time.
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+import threading
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent
+
+
+def _import_service(service: str, module: str, unbind: bool):
+    """Import *module* from *service*'s ``app`` package, optionally unbinding ``app``."""
+    path = str(ROOT / service)
+    sys.path.insert(0, path)
+    try:
+        imported = __import__(module, fromlist=["_"])
+    finally:
+        sys.path.remove(path)
+    if unbind:
+        for name in [n for n in sys.modules if n == "app" or n.startswith("app.")]:
+            sys.modules[f"_{service}_{name}"] = sys.modules.pop(name)
+    return imported
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=1, help="worker loops (threads)")
+    parser.add_argument(
+        "--worker-mode", choices=("serial", "batched", "pipelined"), default="serial"
+    )
+    parser.add_argument("--stubs", action="store_true", help="stub models (benchmarks/stubs.py)")
+    args = parser.parse_args()
+
+    os.environ.update(
+        AWS_BACKEND="memory",
+        MEMORY_BLOB_URL=f"http://{args.host}:{args.port}/blobs",
+        WORKER_MODE=args.worker_mode,
+        # Worker metrics land in the shared registry, served by the API's /metrics.
+        METRICS_PORT="0",
+    )
+    os.environ.setdefault("SQS_QUEUE_URL", "memory://truetone-jobs")
+    sys.path.insert(0, str(ROOT))
+
+    api = _import_service("api", "app.main", unbind=True)
+    # Lazy imports inside the worker (e.g. its model modules) resolve "app"
+    # at call time, so the worker's package stays bound under that name.
+    worker = _import_service("worker", "app.worker", unbind=False)
+    build = worker.build_pipeline
+    if args.stubs:
+        sys.path.insert(0, str(ROOT / "benchmarks"))
+        import stubs
+
+        build = stubs.build_from_env
+
+    for index in range(args.workers):
+        threading.Thread(
+            target=worker.run, args=(build,), name=f"worker-{index}", daemon=True
+        ).start()
+
+    import uvicorn
+
+    uvicorn.run(api.app, host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
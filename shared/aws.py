@@ -0,0 +1,100 @@
+"""Process-wide registry of pooled boto3 clients for API and worker services.
+
+boto3 clients are thread-safe but expensive to build: each one resolves
+credentials and endpoints and owns its own HTTP connection pool.  Clients are
+therefore built once per process and configuration, then shared by every
+caller, which keeps connections warm across requests and jobs.
+
+With ``aws_backend = "memory"`` the registry hands out the in-process
+stand-ins from :mod:`shared.memory` instead, without touching the network.
+"""
+
+from __future__ import annotations
+
+import threading
+from typing import Protocol
+
+import boto3
+from botocore.client import BaseClient
+from botocore.config import Config
+
+from shared.memory import memory_client
+
+
+class AwsClientSettings(Protocol):
+    """The settings fields both services expose for AWS client construction."""
+
+    aws_backend: str
+    aws_region: str
+    aws_endpoint_url: str | None
+    aws_max_pool_connections: int
+    aws_connect_timeout: float
+    aws_read_timeout: float
+    aws_retry_mode: str
+    aws_max_attempts: int
+    aws_tcp_keepalive: bool
+
+
+_lock = threading.Lock()
+_session: boto3.session.Session | None = None
+_clients: dict[tuple, BaseClient] = {}
+
+
+def _client_key(service_name: str, settings: AwsClientSettings) -> tuple:
+    return (
+        service_name,
+        settings.aws_backend,
+        settings.aws_region,
+        settings.aws_endpoint_url,
+        settings.aws_max_pool_connections,
+        settings.aws_connect_timeout,
+        settings.aws_read_timeout,
+        settings.aws_retry_mode,
+        settings.aws_max_attempts,
+        settings.aws_tcp_keepalive,
+    )
+
+
+def _build_client(service_name: str, settings: AwsClientSettings) -> BaseClient:
+    global _session
+    if settings.aws_backend == "memory":
+        return memory_client(service_name)
+    if _session is None:
+        # Sessions are not thread-safe; only ever touched under _lock.
+        _session = boto3.session.Session()
+
+    config = Config(
+        region_name=settings.aws_region,
+        max_pool_connections=settings.aws_max_pool_connections,
+        connect_timeout=settings.aws_connect_timeout,
+        read_timeout=settings.aws_read_timeout,
+        retries={
+            "mode": settings.aws_retry_mode,
+            "max_attempts": settings.aws_max_attempts,
+        },
+        tcp_keepalive=settings.aws_tcp_keepalive,
+    )
+    kwargs: dict = {"config": config}
+    if settings.aws_endpoint_url:
+        kwargs["endpoint_url"] = settings.aws_endpoint_url
+    return _session.client(service_name, **kwargs)
+
+
+def get_client(service_name: str, settings: AwsClientSettings) -> BaseClient:
+    """Return the shared client for *service_name*, building it on first use."""
+    key = _client_key(service_name, settings)
+    client = _clients.get(key)
+    if client is None:
+        with _lock:
+            client = _clients.get(key)
+            if client is None:
+                client = _clients[key] = _build_client(service_name, settings)
+    return client
+
+
+def clear_clients() -> None:
+    """Drop every cached client, e.g. in a freshly forked child process."""
+    global _session
+    with _lock:
+        _clients.clear()
+        _session = None
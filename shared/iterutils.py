@@ -0,0 +1,14 @@
+"""Small iteration helpers shared by API and worker services."""
+
+from __future__ import annotations
+
+from collections.abc import Iterator, Sequence
+from typing import TypeVar
+
+T = TypeVar("T")
+
+
+def chunked(items: Sequence[T], size: int) -> Iterator[Sequence[T]]:
+    """Yield consecutive slices of *items* holding at most *size* elements."""
+    for start in range(0, len(items), size):
+        yield items[start : start + size]
@@ -1,7 +1,9 @@
 """Shared structured logging configuration for API and worker services."""
 
+import json
 import logging
 import sys
+from typing import Any
 
 
 def get_logger(name: str) -> logging.Logger:
@@ -18,3 +20,12 @@ def get_logger(name: str) -> logging.Logger:
         logger.addHandler(handler)
     logger.setLevel(logging.INFO)
     return logger
+
+
+def log_event(logger: logging.Logger, event: str, **fields: Any) -> None:
+    """
+    Log *event* followed by *fields* as one line of compact JSON, e.g.
+    ``job_timings {"job_id": "...", "generate": 5120}``, for log queries.
+    """
+    if logger.isEnabledFor(logging.INFO):
+        logger.info("%s %s", event, json.dumps(fields, separators=(",", ":"), default=str))
@@ -0,0 +1,496 @@
+"""In-process stand-ins for the S3, DynamoDB and SQS clients.
+
+With ``AWS_BACKEND=memory`` :func:`shared.aws.get_client` returns these
+instead of boto3 clients, so every storage, job-store and queue helper runs
+unchanged against process-local state.  They implement the subset of each
+client's API that the services call, with the same request and response
+shapes (DynamoDB items keep their wire format) and the same error codes via
+:class:`botocore.exceptions.ClientError`.
+
+All clients of a service share one :class:`MemoryStore` per process, which is
+what lets the single-process launcher (``run_local.py``) run the API and its
+workers against the same blobs, records and queue.  The SQS stand-in keeps
+visibility timeouts and long polling; nothing is persisted or shared across
+processes.
+"""
+
+from __future__ import annotations
+
+import io
+import re
+import threading
+import time
+import uuid
+from collections.abc import Callable
+from dataclasses import dataclass, field
+from decimal import Decimal
+from typing import Any, BinaryIO
+from urllib.parse import quote
+
+from botocore.exceptions import ClientError
+
+# SQS defaults when a call does not say otherwise.
+DEFAULT_VISIBILITY_TIMEOUT = 30
+MAX_RECEIVE_MESSAGES = 10
+
+# Every table in these services is keyed by a single ``job_id`` hash key.
+TABLE_KEY = "job_id"
+
+
+def _error(code: str, message: str, operation: str, status: int = 400) -> ClientError:
+    return ClientError(
+        {
+            "Error": {"Code": code, "Message": message},
+            "ResponseMetadata": {"HTTPStatusCode": status},
+        },
+        operation,
+    )
+
+
+def _read_body(body: bytes | str | BinaryIO) -> bytes:
+    if isinstance(body, bytes):
+        return body
+    if isinstance(body, str):
+        return body.encode()
+    return body.read()
+
+
+# -- S3 -------------------------------------------------------------------
+
+
+@dataclass
+class _Blob:
+    data: bytes
+    content_type: str
+
+
+class MemoryS3:
+    """Objects held in a dict keyed by (bucket, key)."""
+
+    def __init__(self, store: MemoryStore) -> None:
+        self._store = store
+
+    def _blob(self, bucket: str, key: str, operation: str, code: str = "NoSuchKey") -> _Blob:
+        blob = self._store.blobs.get((bucket, key))
+        if blob is None:
+            raise _error(code, "The specified key does not exist.", operation, 404)
+        return blob
+
+    def put_object(
+        self, Bucket: str, Key: str, Body: Any = b"", ContentType: str = "binary/octet-stream"
+    ) -> dict:
+        self._store.blobs[(Bucket, Key)] = _Blob(_read_body(Body), ContentType)
+        return {}
+
+    def get_object(self, Bucket: str, Key: str) -> dict:
+        blob = self._blob(Bucket, Key, "GetObject")
+        return {
+            "Body": io.BytesIO(blob.data),
+            "ContentLength": len(blob.data),
+            "ContentType": blob.content_type,
+        }
+
+    def head_object(self, Bucket: str, Key: str) -> dict:
+        blob = self._blob(Bucket, Key, "HeadObject", code="404")
+        return {"ContentLength": len(blob.data), "ContentType": blob.content_type}
+
+    def upload_fileobj(
+        self, Fileobj: BinaryIO, Bucket: str, Key: str, ExtraArgs: dict | None = None, **_: Any
+    ) -> None:
+        content_type = (ExtraArgs or {}).get("ContentType", "binary/octet-stream")
+        self.put_object(Bucket=Bucket, Key=Key, Body=Fileobj, ContentType=content_type)
+
+    def generate_presigned_url(
+        self, ClientMethod: str, Params: dict, ExpiresIn: int = 3600, HttpMethod: str | None = None
+    ) -> str:
+        """URLs point at the API's ``/blobs`` routes; they are not signed."""
+        if not self._store.blob_url:
+            raise RuntimeError("The memory backend has no blob URL to presign against")
+        return f"{self._store.blob_url}/{quote(Params['Bucket'])}/{quote(Params['Key'])}"
+
+
+# -- DynamoDB -------------------------------------------------------------
+
+_TOKEN = re.compile(r"\s*(<>|<=|>=|[=<>(),]|[#:]?[A-Za-z_][A-Za-z0-9_]*)")
+
+
+def _tokenize(expression: str) -> list[str]:
+    tokens, pos = [], 0
+    expression = expression.strip()
+    while pos < len(expression):
+        match = _TOKEN.match(expression, pos)
+        if match is None:
+            raise ValueError(f"Unsupported expression syntax at {expression[pos:]!r}")
+        tokens.append(match.group(1))
+        pos = match.end()
+    return tokens
+
+
+def _scalar(value: dict) -> Any:
+    return Decimal(value["N"]) if "N" in value else next(iter(value.values()))
+
+
+def _compare(op: str, left: dict | None, right: dict) -> bool:
+    """Compare two wire-format values; a missing attribute never matches."""
+    if left is None:
+        return False
+    if op in ("=", "<>"):
+        equal = left.keys() == right.keys() and _scalar(left) == _scalar(right)
+        return equal if op == "=" else not equal
+    a, b = _scalar(left), _scalar(right)
+    return {"<": a < b, "<=": a <= b, ">": a > b, ">=": a >= b}[op]
+
+
+class _Condition:
+    """
+    Evaluator for the ConditionExpression subset the services use:
+    comparisons, ``attribute_exists``/``attribute_not_exists``, ``AND``,
+    ``OR``, ``NOT`` and parentheses.
+    """
+
+    def __init__(self, expression: str, names: dict[str, str], values: dict[str, dict]) -> None:
+        self._tokens = _tokenize(expression)
+        self._names = names
+        self._values = values
+
+    def __call__(self, item: dict | None) -> bool:
+        self._pos = 0
+        self._item = item or {}
+        result = self._or()
+        if self._pos != len(self._tokens):
+            raise ValueError(f"Unexpected token {self._tokens[self._pos]!r}")
+        return result
+
+    def _peek(self) -> str | None:
+        return self._tokens[self._pos] if self._pos < len(self._tokens) else None
+
+    def _take(self, expected: str | None = None) -> str:
+        token = self._peek()
+        if token is None or (expected is not None and token.upper() != expected):
+            raise ValueError(f"Expected {expected or 'a token'}, got {token!r}")
+        self._pos += 1
+        return token
+
+    def _or(self) -> bool:
+        result = self._and()
+        while (self._peek() or "").upper() == "OR":
+            self._take()
+            result = self._and() or result
+        return result
+
+    def _and(self) -> bool:
+        result = self._not()
+        while (self._peek() or "").upper() == "AND":
+            self._take()
+            result = self._not() and result
+        return result
+
+    def _not(self) -> bool:
+        if (self._peek() or "").upper() == "NOT":
+            self._take()
+            return not self._not()
+        return self._atom()
+
+    def _atom(self) -> bool:
+        token = self._take()
+        if token == "(":
+            result = self._or()
+            self._take(")")
+            return result
+        if token in ("attribute_exists", "attribute_not_exists"):
+            self._take("(")
+            exists = self._path(self._take()) in self._item
+            self._take(")")
+            return exists if token == "attribute_exists" else not exists
+        op = self._take()
+        value = self._values[self._take()]
+        return _compare(op, self._item.get(self._path(token)), value)
+
+    def _path(self, token: str) -> str:
+        return self._names[token] if token.startswith("#") else token
+
+
+def _apply_update(
+    item: dict, expression: str, names: dict[str, str], values: dict[str, dict]
+) -> None:
+    """Apply a ``SET a = :x, #b = :y [REMOVE c, d]`` update to *item*."""
+
+    def path(token: str) -> str:
+        return names[token] if token.startswith("#") else token
+
+    clauses = re.split(r"\b(SET|REMOVE)\b", expression.strip(), flags=re.IGNORECASE)
+    for action, body in zip(clauses[1::2], clauses[2::2]):
+        for part in filter(None, (p.strip() for p in body.split(","))):
+            if action.upper() == "SET":
+                target, value = (s.strip() for s in part.split("="))
+                item[path(target)] = values[value]
+            else:
+                item.pop(path(part), None)
+
+
+class MemoryDynamoDB:
+    """Items in wire format, one dict per table keyed by ``job_id``."""
+
+    def __init__(self, store: MemoryStore) -> None:
+        self._store = store
+
+    def _table(self, name: str) -> dict[str, dict]:
+        return self._store.tables.setdefault(name, {})
+
+    def _check(
+        self,
+        item: dict | None,
+        condition: str | None,
+        names: dict | None,
+        values: dict | None,
+        operation: str,
+    ) -> None:
+        if condition and not _Condition(condition, names or {}, values or {})(item):
+            raise _error(
+                "ConditionalCheckFailedException", "The conditional request failed", operation
+            )
+
+    def put_item(
+        self,
+        TableName: str,
+        Item: dict,
+        ConditionExpression: str | None = None,
+        ExpressionAttributeNames: dict | None = None,
+        ExpressionAttributeValues: dict | None = None,
+    ) -> dict:
+        key = Item[TABLE_KEY]["S"]
+        with self._store.lock:
+            table = self._table(TableName)
+            self._check(
+                table.get(key),
+                ConditionExpression,
+                ExpressionAttributeNames,
+                ExpressionAttributeValues,
+                "PutItem",
+            )
+            table[key] = dict(Item)
+        return {}
+
+    def get_item(self, TableName: str, Key: dict, **_: Any) -> dict:
+        with self._store.lock:
+            item = self._table(TableName).get(Key[TABLE_KEY]["S"])
+            return {"Item": dict(item)} if item is not None else {}
+
+    def update_item(
+        self,
+        TableName: str,
+        Key: dict,
+        UpdateExpression: str,
+        ConditionExpression: str | None = None,
+        ExpressionAttributeNames: dict | None = None,
+        ExpressionAttributeValues: dict | None = None,
+        ReturnValues: str = "NONE",
+    ) -> dict:
+        names, values = ExpressionAttributeNames or {}, ExpressionAttributeValues or {}
+        key = Key[TABLE_KEY]["S"]
+        with self._store.lock:
+            table = self._table(TableName)
+            current = table.get(key)
+            self._check(current, ConditionExpression, names, values, "UpdateItem")
+            item = dict(current) if current is not None else dict(Key)
+            _apply_update(item, UpdateExpression, names, values)
+            table[key] = item
+            return {"Attributes": dict(item)} if ReturnValues == "ALL_NEW" else {}
+
+    def delete_item(self, TableName: str, Key: dict, **_: Any) -> dict:
+        with self._store.lock:
+            self._table(TableName).pop(Key[TABLE_KEY]["S"], None)
+        return {}
+
+    def batch_write_item(self, RequestItems: dict) -> dict:
+        for table, requests in RequestItems.items():
+            for request in requests:
+                if "PutRequest" in request:
+                    self.put_item(TableName=table, Item=request["PutRequest"]["Item"])
+                else:
+                    self.delete_item(TableName=table, Key=request["DeleteRequest"]["Key"])
+        return {"UnprocessedItems": {}}
+
+    def batch_get_item(self, RequestItems: dict) -> dict:
+        responses: dict[str, list[dict]] = {}
+        for table, request in RequestItems.items():
+            found = (self.get_item(TableName=table, Key=key) for key in request["Keys"])
+            responses[table] = [r["Item"] for r in found if "Item" in r]
+        return {"Responses": responses, "UnprocessedKeys": {}}
+
+
+# -- SQS ------------------------------------------------------------------
+
+
+@dataclass
+class _Message:
+    message_id: str
+    body: str
+    sent_at: float
+    visible_at: float = 0.0
+    receive_count: int = 0
+    receipt_handle: str | None = None
+
+
+@dataclass
+class _Queue:
+    messages: dict[str, _Message] = field(default_factory=dict)  # by message ID, FIFO-ish
+    by_handle: dict[str, str] = field(default_factory=dict)
+
+
+class MemorySQS:
+    """Standard queues with visibility timeouts and long polling."""
+
+    def __init__(self, store: MemoryStore, clock: Callable[[], float] = time.time) -> None:
+        self._store = store
+        self._clock = clock
+
+    def _queue(self, url: str) -> _Queue:
+        return self._store.queues.setdefault(url, _Queue())
+
+    def send_message(self, QueueUrl: str, MessageBody: str, **_: Any) -> dict:
+        message = _Message(uuid.uuid4().hex, MessageBody, sent_at=self._clock())
+        with self._store.queue_ready:
+            self._queue(QueueUrl).messages[message.message_id] = message
+            self._store.queue_ready.notify_all()
+        return {"MessageId": message.message_id}
+
+    def send_message_batch(self, QueueUrl: str, Entries: list[dict]) -> dict:
+        successful = [
+            {"Id": entry["Id"], **self.send_message(QueueUrl, entry["MessageBody"])}
+            for entry in Entries
+        ]
+        return {"Successful": successful, "Failed": []}
+
+    def _take_visible(self, queue: _Queue, limit: int, timeout: float) -> list[_Message]:
+        now = self._clock()
+        taken = []
+        for message in queue.messages.values():
+            if len(taken) == limit:
+                break
+            if message.visible_at <= now:
+                if message.receipt_handle is not None:
+                    queue.by_handle.pop(message.receipt_handle, None)
+                message.receipt_handle = uuid.uuid4().hex
+                message.visible_at = now + timeout
+                message.receive_count += 1
+                queue.by_handle[message.receipt_handle] = message.message_id
+                taken.append(message)
+        return taken
+
+    def _next_visible_in(self, queue: _Queue) -> float | None:
+        if not queue.messages:
+            return None
+        return max(0.0, min(m.visible_at for m in queue.messages.values()) - self._clock())
+
+    def receive_message(
+        self,
+        QueueUrl: str,
+        MaxNumberOfMessages: int = 1,
+        WaitTimeSeconds: int = 0,
+        VisibilityTimeout: int | None = None,
+        **_: Any,
+    ) -> dict:
+        limit = max(1, min(MaxNumberOfMessages, MAX_RECEIVE_MESSAGES))
+        timeout = DEFAULT_VISIBILITY_TIMEOUT if VisibilityTimeout is None else VisibilityTimeout
+        deadline = time.monotonic() + WaitTimeSeconds
+        with self._store.queue_ready:
+            queue = self._queue(QueueUrl)
+            while not (taken := self._take_visible(queue, limit, timeout)):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                # Wake for new messages or when an in-flight one times out.
+                next_visible = self._next_visible_in(queue)
+                self._store.queue_ready.wait(
+                    remaining if next_visible is None else min(remaining, next_visible)
+                )
+        if not taken:
+            return {}
+        return {
+            "Messages": [
+                {
+                    "MessageId": m.message_id,
+                    "ReceiptHandle": m.receipt_handle,
+                    "Body": m.body,
+                    "Attributes": {
+                        "SentTimestamp": str(int(m.sent_at * 1000)),
+                        "ApproximateReceiveCount": str(m.receive_count),
+                    },
+                }
+                for m in taken
+            ]
+        }
+
+    def _by_handle(self, queue: _Queue, handle: str, operation: str) -> _Message:
+        message_id = queue.by_handle.get(handle)
+        if message_id is None or message_id not in queue.messages:
+            raise _error("ReceiptHandleIsInvalid", f"Invalid receipt handle {handle}", operation)
+        return queue.messages[message_id]
+
+    def delete_message(self, QueueUrl: str, ReceiptHandle: str) -> dict:
+        with self._store.queue_ready:
+            queue = self._queue(QueueUrl)
+            message_id = queue.by_handle.pop(ReceiptHandle, None)
+            if message_id is not None:
+                queue.messages.pop(message_id, None)
+        return {}
+
+    def delete_message_batch(self, QueueUrl: str, Entries: list[dict]) -> dict:
+        for entry in Entries:
+            self.delete_message(QueueUrl, entry["ReceiptHandle"])
+        return {"Successful": [{"Id": entry["Id"]} for entry in Entries], "Failed": []}
+
+    def change_message_visibility(
+        self, QueueUrl: str, ReceiptHandle: str, VisibilityTimeout: int
+    ) -> dict:
+        with self._store.queue_ready:
+            queue = self._queue(QueueUrl)
+            message = self._by_handle(queue, ReceiptHandle, "ChangeMessageVisibility")
+            message.visible_at = self._clock() + VisibilityTimeout
+            self._store.queue_ready.notify_all()
+        return {}
+
+    def change_message_visibility_batch(self, QueueUrl: str, Entries: list[dict]) -> dict:
+        successful, failed = [], []
+        for entry in Entries:
+            try:
+                self.change_message_visibility(
+                    QueueUrl, entry["ReceiptHandle"], entry["VisibilityTimeout"]
+                )
+            except ClientError as exc:
+                failed.append(
+                    {"Id": entry["Id"], "SenderFault": True, **exc.response["Error"]}
+                )
+            else:
+                successful.append({"Id": entry["Id"]})
+        return {"Successful": successful, "Failed": failed}
+
+
+# -- registry -------------------------------------------------------------
+
+
+class MemoryStore:
+    """Process-wide state behind the memory clients."""
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.queue_ready = threading.Condition()
+        self.blobs: dict[tuple[str, str], _Blob] = {}
+        self.tables: dict[str, dict[str, dict]] = {}
+        self.queues: dict[str, _Queue] = {}
+        # Base URL of the API's /blobs routes, used for presigned URLs.
+        self.blob_url: str | None = None
+
+
+store = MemoryStore()
+
+_CLIENTS = {"s3": MemoryS3, "dynamodb": MemoryDynamoDB, "sqs": MemorySQS}
+
+
+def memory_client(service_name: str) -> Any:
+    """Return a client for *service_name* backed by the process-wide store."""
+    try:
+        return _CLIENTS[service_name](store)
+    except KeyError:
+        raise ValueError(f"The memory backend has no {service_name!r} client") from None
@@ -0,0 +1,38 @@
+"""Lightweight stage timers shared by API and worker services."""
+
+from __future__ import annotations
+
+import contextlib
+import time
+from collections.abc import Iterator
+
+
+class Timings:
+    """
+    Wall-clock durations of the named stages of one unit of work.
+
+    Repeated spans with the same name accumulate, so a stage that runs once
+    per style reports its total.
+    """
+
+    def __init__(self) -> None:
+        self.spans: dict[str, float] = {}
+
+    def add(self, name: str, seconds: float) -> None:
+        self.spans[name] = self.spans.get(name, 0.0) + seconds
+
+    def set(self, name: str, seconds: float) -> None:
+        self.spans[name] = seconds
+
+    @contextlib.contextmanager
+    def span(self, name: str) -> Iterator[None]:
+        """Time the body of a ``with`` block as stage *name*."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+
+    def as_millis(self) -> dict[str, int]:
+        """Whole milliseconds per stage: compact enough to store on a record."""
+        return {name: round(seconds * 1000) for name, seconds in self.spans.items()}
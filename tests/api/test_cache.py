@@ -0,0 +1,78 @@
+import pytest
+
+from app import cache
+from app.cache import TTLCache
+
+
+class Clock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+
+def test_entries_expire_after_their_ttl(clock):
+    ttl = TTLCache(max_entries=10, ttl_seconds=5, clock=clock)
+    ttl.put("a", 1)
+    clock.now = 4.9
+    assert ttl.get("a") == 1
+    clock.now = 5
+    assert ttl.get("a") is None
+    assert len(ttl) == 0
+    assert ttl.stats() == {"size": 0, "hits": 1, "misses": 1, "evictions": 0}
+
+
+def test_per_entry_ttl_overrides_the_default(clock):
+    ttl = TTLCache(max_entries=10, ttl_seconds=5, clock=clock)
+    ttl.put("short", 1, ttl_seconds=1)
+    ttl.put("long", 2)
+    clock.now = 2
+    assert ttl.get("short") is None
+    assert ttl.get("long") == 2
+
+
+def test_least_recently_used_entry_is_evicted(clock):
+    ttl = TTLCache(max_entries=2, ttl_seconds=5, clock=clock)
+    ttl.put("a", 1)
+    ttl.put("b", 2)
+    ttl.get("a")
+    ttl.put("c", 3)
+    assert ttl.get("b") is None
+    assert ttl.get("a") == 1
+    assert ttl.get("c") == 3
+    assert ttl.stats()["evictions"] == 1
+
+
+def test_put_replaces_and_renews_an_entry(clock):
+    ttl = TTLCache(max_entries=10, ttl_seconds=5, clock=clock)
+    ttl.put("a", 1)
+    clock.now = 4
+    ttl.put("a", 2)
+    clock.now = 8
+    assert ttl.get("a") == 2
+    assert len(ttl) == 1
+
+
+def test_download_urls_are_reused_until_they_need_refreshing(clock, monkeypatch):
+    monkeypatch.setattr(cache.settings, "presign_refresh_fraction", 0.5)
+    monkeypatch.setattr(cache, "download_urls", TTLCache(10, 3600, clock=clock))
+    signed = []
+
+    def sign(key: str, expires_in: int) -> str:
+        signed.append(clock.now)
+        return f"{key}?expires={clock.now + expires_in}"
+
+    first = cache.cached_download_url("outputs/a.jpg", sign, expires_in=100)
+    clock.now = 49
+    assert cache.cached_download_url("outputs/a.jpg", sign, expires_in=100) == first
+    # A different lifetime is a different URL.
+    cache.cached_download_url("outputs/a.jpg", sign, expires_in=200)
+    clock.now = 50
+    assert cache.cached_download_url("outputs/a.jpg", sign, expires_in=100) != first
+    assert signed == [0, 49, 50]
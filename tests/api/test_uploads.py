@@ -0,0 +1,137 @@
+import json
+import threading
+
+import pytest
+from fastapi.testclient import TestClient
+
+from shared.aws import get_client
+
+from app.main import app
+from app.queue import sqs_client
+from app.queue.sqs_client import EnqueueError, enqueue_jobs
+from app.routes import uploads
+from app.settings import settings
+
+
+# Enough SendMessageBatch calls to stand for "every call from here on".
+ALWAYS = 1000
+
+
+class FlakySQS:
+    """
+    The memory SQS client, sending only the first *partial* entries of the
+    calls numbered in *failing* (from 1) and failing the others.
+    """
+
+    def __init__(self, failing: range | set[int], partial: int = 0, sender_fault: bool = True):
+        self._sqs = get_client("sqs", settings)
+        self._lock = threading.Lock()
+        self._failing = failing
+        self._partial = partial
+        self._sender_fault = sender_fault
+        self.calls: list[list[str]] = []
+
+    def send_message_batch(self, QueueUrl: str, Entries: list[dict]) -> dict:
+        with self._lock:
+            self.calls.append([entry["Id"] for entry in Entries])
+            failing = len(self.calls) in self._failing
+        accepted = self._partial if failing else len(Entries)
+        response = self._sqs.send_message_batch(QueueUrl=QueueUrl, Entries=Entries[:accepted])
+        response["Failed"] = [
+            {"Id": entry["Id"], "Code": "Rejected", "SenderFault": self._sender_fault}
+            for entry in Entries[accepted:]
+        ]
+        return response
+
+
+@pytest.fixture
+def client():
+    return TestClient(app)
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(sqs_client, "SEND_BACKOFF_SECONDS", 0)
+
+
+def _records(memory_store) -> dict[str, dict]:
+    return memory_store.tables.get(settings.dynamodb_jobs_table, {})
+
+
+def _queued(memory_store) -> list[dict]:
+    queue = memory_store.queues.get(settings.sqs_queue_url)
+    return [json.loads(m.body) for m in queue.messages.values()] if queue else []
+
+
+def test_batch_creates_and_queues_every_job(client, memory_store):
+    response = client.post("/uploads/batch", json={"count": 3, "quality": "draft"})
+    assert response.status_code == 201
+    job_ids = {job["job_id"] for job in response.json()["jobs"]}
+    assert set(_records(memory_store)) == job_ids
+    queued = _queued(memory_store)
+    assert {body["job_id"] for body in queued} == job_ids
+    assert {body["quality"] for body in queued} == {"draft"}
+
+
+def test_batch_count_is_bounded_before_styles_are_built(client, memory_store):
+    response = client.post("/uploads/batch", json={"count": 10**9})
+    assert response.status_code == 422
+    assert not _records(memory_store)
+
+
+def test_batch_rejects_unknown_styles(client):
+    response = client.post("/uploads/batch", json={"styles": ["natural", "psychedelic"]})
+    assert response.status_code == 422
+
+
+def test_failed_write_rolls_back_every_record(client, memory_store, monkeypatch):
+    put_jobs = uploads.put_jobs
+
+    def flaky_put_jobs(jobs, *args):
+        put_jobs(jobs, *args)
+        if len(jobs) < uploads.BATCH_WRITE_LIMIT:
+            raise RuntimeError("throttled")
+
+    monkeypatch.setattr(uploads, "put_jobs", flaky_put_jobs)
+    response = client.post("/uploads/batch", json={"count": uploads.BATCH_WRITE_LIMIT + 5})
+    assert response.status_code == 503
+    assert not _records(memory_store)
+    assert not _queued(memory_store)
+
+
+def test_failed_send_rolls_back_only_unqueued_jobs(client, memory_store, monkeypatch):
+    flaky = FlakySQS(failing=range(3, ALWAYS), partial=3)
+    monkeypatch.setattr(sqs_client, "get_sqs_client", lambda: flaky)
+    response = client.post("/uploads/batch", json={"count": 45})
+    assert response.status_code == 503
+    queued = {body["job_id"] for body in _queued(memory_store)}
+    # Two whole chunks of ten went out, then three entries of each of the others.
+    assert len(queued) == 2 * 10 + 3 * 3
+    assert set(_records(memory_store)) == queued
+
+
+class TestEnqueueJobs:
+    JOBS = [(f"job-{i}", f"inputs/job-{i}.jpg", "natural") for i in range(25)]
+
+    def test_retries_only_the_entries_that_failed(self, memory_store, monkeypatch):
+        flaky = FlakySQS(failing={1}, partial=9, sender_fault=False)
+        monkeypatch.setattr(sqs_client, "get_sqs_client", lambda: flaky)
+        enqueue_jobs(self.JOBS[:10])
+        assert flaky.calls == [[str(i) for i in range(10)], ["9"]]
+        assert len(_queued(memory_store)) == 10
+
+    def test_sender_faults_name_every_unqueued_job(self, memory_store, monkeypatch):
+        monkeypatch.setattr(sqs_client, "get_sqs_client", lambda: FlakySQS(failing={2}, partial=4))
+        with pytest.raises(EnqueueError) as excinfo:
+            enqueue_jobs(self.JOBS)
+        # Chunk two sent four entries; the rest of it and all of chunk three did not go.
+        assert excinfo.value.job_ids == [job_id for job_id, _, _ in self.JOBS[14:]]
+        assert len(_queued(memory_store)) == 14
+
+    def test_persistent_service_failures_give_up(self, memory_store, monkeypatch):
+        flaky = FlakySQS(failing=range(1, ALWAYS), sender_fault=False)
+        monkeypatch.setattr(sqs_client, "get_sqs_client", lambda: flaky)
+        with pytest.raises(EnqueueError) as excinfo:
+            enqueue_jobs(self.JOBS)
+        assert len(flaky.calls) == sqs_client.SEND_MAX_ATTEMPTS
+        assert len(excinfo.value.job_ids) == len(self.JOBS)
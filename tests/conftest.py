@@ -0,0 +1,28 @@
+"""Shared test setup: every service runs against the in-process memory backend."""
+
+from __future__ import annotations
+
+import os
+
+import pytest
+
+# Before any service's settings are imported.
+os.environ.update(
+    AWS_BACKEND="memory",
+    SQS_QUEUE_URL="memory://truetone-jobs",
+    SQS_INTERACTIVE_QUEUE_URL="",
+    SQS_BULK_QUEUE_URL="",
+    METRICS_PORT="0",
+)
+
+from shared.memory import store  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def memory_store():
+    """The process-wide memory store, emptied before each test."""
+    with store.lock, store.queue_ready:
+        store.blobs.clear()
+        store.tables.clear()
+        store.queues.clear()
+    return store
@@ -0,0 +1,35 @@
+"""Import helpers for tests of the two services, whose packages are both ``app``.
+
+Each service's ``conftest.py`` binds its own ``app`` package before one of
+its test modules is imported, much as ``run_local.py`` does: the other
+service's modules are set aside rather than dropped, so that neither is ever
+imported twice (which would, for one, register its metrics twice).  Test
+modules keep references to what they imported, so both suites run in one
+pytest session as long as neither service imports ``app`` lazily at call time.
+"""
+
+from __future__ import annotations
+
+import sys
+from pathlib import Path
+from types import ModuleType
+
+ROOT = Path(__file__).resolve().parents[1]
+SERVICES = ("api", "worker")
+
+_bound: str | None = None
+_stashed: dict[str, dict[str, ModuleType]] = {service: {} for service in SERVICES}
+
+
+def bind_service(service: str) -> None:
+    """Make ``import app`` resolve to *service*'s package."""
+    global _bound
+    if service == _bound:
+        return
+    if _bound is not None:
+        names = [n for n in sys.modules if n == "app" or n.startswith("app.")]
+        _stashed[_bound] = {name: sys.modules.pop(name) for name in names}
+        sys.path.remove(str(ROOT / _bound))
+    sys.modules.update(_stashed[service])
+    sys.path.insert(0, str(ROOT / service))
+    _bound = service
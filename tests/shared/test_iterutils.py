@@ -0,0 +1,17 @@
+from shared.iterutils import chunked
+
+
+def test_chunked_splits_into_slices_of_at_most_size():
+    assert list(chunked([1, 2, 3, 4, 5], 2)) == [[1, 2], [3, 4], [5]]
+
+
+def test_chunked_exact_multiple_has_no_empty_tail():
+    assert list(chunked(list(range(20)), 10)) == [list(range(10)), list(range(10, 20))]
+
+
+def test_chunked_empty_sequence_yields_nothing():
+    assert list(chunked([], 10)) == []
+
+
+def test_chunked_keeps_the_sequence_type():
+    assert list(chunked(("a", "b", "c"), 2)) == [("a", "b"), ("c",)]
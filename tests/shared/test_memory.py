@@ -0,0 +1,196 @@
+import pytest
+from botocore.exceptions import ClientError
+
+from shared.memory import MemoryDynamoDB, MemorySQS, _Condition
+
+TABLE = "jobs"
+
+
+def _item(**attrs):
+    return {
+        name: {"N": str(value)} if isinstance(value, int) else {"S": value}
+        for name, value in attrs.items()
+    }
+
+
+def _condition(expression, **values):
+    return _Condition(
+        expression,
+        {"#s": "status"},
+        {f":{name}": next(iter(_item(v=value).values())) for name, value in values.items()},
+    )
+
+
+class TestCondition:
+    def test_comparison_uses_expression_names_and_values(self):
+        condition = _condition("#s = :pending", pending="pending")
+        assert condition(_item(status="pending"))
+        assert not condition(_item(status="failed"))
+
+    def test_numbers_compare_numerically(self):
+        condition = _condition("lease_expires < :now", now=100)
+        assert condition(_item(lease_expires=99))
+        assert not condition(_item(lease_expires=100))
+        assert _condition("n >= :ten", ten=10)(_item(n=10))
+
+    def test_missing_attribute_never_matches_a_comparison(self):
+        assert not _condition("#s = :a", a="x")({})
+        assert not _condition("#s <> :a", a="x")({})
+        assert not _condition("n < :ten", ten=10)(None)
+
+    def test_attribute_exists_and_not_exists(self):
+        assert _condition("attribute_exists(job_id)")(_item(job_id="j"))
+        assert not _condition("attribute_exists(job_id)")({})
+        assert _condition("attribute_not_exists(#s)")(_item(job_id="j"))
+
+    def test_and_binds_tighter_than_or(self):
+        condition = _condition("#s = :a OR #s = :b AND n = :one", a="a", b="b", one=1)
+        assert condition(_item(status="a", n=2))
+        assert not condition(_item(status="b", n=2))
+        assert condition(_item(status="b", n=1))
+
+    def test_parentheses_and_not(self):
+        condition = _condition(
+            "NOT (#s = :a OR #s = :b) AND attribute_exists(n)", a="a", b="b"
+        )
+        assert condition(_item(status="c", n=1))
+        assert not condition(_item(status="a", n=1))
+        assert not condition(_item(status="c"))
+
+    def test_keywords_are_case_insensitive(self):
+        assert _condition("#s = :a or not #s = :a", a="a")(_item(status="b"))
+
+    def test_claim_condition(self):
+        condition = _Condition(
+            "#s = :pending OR #s = :failed OR (#s = :processing AND "
+            "(attribute_not_exists(lease_expires) OR lease_expires < :now))",
+            {"#s": "status"},
+            {
+                ":pending": {"S": "pending"},
+                ":failed": {"S": "failed"},
+                ":processing": {"S": "processing"},
+                ":now": {"N": "100"},
+            },
+        )
+        assert condition(_item(status="failed"))
+        assert condition(_item(status="processing"))
+        assert condition(_item(status="processing", lease_expires=50))
+        assert not condition(_item(status="processing", lease_expires=150))
+        assert not condition(_item(status="completed"))
+
+    @pytest.mark.parametrize("expression", ["#s = :a AND", "(#s = :a", "#s = :a :a", "#s ! :a"])
+    def test_malformed_expressions_raise(self, expression):
+        with pytest.raises(ValueError):
+            _condition(expression, a="a")(_item(status="a"))
+
+
+class TestDynamoDB:
+    @pytest.fixture
+    def dynamodb(self, memory_store):
+        return MemoryDynamoDB(memory_store)
+
+    def test_conditional_put_rejects_an_existing_item(self, dynamodb):
+        dynamodb.put_item(TableName=TABLE, Item=_item(job_id="j"))
+        with pytest.raises(ClientError) as excinfo:
+            dynamodb.put_item(
+                TableName=TABLE,
+                Item=_item(job_id="j"),
+                ConditionExpression="attribute_not_exists(job_id)",
+            )
+        assert excinfo.value.response["Error"]["Code"] == "ConditionalCheckFailedException"
+
+    def test_update_sets_and_removes_attributes(self, dynamodb):
+        dynamodb.put_item(TableName=TABLE, Item=_item(job_id="j", status="pending", error="x"))
+        response = dynamodb.update_item(
+            TableName=TABLE,
+            Key=_item(job_id="j"),
+            UpdateExpression="SET #s = :s, lease_expires = :l REMOVE error",
+            ConditionExpression="#s = :pending",
+            ExpressionAttributeNames={"#s": "status"},
+            ExpressionAttributeValues={
+                ":s": {"S": "processing"},
+                ":l": {"N": "5"},
+                ":pending": {"S": "pending"},
+            },
+            ReturnValues="ALL_NEW",
+        )
+        assert response["Attributes"] == _item(job_id="j", status="processing", lease_expires=5)
+
+    def test_failed_update_condition_leaves_the_item_unchanged(self, dynamodb):
+        dynamodb.put_item(TableName=TABLE, Item=_item(job_id="j", status="completed"))
+        with pytest.raises(ClientError):
+            dynamodb.update_item(
+                TableName=TABLE,
+                Key=_item(job_id="j"),
+                UpdateExpression="SET #s = :s",
+                ConditionExpression="#s <> :completed",
+                ExpressionAttributeNames={"#s": "status"},
+                ExpressionAttributeValues={
+                    ":s": {"S": "failed"},
+                    ":completed": {"S": "completed"},
+                },
+            )
+        item = dynamodb.get_item(TableName=TABLE, Key=_item(job_id="j"))["Item"]
+        assert item["status"] == {"S": "completed"}
+
+    def test_update_of_a_missing_item_creates_it_unless_conditioned(self, dynamodb):
+        dynamodb.update_item(
+            TableName=TABLE,
+            Key=_item(job_id="new"),
+            UpdateExpression="SET n = :n",
+            ExpressionAttributeValues={":n": {"N": "1"}},
+        )
+        assert dynamodb.get_item(TableName=TABLE, Key=_item(job_id="new"))["Item"]["n"] == {
+            "N": "1"
+        }
+        with pytest.raises(ClientError):
+            dynamodb.update_item(
+                TableName=TABLE,
+                Key=_item(job_id="other"),
+                UpdateExpression="SET n = :n",
+                ConditionExpression="attribute_exists(job_id)",
+                ExpressionAttributeValues={":n": {"N": "1"}},
+            )
+        assert "Item" not in dynamodb.get_item(TableName=TABLE, Key=_item(job_id="other"))
+
+
+class TestSQS:
+    URL = "memory://queue"
+
+    @pytest.fixture
+    def clock(self):
+        return [1000.0]
+
+    @pytest.fixture
+    def sqs(self, memory_store, clock):
+        return MemorySQS(memory_store, clock=lambda: clock[0])
+
+    def test_received_message_is_invisible_until_its_timeout(self, sqs, clock):
+        sqs.send_message(QueueUrl=self.URL, MessageBody="m")
+        first = sqs.receive_message(QueueUrl=self.URL, VisibilityTimeout=30)["Messages"][0]
+        assert first["Attributes"]["ApproximateReceiveCount"] == "1"
+        assert sqs.receive_message(QueueUrl=self.URL) == {}
+        clock[0] += 30
+        again = sqs.receive_message(QueueUrl=self.URL)["Messages"][0]
+        assert again["Attributes"]["ApproximateReceiveCount"] == "2"
+        assert again["ReceiptHandle"] != first["ReceiptHandle"]
+
+    def test_change_visibility_of_a_stale_handle_fails(self, sqs, clock):
+        sqs.send_message(QueueUrl=self.URL, MessageBody="m")
+        stale = sqs.receive_message(QueueUrl=self.URL, VisibilityTimeout=1)["Messages"][0]
+        clock[0] += 1
+        sqs.receive_message(QueueUrl=self.URL)
+        response = sqs.change_message_visibility_batch(
+            QueueUrl=self.URL,
+            Entries=[{"Id": "0", "ReceiptHandle": stale["ReceiptHandle"], "VisibilityTimeout": 0}],
+        )
+        assert [f["Code"] for f in response["Failed"]] == ["ReceiptHandleIsInvalid"]
+
+    def test_deleted_message_is_not_redelivered(self, sqs, clock):
+        sqs.send_message(QueueUrl=self.URL, MessageBody="m")
+        handle = sqs.receive_message(QueueUrl=self.URL, VisibilityTimeout=1)["Messages"][0][
+            "ReceiptHandle"
+        ]
+        sqs.delete_message_batch(QueueUrl=self.URL, Entries=[{"Id": "0", "ReceiptHandle": handle}])
+        clock[0] += 1
+        assert sqs.receive_message(QueueUrl=self.URL) == {}
@@ -0,0 +1,8 @@
+import pytest
+
+from tests.services import bind_service
+
+
+def pytest_collectstart(collector):
+    if isinstance(collector, pytest.Module):
+        bind_service("worker")
@@ -0,0 +1,91 @@
+import pytest
+
+from app.batching import MicroBatcher
+
+
+class Clock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+
+@pytest.fixture
+def batcher(clock):
+    return MicroBatcher(max_batch_size=3, max_wait_seconds=1.0, clock=clock)
+
+
+def test_rejects_empty_batches():
+    with pytest.raises(ValueError):
+        MicroBatcher(max_batch_size=0, max_wait_seconds=1.0)
+
+
+def test_full_group_is_released_at_once(batcher):
+    for item in "abc":
+        batcher.add("k", item)
+    assert batcher.pop_ready() == [["a", "b", "c"]]
+    assert len(batcher) == 0
+
+
+def test_partial_group_waits_for_its_deadline(batcher, clock):
+    batcher.add("k", "a")
+    clock.now = 0.5
+    batcher.add("k", "b")
+    assert batcher.pop_ready() == []
+    assert batcher.time_until_deadline() == pytest.approx(0.5)
+    clock.now = 1.0
+    assert batcher.pop_ready() == [["a", "b"]]
+    assert batcher.time_until_deadline() is None
+
+
+def test_flush_releases_every_group(batcher):
+    batcher.add("x", 1)
+    batcher.add("y", 2)
+    assert sorted(batcher.pop_ready(flush=True)) == [[1], [2]]
+
+
+def test_groups_are_batched_by_key(batcher, clock):
+    for item in range(4):
+        batcher.add(item % 2, item)
+    assert len(batcher) == 4
+    assert batcher.free_slots == 1
+    clock.now = 1.0
+    assert sorted(batcher.pop_ready()) == [[0, 2], [1, 3]]
+    assert batcher.free_slots == 3
+
+
+def test_overfull_group_releases_several_batches(batcher):
+    for item in range(7):
+        batcher.add("k", item)
+    assert batcher.pop_ready() == [[0, 1, 2], [3, 4, 5]]
+    assert len(batcher) == 1
+
+
+def test_leftover_items_keep_their_arrival_deadline(batcher, clock):
+    batcher.add("k", "old")
+    clock.now = 0.5
+    for item in "abc":
+        batcher.add("k", item)
+    clock.now = 0.75
+    # The full batch takes the three oldest; "c" is still due at 1.5.
+    assert batcher.pop_ready() == [["old", "a", "b"]]
+    assert batcher.time_until_deadline() == pytest.approx(0.75)
+    clock.now = 1.25
+    assert batcher.pop_ready() == []
+    clock.now = 1.5
+    assert batcher.pop_ready() == [["c"]]
+
+
+def test_deadline_is_that_of_the_oldest_group(batcher, clock):
+    batcher.add("x", 1)
+    clock.now = 0.25
+    batcher.add("y", 2)
+    assert batcher.time_until_deadline() == pytest.approx(0.75)
+    clock.now = 2.0
+    assert batcher.time_until_deadline() == 0.0
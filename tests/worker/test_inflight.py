@@ -0,0 +1,85 @@
+import time
+
+import pytest
+
+from shared.aws import get_client
+
+from app.db.dynamo_jobs import get_dynamo_client
+from app.queue.inflight import WORKER_ID, InFlight
+from app.queue.sqs_client import change_visibility, receive_messages
+from app.settings import settings
+
+
+@pytest.fixture
+def inflight():
+    return InFlight()
+
+
+@pytest.fixture
+def handle():
+    get_client("sqs", settings).send_message(
+        QueueUrl=settings.sqs_queue_url, MessageBody='{"job_id": "job-1"}'
+    )
+    (msg,) = receive_messages(wait_time_seconds=0)
+    return msg["receipt_handle"]
+
+
+def _visible_in(memory_store) -> float:
+    (message,) = memory_store.queues[settings.sqs_queue_url].messages.values()
+    return message.visible_at - time.time()
+
+
+def _snapshot(inflight: InFlight):
+    # What the heartbeat thread takes under the lock before extending.
+    with inflight._cond:
+        return list(inflight._tracked.items())
+
+
+def test_heartbeat_extends_tracked_messages(inflight, handle, memory_store):
+    inflight.track("job-1", handle, settings.sqs_queue_url)
+    change_visibility(handle, 5)
+    inflight._beat(_snapshot(inflight))
+    assert _visible_in(memory_store) == pytest.approx(settings.visibility_timeout_seconds, abs=1)
+
+
+def test_heartbeat_keeps_the_delay_of_a_message_released_meanwhile(
+    inflight, handle, memory_store
+):
+    inflight.track("job-1", handle, settings.sqs_queue_url)
+    snapshot = _snapshot(inflight)
+    # As jobs._defer does between the snapshot and the extension.
+    inflight.release(handle)
+    change_visibility(handle, 2)
+    inflight._beat(snapshot)
+    assert _visible_in(memory_store) == pytest.approx(2, abs=1)
+
+
+def test_heartbeat_forgets_messages_it_cannot_extend(inflight, handle, memory_store):
+    inflight.track("job-1", handle, settings.sqs_queue_url)
+    memory_store.queues[settings.sqs_queue_url].messages.clear()
+    inflight._beat(_snapshot(inflight))
+    assert _snapshot(inflight) == []
+
+
+def test_heartbeat_notices_a_lost_lease(inflight, handle):
+    get_dynamo_client().put_item(
+        TableName=settings.dynamodb_jobs_table,
+        Item={
+            "job_id": {"S": "job-1"},
+            "status": {"S": "processing"},
+            "worker_id": {"S": f"not-{WORKER_ID}"},
+        },
+    )
+    inflight.track("job-1", handle, settings.sqs_queue_url)
+    inflight.leased(handle)
+    inflight._beat(_snapshot(inflight))
+    ((_, tracked),) = _snapshot(inflight)
+    assert not tracked.leased
+
+
+def test_acks_are_sent_on_flush(inflight, handle, memory_store):
+    inflight.track("job-1", handle, settings.sqs_queue_url)
+    inflight.ack(handle, settings.sqs_queue_url)
+    assert _snapshot(inflight) == []
+    inflight.flush()
+    assert not memory_store.queues[settings.sqs_queue_url].messages
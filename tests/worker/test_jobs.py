@@ -0,0 +1,175 @@
+import time
+
+import pytest
+
+from shared.aws import get_client
+
+from app.db.dynamo_jobs import (
+    DuplicateDeliveryError,
+    JobNotFoundError,
+    claim_job,
+    get_dynamo_client,
+    update_job_status,
+)
+from app.jobs import InputNotUploadedError, Job, fail_job
+from app.queue.inflight import in_flight
+from app.queue.sqs_client import change_visibility, receive_messages
+from app.settings import settings
+
+JOB_ID = "job-1"
+
+
+def _put_record(status="pending", **attrs):
+    item = {"job_id": {"S": JOB_ID}, "status": {"S": status}}
+    item.update({name: {"N": str(value)} for name, value in attrs.items()})
+    get_dynamo_client().put_item(TableName=settings.dynamodb_jobs_table, Item=item)
+
+
+def _record():
+    return (
+        get_dynamo_client()
+        .get_item(TableName=settings.dynamodb_jobs_table, Key={"job_id": {"S": JOB_ID}})
+        .get("Item")
+    )
+
+
+def _receive_job() -> Job:
+    get_client("sqs", settings).send_message(
+        QueueUrl=settings.sqs_queue_url,
+        MessageBody=f'{{"job_id": "{JOB_ID}", "input_key": "inputs/{JOB_ID}.jpg"}}',
+    )
+    (msg,) = receive_messages(wait_time_seconds=0)
+    return Job.from_message(msg)
+
+
+def _message(memory_store):
+    """The queue's only message, or None once it has been acked."""
+    in_flight.flush()
+    messages = list(memory_store.queues[settings.sqs_queue_url].messages.values())
+    return messages[0] if messages else None
+
+
+def _visible_in(message) -> float:
+    return message.visible_at - time.time()
+
+
+class TestClaim:
+    def test_claims_a_pending_job_under_a_lease(self):
+        _put_record()
+        claim_job(JOB_ID, "w1", lease_seconds=60)
+        record = _record()
+        assert record["status"] == {"S": "processing"}
+        assert record["worker_id"] == {"S": "w1"}
+        assert float(record["lease_expires"]["N"]) == pytest.approx(time.time() + 60, abs=2)
+
+    def test_failed_jobs_can_be_claimed_again(self):
+        _put_record("failed")
+        claim_job(JOB_ID, "w1", lease_seconds=60)
+        assert _record()["status"] == {"S": "processing"}
+
+    def test_a_live_lease_is_a_duplicate_delivery(self):
+        _put_record()
+        claim_job(JOB_ID, "w1", lease_seconds=60)
+        with pytest.raises(DuplicateDeliveryError) as excinfo:
+            claim_job(JOB_ID, "w2", lease_seconds=60)
+        assert excinfo.value.status == "processing"
+        assert excinfo.value.lease_expires == pytest.approx(time.time() + 60, abs=2)
+        assert _record()["worker_id"] == {"S": "w1"}
+
+    def test_an_expired_lease_can_be_taken_over(self):
+        _put_record("processing", lease_expires=int(time.time()) - 10)
+        claim_job(JOB_ID, "w2", lease_seconds=60)
+        assert _record()["worker_id"] == {"S": "w2"}
+
+    def test_completed_jobs_are_duplicates(self):
+        _put_record("completed")
+        with pytest.raises(DuplicateDeliveryError) as excinfo:
+            claim_job(JOB_ID, "w1", lease_seconds=60)
+        assert excinfo.value.status == "completed"
+        assert excinfo.value.lease_expires is None
+
+    def test_missing_records_are_not_created(self):
+        with pytest.raises(JobNotFoundError):
+            claim_job(JOB_ID, "w1", lease_seconds=60)
+        assert _record() is None
+
+    def test_completed_jobs_are_never_overwritten(self):
+        _put_record("completed")
+        with pytest.raises(DuplicateDeliveryError):
+            update_job_status(JOB_ID, status="failed", error="late")
+        assert _record()["status"] == {"S": "completed"}
+
+
+class TestFail:
+    def test_receive_count_follows_redeliveries(self):
+        job = _receive_job()
+        assert job.receive_count == 1
+        in_flight.release(job.receipt_handle)
+        change_visibility(job.receipt_handle, 0)
+        (msg,) = receive_messages(wait_time_seconds=0)
+        assert msg["receive_count"] == 2
+        in_flight.release(msg["receipt_handle"])
+
+    def test_missing_record_is_retried_shortly(self, memory_store):
+        job = _receive_job()
+        fail_job(job, JobNotFoundError(JOB_ID))
+        message = _message(memory_store)
+        assert message is not None
+        assert _visible_in(message) == pytest.approx(settings.input_retry_delay_seconds, abs=1)
+        assert _record() is None
+
+    def test_missing_record_is_discarded_once_overdue(self, memory_store):
+        job = _receive_job()
+        job.sent_at = time.time() - settings.input_wait_max_seconds - 1
+        fail_job(job, JobNotFoundError(JOB_ID))
+        assert _message(memory_store) is None
+
+    def test_early_failures_are_left_for_redelivery(self, memory_store):
+        _put_record("processing")
+        job = _receive_job()
+        fail_job(job, RuntimeError("boom"))
+        record = _record()
+        assert record["status"] == {"S": "failed"}
+        assert record["error"] == {"S": "boom"}
+        assert "final" not in record
+        message = _message(memory_store)
+        assert message is not None
+        assert _visible_in(message) == pytest.approx(settings.visibility_timeout_seconds, abs=1)
+
+    def test_failure_on_the_last_delivery_is_final(self, memory_store):
+        _put_record("processing")
+        job = _receive_job()
+        job.receive_count = settings.max_receive_count
+        fail_job(job, RuntimeError("boom"))
+        assert _record()["final"] == {"BOOL": True}
+        assert _message(memory_store) is None
+
+    def test_missing_input_is_handed_back_as_pending(self, memory_store):
+        _put_record("processing")
+        job = _receive_job()
+        fail_job(job, InputNotUploadedError(job.input_key))
+        assert _record()["status"] == {"S": "pending"}
+        message = _message(memory_store)
+        assert _visible_in(message) == pytest.approx(settings.input_retry_delay_seconds, abs=1)
+
+    def test_missing_input_fails_for_good_once_overdue(self, memory_store):
+        _put_record("processing")
+        job = _receive_job()
+        job.sent_at = time.time() - settings.input_wait_max_seconds - 1
+        fail_job(job, InputNotUploadedError(job.input_key))
+        record = _record()
+        assert record["status"] == {"S": "failed"}
+        assert record["final"] == {"BOOL": True}
+        assert _message(memory_store) is None
+
+    def test_duplicate_of_a_leased_job_waits_for_the_lease(self, memory_store):
+        job = _receive_job()
+        fail_job(job, DuplicateDeliveryError(JOB_ID, "processing", time.time() + 30))
+        message = _message(memory_store)
+        # Deferred until just after the lease runs out.
+        assert 29 < _visible_in(message) <= 31
+
+    def test_duplicate_of_a_completed_job_is_acked(self, memory_store):
+        job = _receive_job()
+        fail_job(job, DuplicateDeliveryError(JOB_ID, "completed"))
+        assert _message(memory_store) is None
@@ -0,0 +1,69 @@
+from collections import Counter
+
+from app.queue.lanes import Lane, LaneScheduler
+
+INTERACTIVE = Lane("interactive", "memory://interactive", 3)
+STANDARD = Lane("standard", "memory://standard", 1)
+BULK = Lane("bulk", "memory://bulk", 0)
+LANES = [INTERACTIVE, STANDARD, BULK]
+
+
+class Clock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def _firsts(scheduler: LaneScheduler, rounds: int) -> list[str]:
+    firsts = []
+    for _ in range(rounds):
+        order = scheduler.order()
+        firsts.append(order[0].name)
+        for lane in order:
+            scheduler.checked(lane)
+    return firsts
+
+
+def test_strict_policy_keeps_priority_order():
+    scheduler = LaneScheduler(LANES, policy="strict", clock=Clock())
+    assert scheduler.order() == LANES
+
+
+def test_weighted_policy_serves_lanes_in_proportion():
+    scheduler = LaneScheduler(LANES, policy="weighted", clock=Clock())
+    firsts = _firsts(scheduler, 8)
+    assert Counter(firsts) == {"interactive": 6, "standard": 2}
+    # Smooth round robin interleaves rather than bunching the heavy lane.
+    assert firsts[:4] == ["interactive", "interactive", "standard", "interactive"]
+
+
+def test_weighted_order_lists_the_other_lanes_by_priority():
+    scheduler = LaneScheduler(LANES, policy="weighted", clock=Clock())
+    for order in (scheduler.order() for _ in range(4)):
+        rest = [lane for lane in LANES if lane != order[0]]
+        assert order[1:] == rest
+
+
+def test_zero_weights_fall_back_to_priority():
+    lanes = [Lane("interactive", "a", 0), Lane("bulk", "b", 0)]
+    scheduler = LaneScheduler(lanes, policy="weighted", clock=Clock())
+    assert [scheduler.order()[0].name for _ in range(3)] == ["interactive"] * 3
+
+
+def test_starved_lanes_move_to_the_front():
+    clock = Clock()
+    scheduler = LaneScheduler(LANES, policy="strict", max_starve_seconds=30, clock=clock)
+    clock.now = 20
+    scheduler.checked(INTERACTIVE)
+    clock.now = 25
+    scheduler.checked(STANDARD)
+    clock.now = 31
+    # Only bulk has gone unpolled for more than 30 s.
+    assert scheduler.order() == [BULK, INTERACTIVE, STANDARD]
+    clock.now = 60
+    # All starved: longest-waiting first.
+    assert scheduler.order() == [BULK, INTERACTIVE, STANDARD]
+    scheduler.checked(BULK)
+    assert scheduler.order() == [INTERACTIVE, STANDARD, BULK]
@@ -0,0 +1,194 @@
+"""Dynamic micro-batching of generation work.
+
+Jobs are collected from SQS, prepared (downloaded and segmented) and parked
+as per-style tasks in groups of compatible work. A group is released as one
+batched generator call once it reaches ``batch_max_size`` or its oldest job
+has waited ``batch_max_wait_ms``, so a lone job at low load only pays the
+wait deadline.
+"""
+
+from __future__ import annotations
+
+import math
+import time
+from collections.abc import Callable, Hashable
+from dataclasses import dataclass, field
+from typing import Generic, TypeVar
+
+from shared.logging import get_logger
+
+from app.jobs import (
+    Job,
+    Task,
+    fail_job,
+    finish_job,
+    generate_tasks,
+    max_batch_rows,
+    prepare_job,
+    tasks_for,
+)
+from app.pipeline.interfaces import Generator, Postprocessor, Segmenter
+from app.queue.sqs_client import receive_messages
+from app.settings import settings
+
+logger = get_logger(__name__)
+
+T = TypeVar("T")
+
+# SQS returns at most this many messages per ReceiveMessage call.
+SQS_RECEIVE_LIMIT = 10
+
+
+@dataclass
+class _Group(Generic[T]):
+    items: list[T] = field(default_factory=list)
+    # Arrival time of each item, oldest first
+    arrivals: list[float] = field(default_factory=list)
+
+    @property
+    def opened_at(self) -> float:
+        """Arrival of the oldest item still waiting: the group's deadline base."""
+        return self.arrivals[0]
+
+    def take(self, count: int) -> list[T]:
+        """Remove and return the *count* oldest items."""
+        taken = self.items[:count]
+        del self.items[:count], self.arrivals[:count]
+        return taken
+
+
+class MicroBatcher(Generic[T]):
+    """Group items by a compatibility key and release them as batches."""
+
+    def __init__(
+        self,
+        max_batch_size: int,
+        max_wait_seconds: float,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size must be at least 1")
+        self._max_batch_size = max_batch_size
+        self._max_wait = max_wait_seconds
+        self._clock = clock
+        self._groups: dict[Hashable, _Group[T]] = {}
+
+    def __len__(self) -> int:
+        return sum(len(g.items) for g in self._groups.values())
+
+    @property
+    def free_slots(self) -> int:
+        """Room left before the fullest group must be released."""
+        if not self._groups:
+            return self._max_batch_size
+        return self._max_batch_size - max(len(g.items) for g in self._groups.values())
+
+    def add(self, key: Hashable, item: T) -> None:
+        group = self._groups.setdefault(key, _Group())
+        group.items.append(item)
+        group.arrivals.append(self._clock())
+
+    def time_until_deadline(self) -> float | None:
+        """Seconds until the oldest group is due, or None when empty."""
+        if not self._groups:
+            return None
+        oldest = min(g.opened_at for g in self._groups.values())
+        return max(0.0, oldest + self._max_wait - self._clock())
+
+    def pop_ready(self, flush: bool = False) -> list[list[T]]:
+        """
+        Remove and return every batch that is due.
+
+        A group is due when it is full or its oldest item has waited
+        ``max_wait_seconds``; with *flush* every pending group is released
+        regardless. Items left over after a full batch keep their own
+        arrival times, so their deadline is not pushed back.
+        """
+        now = self._clock()
+        ready: list[list[T]] = []
+        for key in list(self._groups):
+            group = self._groups[key]
+            while len(group.items) >= self._max_batch_size:
+                ready.append(group.take(self._max_batch_size))
+            if group.items and (flush or now - group.opened_at >= self._max_wait):
+                ready.append(group.take(len(group.items)))
+            if not group.items:
+                del self._groups[key]
+        return ready
+
+
+def batch_key(task: Task, generator: Generator) -> Hashable:
+    """
+    Tasks can share a generator call when their target resolution and
+    quality tier (scheduler and step count) match.
+
+    Prompts need not match: the generator feeds each row its own cached
+    prompt embeddings, so mixed styles batch as well as identical ones.
+    """
+    return generator.output_size(task.job.model_image), task.job.quality
+
+
+def run_batch(
+    batch: list[Task],
+    generator: Generator,
+    postprocessor: Postprocessor,
+) -> None:
+    """Run one batched generator call and finish every job it completes."""
+    logger.info("Generating batch of %d task(s)", len(batch))
+    ready, _ = generate_tasks(batch, generator)
+    for job in ready:
+        try:
+            finish_job(job, postprocessor)
+        except Exception as exc:
+            fail_job(job, exc)
+
+
+def _receive_wait_seconds(batcher: MicroBatcher[Task]) -> int:
+    remaining = batcher.time_until_deadline()
+    if remaining is None:
+        return settings.sqs_wait_time_seconds
+    # SQS long polling only takes whole seconds; never overshoot the deadline.
+    return min(settings.sqs_wait_time_seconds, math.floor(remaining))
+
+
+def run_batched(
+    segmenter: Segmenter,
+    generator: Generator,
+    postprocessor: Postprocessor,
+) -> None:
+    """Polling loop that feeds the generator with micro-batches."""
+    batcher: MicroBatcher[Task] = MicroBatcher(
+        max_batch_size=max_batch_rows(),
+        max_wait_seconds=settings.batch_max_wait_ms / 1000,
+    )
+
+    while True:
+        wait_seconds = _receive_wait_seconds(batcher)
+        try:
+            messages = receive_messages(
+                wait_time_seconds=wait_seconds,
+                max_messages=min(SQS_RECEIVE_LIMIT, batcher.free_slots),
+            )
+        except Exception:
+            logger.exception("Error receiving messages from SQS – retrying in 5 s")
+            time.sleep(5)
+            continue
+
+        for msg in messages:
+            job = Job.from_message(msg)
+            try:
+                if not prepare_job(job, segmenter, generator):
+                    continue
+            except Exception as exc:
+                fail_job(job, exc)
+                continue
+            for task in tasks_for(job):
+                batcher.add(batch_key(task, generator), task)
+
+        if not messages and batcher:
+            # Nothing arrived during a sub-second poll: sleep out the deadline
+            # instead of hammering SQS with zero-wait receives.
+            time.sleep(batcher.time_until_deadline() or 0.0)
+
+        for batch in batcher.pop_ready():
+            run_batch(batch, generator, postprocessor)
@@ -2,17 +2,115 @@
 
 from __future__ import annotations
 
-import boto3
+import time
+
 from botocore.client import BaseClient
+from botocore.exceptions import ClientError
+
+from shared.aws import get_client
 
 from app.settings import settings
 
 
 def get_dynamo_client() -> BaseClient:
-    kwargs: dict = {"region_name": settings.aws_region}
-    if settings.aws_endpoint_url:
-        kwargs["endpoint_url"] = settings.aws_endpoint_url
-    return boto3.client("dynamodb", **kwargs)
+    return get_client("dynamodb", settings)
+
+
+class JobNotFoundError(Exception):
+    """Raised when a message refers to a job that has no record."""
+
+
+class DuplicateDeliveryError(Exception):
+    """
+    Raised when a message's job is already completed or leased to another
+    worker, i.e. the message is a duplicate or late redelivery.
+    """
+
+    def __init__(self, job_id: str, status: str, lease_expires: float | None = None) -> None:
+        super().__init__(f"Job {job_id} is already {status}")
+        self.job_id = job_id
+        self.status = status
+        self.lease_expires = lease_expires
+
+
+def _conflict(job_id: str) -> Exception:
+    """Explain a failed conditional write: a missing record or another owner."""
+    client = get_dynamo_client()
+    item = client.get_item(
+        TableName=settings.dynamodb_jobs_table,
+        Key={"job_id": {"S": job_id}},
+        ConsistentRead=True,
+    ).get("Item")
+    if item is None:
+        return JobNotFoundError(job_id)
+    lease = item.get("lease_expires")
+    return DuplicateDeliveryError(
+        job_id, item["status"]["S"], float(lease["N"]) if lease else None
+    )
+
+
+def claim_job(job_id: str, worker_id: str, lease_seconds: int) -> None:
+    """
+    Move a job to ``processing`` under a lease held by *worker_id*.
+
+    Only pending or failed jobs, and processing jobs whose lease has run out
+    (or that predate leases), can be claimed. Otherwise raises
+    :class:`DuplicateDeliveryError`, or :class:`JobNotFoundError` when the
+    job has no record.
+    """
+    client = get_dynamo_client()
+    now = time.time()
+    try:
+        client.update_item(
+            TableName=settings.dynamodb_jobs_table,
+            Key={"job_id": {"S": job_id}},
+            UpdateExpression="SET #s = :processing, worker_id = :worker, lease_expires = :lease",
+            ConditionExpression=(
+                "#s = :pending OR #s = :failed OR (#s = :processing AND "
+                "(attribute_not_exists(lease_expires) OR lease_expires < :now))"
+            ),
+            ExpressionAttributeNames={"#s": "status"},
+            ExpressionAttributeValues={
+                ":processing": {"S": "processing"},
+                ":pending": {"S": "pending"},
+                ":failed": {"S": "failed"},
+                ":worker": {"S": worker_id},
+                ":lease": {"N": str(int(now + lease_seconds))},
+                ":now": {"N": str(int(now))},
+            },
+        )
+    except ClientError as exc:
+        if exc.response["Error"]["Code"] == "ConditionalCheckFailedException":
+            raise _conflict(job_id) from exc
+        raise
+
+
+def renew_lease(job_id: str, worker_id: str, lease_seconds: int) -> bool:
+    """
+    Extend *worker_id*'s lease on a processing job.
+
+    Returns False without writing when the job is no longer processing under
+    that worker.
+    """
+    client = get_dynamo_client()
+    try:
+        client.update_item(
+            TableName=settings.dynamodb_jobs_table,
+            Key={"job_id": {"S": job_id}},
+            UpdateExpression="SET lease_expires = :lease",
+            ConditionExpression="#s = :processing AND worker_id = :worker",
+            ExpressionAttributeNames={"#s": "status"},
+            ExpressionAttributeValues={
+                ":lease": {"N": str(int(time.time() + lease_seconds))},
+                ":processing": {"S": "processing"},
+                ":worker": {"S": worker_id},
+            },
+        )
+    except ClientError as exc:
+        if exc.response["Error"]["Code"] == "ConditionalCheckFailedException":
+            return False
+        raise
+    return True
 
 
 def update_job_status(
@@ -20,27 +118,96 @@ def update_job_status(
     status: str,
     output_key: str | None = None,
     error: str | None = None,
+    output_keys: dict[str, str] | None = None,
+    timings: dict[str, int] | None = None,
+    peak_rss_mb: int | None = None,
+    final: bool = False,
 ) -> None:
-    """Update the status (and optionally output_key/error) for a job."""
+    """
+    Update the status (and optionally output_key/error) for a job.
+
+    *output_keys* maps style to output key for multi-style jobs; *timings*
+    maps pipeline stage to milliseconds; *peak_rss_mb* is the worker's peak
+    memory while the job ran; *final* marks a failure that will not be
+    retried.
+
+    Raises :class:`JobNotFoundError` instead of creating a record when the
+    job does not exist (e.g. the API rolled back a half-created job), and
+    :class:`DuplicateDeliveryError` rather than overwrite a completed job.
+    """
     client = get_dynamo_client()
 
     update_expr_parts = ["#s = :status"]
     expr_names: dict = {"#s": "status"}
-    expr_values: dict = {":status": {"S": status}}
+    expr_values: dict = {":status": {"S": status}, ":completed": {"S": "completed"}}
 
     if output_key is not None:
         update_expr_parts.append("output_key = :output_key")
         expr_values[":output_key"] = {"S": output_key}
 
+    if output_keys is not None:
+        update_expr_parts.append("output_keys = :output_keys")
+        expr_values[":output_keys"] = {
+            "M": {style: {"S": key} for style, key in output_keys.items()}
+        }
+
+    if timings is not None:
+        update_expr_parts.append("timings = :timings")
+        expr_values[":timings"] = {
+            "M": {stage: {"N": str(ms)} for stage, ms in timings.items()}
+        }
+
+    if peak_rss_mb is not None:
+        update_expr_parts.append("peak_rss_mb = :peak_rss_mb")
+        expr_values[":peak_rss_mb"] = {"N": str(peak_rss_mb)}
+
+    if final:
+        update_expr_parts.append("#f = :final")
+        expr_names["#f"] = "final"  # a reserved word
+        expr_values[":final"] = {"BOOL": True}
+
     if error is not None:
         update_expr_parts.append("#e = :error")
         expr_names["#e"] = "error"
         expr_values[":error"] = {"S": error}
 
-    client.update_item(
-        TableName=settings.dynamodb_jobs_table,
-        Key={"job_id": {"S": job_id}},
-        UpdateExpression="SET " + ", ".join(update_expr_parts),
-        ExpressionAttributeNames=expr_names,
-        ExpressionAttributeValues=expr_values,
-    )
+    try:
+        client.update_item(
+            TableName=settings.dynamodb_jobs_table,
+            Key={"job_id": {"S": job_id}},
+            UpdateExpression="SET " + ", ".join(update_expr_parts),
+            ConditionExpression="attribute_exists(job_id) AND #s <> :completed",
+            ExpressionAttributeNames=expr_names,
+            ExpressionAttributeValues=expr_values,
+        )
+    except ClientError as exc:
+        if exc.response["Error"]["Code"] == "ConditionalCheckFailedException":
+            raise _conflict(job_id) from exc
+        raise
+
+
+def set_preview_key(job_id: str, preview_key: str) -> bool:
+    """
+    Point a processing job's record at its preview image.
+
+    Returns False without writing when the job is no longer processing, so
+    a late preview never lands on a finished job.
+    """
+    client = get_dynamo_client()
+    try:
+        client.update_item(
+            TableName=settings.dynamodb_jobs_table,
+            Key={"job_id": {"S": job_id}},
+            UpdateExpression="SET preview_key = :preview_key",
+            ConditionExpression="#s = :processing",
+            ExpressionAttributeNames={"#s": "status"},
+            ExpressionAttributeValues={
+                ":preview_key": {"S": preview_key},
+                ":processing": {"S": "processing"},
+            },
+        )
+    except ClientError as exc:
+        if exc.response["Error"]["Code"] == "ConditionalCheckFailedException":
+            return False
+        raise
+    return True
@@ -0,0 +1,630 @@
+"""Per-job pipeline stages shared by the worker's processing loops."""
+
+from __future__ import annotations
+
+import contextlib
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import ContextManager
+
+from botocore.exceptions import ClientError
+from PIL import Image
+
+from shared.iterutils import chunked
+from shared.logging import get_logger, log_event
+from shared.timing import Timings
+
+from app import metrics, result_cache, rss
+from app.db.dynamo_jobs import (
+    DuplicateDeliveryError,
+    JobNotFoundError,
+    claim_job,
+    set_preview_key,
+    update_job_status,
+)
+from app.pipeline.budget import input_pixel_cap
+from app.pipeline.crop import Box, box_coverage, mask_bbox, paste_feathered, scaled_size
+from app.pipeline.interfaces import Generator, Postprocessor, PreviewCallback, Segmenter
+from app.pipeline.postprocess import feather_mask
+from app.pipeline.resolution import fit_to_model, model_size, upsample_chroma
+from app.pipeline.styles import DEFAULT_STYLE, get_prompt
+from app.pipeline.tiers import DEFAULT_QUALITY, get_tier
+from app.queue.inflight import WORKER_ID, in_flight
+from app.queue.sqs_client import change_visibility
+from app.settings import settings
+from app.storage.s3_client import (
+    decode_image,
+    download_object,
+    encode_image,
+    upload_buffer,
+    write_image,
+)
+
+logger = get_logger(__name__)
+
+# Previews are composed and uploaded off the generation thread.
+_preview_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="preview")
+
+
+# SQS caps a message's visibility timeout at 12 hours.
+MAX_VISIBILITY_SECONDS = 12 * 60 * 60
+
+
+class InputNotUploadedError(Exception):
+    """The job's input is not in the bucket yet: its client is still uploading."""
+
+
+@dataclass
+class Job:
+    """
+    A colouring job as it moves through the pipeline stages.
+
+    A job renders its input in one or more *styles*; single-style jobs keep
+    the ``outputs/{job_id}.jpg`` key, multi-style jobs write one object per
+    style under ``outputs/{job_id}/``. Stage durations accumulate in
+    *timings* and are stored on the record when the job ends.
+    """
+
+    job_id: str
+    input_key: str
+    styles: list[str] = field(default_factory=lambda: [DEFAULT_STYLE])
+    quality: str = DEFAULT_QUALITY
+    receipt_handle: str | None = None
+    # Priority lane and queue the message came from (acks go back to it)
+    lane: str = "standard"
+    queue_url: str | None = None
+    image: Image.Image | None = None
+    mask: Image.Image | None = None
+    # Generator inputs: the mask's bounding box (crop_box) or the whole frame,
+    # possibly downscaled to the model's resolution
+    crop_box: Box | None = None
+    model_image: Image.Image | None = None
+    model_mask: Image.Image | None = None
+    generated: dict[str, Image.Image] = field(default_factory=dict)
+    output_keys: dict[str, str] = field(default_factory=dict)
+    digests: dict[str, str] = field(default_factory=dict)
+    failed: bool = False
+    # Epoch seconds at which the message was sent and received
+    sent_at: float | None = None
+    received_at: float = field(default_factory=time.time)
+    # Deliveries of the message so far, this one included
+    receive_count: int = 1
+    timings: Timings = field(default_factory=Timings)
+    peak_rss_mb: int | None = None
+
+    @classmethod
+    def from_message(cls, msg: dict) -> Job:
+        """Build a job from a message returned by ``receive_messages``."""
+        body = msg["body"]
+        styles = body.get("styles") or [body.get("style", DEFAULT_STYLE)]
+        job = cls(
+            job_id=body.get("job_id", "unknown"),
+            input_key=body.get("input_key", ""),
+            styles=list(dict.fromkeys(styles)),
+            quality=body.get("quality", DEFAULT_QUALITY),
+            receipt_handle=msg["receipt_handle"],
+            lane=msg.get("lane", "standard"),
+            queue_url=msg.get("queue_url") or settings.sqs_queue_url,
+            sent_at=msg.get("sent_at"),
+            received_at=msg.get("received_at") or time.time(),
+            receive_count=msg.get("receive_count", 1),
+        )
+        if job.receipt_handle is not None:
+            in_flight.track(job.job_id, job.receipt_handle, job.queue_url)
+        if job.sent_at is not None:
+            queue_wait = max(0.0, job.received_at - job.sent_at)
+            job.timings.add("queue_wait", queue_wait)
+            metrics.queue_wait_seconds.labels(job.lane).observe(queue_wait)
+        return job
+
+    @property
+    def multi_style(self) -> bool:
+        return len(self.styles) > 1
+
+    def output_key_for(self, style: str) -> str:
+        if self.multi_style:
+            return f"outputs/{self.job_id}/{style}.jpg"
+        return f"outputs/{self.job_id}.jpg"
+
+    def release_images(self) -> None:
+        """Drop every image the job holds, once it has ended."""
+        self.image = self.mask = None
+        self.model_image = self.model_mask = None
+        self.generated.clear()
+
+    def pending_styles(self) -> list[str]:
+        """Styles still waiting for generation (not cached, not generated)."""
+        return [
+            style
+            for style in self.styles
+            if style not in self.output_keys and style not in self.generated
+        ]
+
+
+@dataclass(frozen=True, eq=False)
+class Task:
+    """One row of generator work: a job's input rendered in one style."""
+
+    job: Job
+    style: str
+
+    @property
+    def prompt(self) -> str:
+        return get_prompt(self.style)
+
+
+def tasks_for(job: Job) -> list[Task]:
+    return [Task(job, style) for style in job.pending_styles()]
+
+
+def max_batch_rows() -> int:
+    """Rows per generator call: ``batch_max_size``, or one within a memory budget."""
+    return 1 if settings.memory_budget_mb > 0 else settings.batch_max_size
+
+
+def load_input(job: Job) -> None:
+    """Claim the job and download/decode its input in memory."""
+    claim_job(job.job_id, WORKER_ID, settings.job_lease_seconds)
+    if job.receipt_handle is not None:
+        in_flight.leased(job.receipt_handle)
+    logger.info("Processing job %s (styles=%s)", job.job_id, ",".join(job.styles))
+    with job.timings.span("download"):
+        try:
+            data = download_object(job.input_key)
+        except ClientError as exc:
+            if exc.response["Error"]["Code"] in ("NoSuchKey", "404"):
+                raise InputNotUploadedError(job.input_key) from exc
+            raise
+    with job.timings.span("decode"):
+        job.image = decode_image(
+            data, input_pixel_cap(settings.memory_budget_mb, settings.max_input_pixels)
+        )
+
+
+def reuse_cached_result(job: Job) -> bool:
+    """
+    Take results for identical earlier inputs from the result cache.
+
+    Cached styles are skipped by generation. Returns True (after completing
+    the job) when every style was cached and no further work is needed.
+    """
+    if not settings.result_cache_enabled:
+        return False
+
+    with job.timings.span("cache_check"):
+        fingerprint = result_cache.image_fingerprint(job.image)
+        for style in job.styles:
+            digest = job.digests[style] = result_cache.input_digest(
+                fingerprint, get_prompt(style), job.quality
+            )
+            cached_key = result_cache.lookup(digest)
+            metrics.result_cache_lookups.labels("miss" if cached_key is None else "hit").inc()
+            if cached_key is not None:
+                job.output_keys[style] = cached_key
+
+    if job.pending_styles():
+        return False
+
+    _complete(job, outcome="cached")
+    logger.info("Job %s served from result cache", job.job_id)
+    return True
+
+
+def segment_input(job: Job, segmenter: Segmenter) -> None:
+    """Compute the foreground mask for the job's input image."""
+    with job.timings.span("segment"):
+        job.mask = segmenter.segment(job.image)
+
+
+def _crop_box(job: Job) -> Box | None:
+    if not settings.crop_to_mask:
+        return None
+    box = mask_bbox(job.mask, padding=settings.crop_padding)
+    if box is None or box_coverage(box, job.image.size) > settings.crop_max_coverage:
+        return None
+    return box
+
+
+def fit_input_to_model(job: Job, generator: Generator) -> None:
+    """
+    Select the region to generate and scale it to the generator's resolution.
+
+    Small subjects are cropped to the mask's padded bounding box and rendered
+    at the pixel density the whole frame would have had.
+    """
+    job.crop_box = _crop_box(job)
+    if job.crop_box is None:
+        image, mask = job.image, job.mask
+    else:
+        image, mask = job.image.crop(job.crop_box), job.mask.crop(job.crop_box)
+
+    native = generator.native_resolution
+    if native is None:
+        job.model_image, job.model_mask = image, mask
+        return
+
+    full_width, full_height = model_size(
+        job.image.size,
+        native,
+        preserve_aspect=settings.resolution_mode == "adaptive",
+    )
+    if job.crop_box is None:
+        size = (full_width, full_height)
+    else:
+        scale = (full_width / job.image.width, full_height / job.image.height)
+        size = scaled_size(
+            image.size,
+            scale,
+            multiple=settings.crop_size_multiple,
+            min_side=settings.crop_min_side,
+        )
+    job.model_image, job.model_mask = fit_to_model(image, mask, size)
+
+
+def prepare_job(
+    job: Job,
+    segmenter: Segmenter,
+    generator: Generator,
+    segment_lock: ContextManager | None = None,
+) -> bool:
+    """
+    Run every stage up to generation: claim, download, result-cache check,
+    segmentation and model fitting.
+
+    Returns False when the job was completed from the cache and needs no
+    generation. *segment_lock* serialises segmentation across threads.
+    Jobs whose image was already loaded (e.g. handed over by the supervisor)
+    skip the claim and download.
+    """
+    rss.tracker.job_started(job.job_id)
+    get_tier(job.quality)  # reject unknown tiers before any work
+    if job.image is None:
+        load_input(job)
+    if reuse_cached_result(job):
+        return False
+    with segment_lock or contextlib.nullcontext():
+        segment_input(job, segmenter)
+    with job.timings.span("fit"):
+        fit_input_to_model(job, generator)
+    return True
+
+
+def generate_tasks(tasks: list[Task], generator: Generator) -> tuple[list[Job], list[Job]]:
+    """
+    Run *tasks* as one batched generator call; they must share a quality tier.
+
+    Returns ``(ready, failed)``: jobs whose every style is now generated,
+    and jobs that failed in this call. Tasks of already failed jobs are
+    dropped. Every job in the call is charged the call's full duration.
+    """
+    tasks = [task for task in tasks if not task.job.failed]
+    jobs = list({id(task.job): task.job for task in tasks}.values())
+    if not tasks:
+        return [], []
+
+    quality = tasks[0].job.quality
+    step_times: list[float] = []
+    metrics.batch_size.observe(len(tasks))
+    start = time.perf_counter()
+    try:
+        outputs = generator.generate_batch(
+            [task.job.model_image for task in tasks],
+            [task.job.model_mask for task in tasks],
+            [task.prompt for task in tasks],
+            quality=quality,
+            preview=_preview_callback(tasks),
+            step_times=step_times,
+        )
+    except Exception as exc:
+        for job in jobs:
+            fail_job(job, exc)
+        return [], jobs
+    elapsed = time.perf_counter() - start
+
+    for seconds in step_times:
+        metrics.denoise_step_seconds.labels(quality).observe(seconds)
+    for job in jobs:
+        job.timings.add("generate", elapsed)
+        if step_times:
+            # Mean step of the job's latest call; the full list is in metrics.
+            job.timings.set("step", sum(step_times) / len(step_times))
+
+    for task, generated in zip(tasks, outputs):
+        task.job.generated[task.style] = generated
+    ready = [job for job in jobs if not job.pending_styles()]
+    for job in ready:
+        job.model_image = job.model_mask = None
+    return ready, []
+
+
+def _restore(
+    generated: Image.Image,
+    image: Image.Image,
+    crop_box: Box | None,
+    crop_feather: int,
+) -> Image.Image:
+    """Bring a generator output back to *image*'s size and luminance."""
+    region = image if crop_box is None else image.crop(crop_box)
+    restored = upsample_chroma(
+        generated,
+        region,
+        radius=settings.chroma_guide_radius,
+        eps=settings.chroma_guide_eps,
+    )
+    if crop_box is not None:
+        restored = paste_feathered(image, restored, crop_box, feather=crop_feather)
+    return restored
+
+
+def _preview_callback(tasks: list[Task]) -> PreviewCallback | None:
+    """Publish a preview of each job's first style when the generator offers one."""
+    if not settings.previews_enabled:
+        return None
+    rows = [(i, task.job) for i, task in enumerate(tasks) if task.style == task.job.styles[0]]
+    if not rows:
+        return None
+
+    def on_preview(images: list[Image.Image]) -> None:
+        for i, job in rows:
+            # Snapshot the references here: the job may end, releasing its
+            # images, while the pool thread is still composing.
+            image, mask = job.image, job.mask
+            if image is None or mask is None:
+                continue
+            _preview_pool.submit(
+                publish_preview, job.job_id, image, mask, job.crop_box, images[i]
+            )
+
+    return on_preview
+
+
+def publish_preview(
+    job_id: str,
+    original: Image.Image,
+    full_mask: Image.Image,
+    full_crop_box: Box | None,
+    approximate: Image.Image,
+) -> None:
+    """
+    Compose an in-progress generator output into a small preview, upload it
+    to ``previews/{job_id}.jpg`` and reference it from the job record.
+
+    Takes the job's input, mask and crop box rather than the job, whose
+    images are released when it ends.
+    """
+    try:
+        scale = min(1.0, settings.preview_max_side / max(original.size))
+        size = (max(1, round(original.width * scale)), max(1, round(original.height * scale)))
+        image = original.convert("RGB").resize(size, Image.BILINEAR)
+        mask = full_mask.resize(size, Image.BILINEAR)
+        crop_box = None
+        if full_crop_box is not None:
+            crop_box = tuple(round(v * scale) for v in full_crop_box)
+
+        restored = _restore(
+            approximate, image, crop_box, round(settings.crop_feather * scale)
+        )
+        preview = Image.composite(
+            restored, image, feather_mask(mask, round(settings.blend_feather * scale))
+        )
+        key = f"previews/{job_id}.jpg"
+        write_image(preview, key, format="JPEG")
+        if set_preview_key(job_id, key):
+            logger.info("Job %s preview at %s", job_id, key)
+    except Exception:
+        logger.exception("Could not publish preview for job %s", job_id)
+
+
+def finish_job(job: Job, postprocessor: Postprocessor) -> None:
+    """
+    Restore each result to full resolution, blend, encode and upload it,
+    then mark the job completed.
+
+    Styles are blended together, or one at a time within a memory budget so
+    that only one style's full-resolution images are held at once.
+    """
+    styles = list(job.generated)
+    group_size = 1 if settings.memory_budget_mb > 0 else len(styles)
+    for group in chunked(styles, group_size):
+        with job.timings.span("postprocess"):
+            restored = [
+                _restore(job.generated.pop(style), job.image, job.crop_box, settings.crop_feather)
+                for style in group
+            ]
+            results = postprocessor.process_batch(
+                [job.image] * len(group), restored, [job.mask] * len(group)
+            )
+            del restored
+        for style, result in zip(group, results):
+            output_key = job.output_key_for(style)
+            with job.timings.span("encode"):
+                buffer = encode_image(result, format="JPEG")
+            with job.timings.span("upload"):
+                upload_buffer(buffer, output_key, format="JPEG")
+            del buffer
+
+            job.output_keys[style] = output_key
+            digest = job.digests.get(style)
+            if digest is not None:
+                try:
+                    result_cache.store(digest, output_key)
+                except Exception:
+                    logger.exception("Could not index result of job %s", job.job_id)
+        del results
+
+    _complete(job)
+    logger.info(
+        "Job %s completed – output at %s", job.job_id, ", ".join(job.output_keys.values())
+    )
+
+
+def process(
+    job: Job,
+    segmenter: Segmenter,
+    generator: Generator,
+    postprocessor: Postprocessor,
+) -> None:
+    """
+    Run every stage for a single job; failures are recorded on the job.
+
+    A multi-style job is generated in calls of at most :func:`max_batch_rows`
+    styles, like jobs grouped by the batched modes.
+    """
+    if not prepare_job(job, segmenter, generator):
+        return
+    for tasks in chunked(tasks_for(job), max_batch_rows()):
+        _, failed = generate_tasks(tasks, generator)
+        if failed:
+            return
+    finish_job(job, postprocessor)
+
+
+def _record_timings(job: Job, outcome: str) -> dict[str, int]:
+    """
+    Close the job's timings and peak RSS, log them, feed the metrics and
+    release the job's images.
+    """
+    job.timings.set("total", max(0.0, time.time() - job.received_at))
+    job.peak_rss_mb = rss.tracker.job_finished(job.job_id)
+    job.release_images()
+    metrics.observe_stages(job.timings.spans)
+    metrics.jobs_total.labels(outcome).inc()
+    if job.peak_rss_mb is not None:
+        metrics.job_peak_rss_bytes.observe(job.peak_rss_mb * 2**20)
+    timings = job.timings.as_millis()
+    log_event(
+        logger,
+        "job_timings",
+        job_id=job.job_id,
+        outcome=outcome,
+        quality=job.quality,
+        peak_rss_mb=job.peak_rss_mb,
+        **timings,
+    )
+    return timings
+
+
+def _drop(job: Job) -> None:
+    """End a job that is handed back or discarded without a result."""
+    rss.tracker.job_finished(job.job_id)
+    job.release_images()
+
+
+def _complete(job: Job, outcome: str = "completed") -> None:
+    update_job_status(
+        job.job_id,
+        status="completed",
+        output_key=job.output_keys[job.styles[0]],
+        output_keys=job.output_keys if job.multi_style else None,
+        timings=_record_timings(job, outcome),
+        peak_rss_mb=job.peak_rss_mb,
+    )
+    _ack(job)
+
+
+def _ack(job: Job) -> None:
+    if job.receipt_handle is not None:
+        in_flight.ack(job.receipt_handle, job.queue_url)
+
+
+def _defer(job: Job, delay_seconds: int) -> None:
+    """Release the job's message so that it is delivered again after *delay_seconds*."""
+    if job.receipt_handle is None:
+        return
+    in_flight.release(job.receipt_handle)
+    change_visibility(job.receipt_handle, delay_seconds, job.queue_url)
+
+
+def _input_overdue(job: Job) -> bool:
+    created = job.sent_at if job.sent_at is not None else job.received_at
+    return time.time() - created > settings.input_wait_max_seconds
+
+
+def fail_job(job: Job, exc: BaseException) -> None:
+    """
+    Record a failure; the message is left on the queue for redelivery until
+    its ``max_receive_count``-th delivery, when the failure becomes final.
+    """
+    job.failed = True
+    if isinstance(exc, JobNotFoundError):
+        _drop(job)
+        if _input_overdue(job):
+            # Orphaned message (its record was never written): nothing to retry.
+            logger.warning("Discarding message for unknown job %s", job.job_id)
+            _ack(job)
+            return
+        # The API writes the record and sends the message concurrently, so
+        # the message can arrive first: look again shortly.
+        logger.info(
+            "Job %s has no record yet; retrying in %d s",
+            job.job_id,
+            settings.input_retry_delay_seconds,
+        )
+        try:
+            _defer(job, settings.input_retry_delay_seconds)
+        except Exception:
+            logger.exception("Could not requeue job %s", job.job_id)
+        return
+
+    if isinstance(exc, DuplicateDeliveryError):
+        _drop(job)
+        metrics.jobs_total.labels("duplicate").inc()
+        if exc.status == "processing" and exc.lease_expires is not None:
+            # Another worker holds the lease: look again once it has run out,
+            # in case that worker dies before finishing.
+            remaining = int(exc.lease_expires - time.time()) + 1
+            delay = max(1, min(remaining, MAX_VISIBILITY_SECONDS))
+            logger.info("Job %s is leased to another worker; deferring %d s", job.job_id, delay)
+            try:
+                _defer(job, delay)
+            except Exception:
+                logger.exception("Could not defer job %s", job.job_id)
+        else:
+            logger.info("Job %s is already %s; acking duplicate message", job.job_id, exc.status)
+            _ack(job)
+        return
+
+    if isinstance(exc, InputNotUploadedError) and not _input_overdue(job):
+        # Jobs are queued when created, so a fast worker can get there before
+        # the client's upload: hand the job back and look again shortly.
+        logger.info(
+            "Input of job %s not uploaded yet; retrying in %d s",
+            job.job_id,
+            settings.input_retry_delay_seconds,
+        )
+        _drop(job)
+        try:
+            update_job_status(job.job_id, status="pending")
+            _defer(job, settings.input_retry_delay_seconds)
+        except Exception:
+            logger.exception("Could not requeue job %s", job.job_id)
+        return
+
+    # An input still missing once its upload URL has expired never arrives.
+    final = (
+        job.receive_count >= settings.max_receive_count
+        or isinstance(exc, InputNotUploadedError)
+    )
+    logger.exception(
+        "Failed to process job %s (delivery %d of %d)",
+        job.job_id,
+        job.receive_count,
+        settings.max_receive_count,
+    )
+    if job.receipt_handle is not None and not final:
+        in_flight.release(job.receipt_handle)
+    timings = _record_timings(job, "failed")
+    try:
+        update_job_status(
+            job.job_id,
+            status="failed",
+            error=str(exc),
+            timings=timings,
+            peak_rss_mb=job.peak_rss_mb,
+            final=final,
+        )
+    except Exception:
+        logger.exception("Could not mark job %s as failed", job.job_id)
+    if final:
+        _ack(job)
@@ -0,0 +1,79 @@
+"""Prometheus metrics for the worker, served by a small sidecar HTTP server.
+
+Stage durations are observed from the same :class:`~shared.timing.Timings`
+that are logged and stored on each job record, so dashboards and per-job
+breakdowns always agree.
+"""
+
+from __future__ import annotations
+
+from prometheus_client import Counter, Histogram, start_http_server
+
+from shared.logging import get_logger
+
+from app.settings import settings
+
+logger = get_logger(__name__)
+
+# Stages span milliseconds (decode) to minutes (high-tier generation on CPU).
+STAGE_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0,
+)
+
+stage_seconds = Histogram(
+    "truetone_worker_stage_seconds",
+    "Time spent per job in each pipeline stage",
+    ["stage"],
+    buckets=STAGE_BUCKETS,
+)
+denoise_step_seconds = Histogram(
+    "truetone_worker_denoise_step_seconds",
+    "Duration of one denoising step of a generator call",
+    ["quality"],
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0),
+)
+batch_size = Histogram(
+    "truetone_worker_batch_size",
+    "Rows (job styles) per generator call",
+    buckets=(1, 2, 3, 4, 6, 8, 12, 16, 24, 32),
+)
+queue_wait_seconds = Histogram(
+    "truetone_worker_queue_wait_seconds",
+    "Time from enqueue to receive, by priority lane",
+    ["lane"],
+    buckets=STAGE_BUCKETS,
+)
+job_peak_rss_bytes = Histogram(
+    "truetone_worker_job_peak_rss_bytes",
+    "Peak resident set size of the worker process while a job ran",
+    buckets=tuple(gib * 2**30 for gib in (0.5, 1, 2, 3, 4, 6, 8, 12, 16, 24, 32)),
+)
+jobs_total = Counter(
+    "truetone_worker_jobs_total",
+    "Jobs finished, by outcome",
+    ["outcome"],
+)
+result_cache_lookups = Counter(
+    "truetone_worker_result_cache_lookups_total",
+    "Result cache lookups, by outcome",
+    ["outcome"],
+)
+
+
+def observe_stages(spans: dict[str, float]) -> None:
+    for stage, seconds in spans.items():
+        stage_seconds.labels(stage).observe(seconds)
+
+
+def start_metrics_server(offset: int = 0) -> None:
+    """
+    Serve ``/metrics`` on ``metrics_port + offset`` from a daemon thread.
+
+    Every process serves its own registry: supervised children use offsets
+    1..N next to the supervisor's port. A port of 0 disables the server.
+    """
+    if not settings.metrics_port:
+        return
+    port = settings.metrics_port + offset
+    start_http_server(port)
+    logger.info("Serving metrics on :%d/metrics", port)
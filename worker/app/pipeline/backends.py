@@ -0,0 +1,242 @@
+"""Inference backends for the Stable Diffusion inpainting pipeline.
+
+The backend decides how the pipeline is loaded and executed:
+
+* ``eager`` – stock PyTorch (float16 on CUDA, float32 on CPU);
+* ``compile`` – UNet and VAE decoder wrapped in ``torch.compile`` with
+  channels-last weights;
+* ``bf16`` – eager weights run under bfloat16 autocast, for CPUs with
+  native bf16 support (AVX512-BF16 / AMX);
+* ``onnx`` – the pipeline exported to ONNX and run with ONNX Runtime; the
+  export is cached on local disk and reused on later starts.
+
+:func:`get_backend` checks that the selected backend can run on this host, so
+a misconfigured worker fails at startup rather than on its first job.
+"""
+
+from __future__ import annotations
+
+import contextlib
+import re
+from pathlib import Path
+from typing import Any, ContextManager
+
+import numpy as np
+import torch
+
+from shared.logging import get_logger
+
+from app.pipeline.budget import PipelineSavers
+
+try:
+    from diffusers import StableDiffusionInpaintPipeline
+    _diffusers_available = True
+except ImportError:  # pragma: no cover
+    _diffusers_available = False
+
+try:
+    from optimum.onnxruntime import ORTStableDiffusionInpaintPipeline
+    _ort_available = True
+except ImportError:  # pragma: no cover
+    _ort_available = False
+
+logger = get_logger(__name__)
+
+
+class EagerBackend:
+    """Stock PyTorch execution."""
+
+    name = "eager"
+    # Whether the pipeline accepts ``callback_on_step_end`` (used for previews).
+    supports_step_callback = True
+
+    def check(self, device: str) -> None:
+        """Raise RuntimeError when the backend cannot run on *device*."""
+        if not _diffusers_available:
+            raise RuntimeError(
+                "diffusers is not installed. Run `pip install diffusers`."
+            )
+
+    def load(self, model_id: str, device: str) -> Any:
+        return StableDiffusionInpaintPipeline.from_pretrained(
+            model_id,
+            torch_dtype=torch.float16 if device == "cuda" else torch.float32,
+        ).to(device)
+
+    def reduce_memory(self, pipe: Any, savers: PipelineSavers) -> None:
+        """Turn on the diffusers memory savings selected by the memory budget."""
+        if savers.attention_slicing:
+            pipe.enable_attention_slicing("auto")
+        if savers.vae_slicing:
+            pipe.enable_vae_slicing()
+        if savers.vae_tiling:
+            pipe.enable_vae_tiling()
+        if savers.offload == "model":
+            pipe.enable_model_cpu_offload()
+        elif savers.offload == "sequential":
+            pipe.enable_sequential_cpu_offload()
+
+    def native_resolution(self, pipe: Any) -> int:
+        return pipe.unet.config.sample_size * pipe.vae_scale_factor
+
+    @torch.no_grad()
+    def encode_prompt(self, pipe: Any, prompt: str) -> tuple[Any, Any]:
+        """Return the (conditional, unconditional) text embeddings for *prompt*."""
+        with self.inference_context():
+            return pipe.encode_prompt(
+                prompt,
+                device=pipe.device,
+                num_images_per_prompt=1,
+                do_classifier_free_guidance=True,
+            )
+
+    def concat(self, embeddings: list[Any]) -> Any:
+        return torch.cat(embeddings)
+
+    def inference_context(self) -> ContextManager:
+        return contextlib.nullcontext()
+
+
+class CompileBackend(EagerBackend):
+    """Eager weights with the UNet and VAE decoder compiled by TorchInductor."""
+
+    name = "compile"
+
+    def check(self, device: str) -> None:
+        super().check(device)
+        if not hasattr(torch, "compile"):
+            raise RuntimeError("The compile backend requires PyTorch 2.0 or newer.")
+
+    def load(self, model_id: str, device: str) -> Any:
+        pipe = super().load(model_id, device)
+        pipe.unet.to(memory_format=torch.channels_last)
+        pipe.vae.to(memory_format=torch.channels_last)
+        # Generation sizes vary with the input's aspect ratio; dynamic shapes
+        # avoid a recompile for every new size.
+        pipe.unet = torch.compile(pipe.unet, dynamic=True)
+        pipe.vae.decode = torch.compile(pipe.vae.decode, dynamic=True)
+        return pipe
+
+
+class BFloat16Backend(EagerBackend):
+    """Eager weights run under bfloat16 autocast."""
+
+    name = "bf16"
+
+    def __init__(self) -> None:
+        self._device = "cpu"
+
+    def check(self, device: str) -> None:
+        super().check(device)
+        if device == "cuda":
+            if not torch.cuda.is_bf16_supported():
+                raise RuntimeError("This GPU does not support bfloat16.")
+        elif not _cpu_supports_bf16():
+            raise RuntimeError(
+                "This CPU has no native bfloat16 support (AVX512-BF16 or AMX); "
+                "use the eager or compile backend."
+            )
+        self._device = device
+
+    def load(self, model_id: str, device: str) -> Any:
+        pipe = StableDiffusionInpaintPipeline.from_pretrained(
+            model_id, torch_dtype=torch.float32
+        ).to(device)
+        pipe.unet.to(memory_format=torch.channels_last)
+        return pipe
+
+    def inference_context(self) -> ContextManager:
+        return torch.autocast(device_type=self._device, dtype=torch.bfloat16)
+
+
+class OnnxBackend:
+    """The pipeline exported to ONNX and run with ONNX Runtime."""
+
+    name = "onnx"
+    supports_step_callback = False
+
+    def __init__(self, cache_dir: str) -> None:
+        self._cache_dir = Path(cache_dir).expanduser()
+        self._provider = "CPUExecutionProvider"
+
+    def check(self, device: str) -> None:
+        if not _ort_available:
+            raise RuntimeError(
+                "optimum[onnxruntime] is not installed. "
+                "Run `pip install optimum[onnxruntime]`."
+            )
+        if device == "cuda":
+            self._provider = "CUDAExecutionProvider"
+
+    def export_dir(self, model_id: str) -> Path:
+        return self._cache_dir / re.sub(r"[^A-Za-z0-9_.-]+", "--", model_id)
+
+    def load(self, model_id: str, device: str) -> Any:
+        export_dir = self.export_dir(model_id)
+        if (export_dir / "model_index.json").exists():
+            return ORTStableDiffusionInpaintPipeline.from_pretrained(
+                export_dir, provider=self._provider
+            )
+        pipe = ORTStableDiffusionInpaintPipeline.from_pretrained(
+            model_id, export=True, provider=self._provider
+        )
+        pipe.save_pretrained(export_dir)
+        return pipe
+
+    def reduce_memory(self, pipe: Any, savers: PipelineSavers) -> None:
+        # ONNX Runtime sessions offer none of the diffusers switches; the
+        # budget still caps inputs and finishing.
+        if savers.enabled:
+            logger.warning(
+                "The onnx backend ignores memory savings %s", ", ".join(savers.enabled)
+            )
+
+    def native_resolution(self, pipe: Any) -> int:
+        return pipe.unet.config["sample_size"] * pipe.vae_scale_factor
+
+    def encode_prompt(self, pipe: Any, prompt: str) -> tuple[Any, Any]:
+        # Classifier-free guidance pairs the prompt with the empty prompt.
+        return _encode_text(pipe, prompt), _encode_text(pipe, "")
+
+    def concat(self, embeddings: list[Any]) -> Any:
+        return np.concatenate(embeddings)
+
+    def inference_context(self) -> ContextManager:
+        return contextlib.nullcontext()
+
+
+InferenceBackend = EagerBackend | OnnxBackend
+
+BACKEND_NAMES = ("eager", "compile", "bf16", "onnx")
+
+
+def _cpu_supports_bf16() -> bool:
+    check = getattr(torch.ops.mkldnn, "_is_mkldnn_bf16_supported", None)
+    return bool(check is not None and torch.backends.mkldnn.is_available() and check())
+
+
+def _encode_text(pipe: Any, text: str) -> np.ndarray:
+    input_ids = pipe.tokenizer(
+        text,
+        padding="max_length",
+        max_length=pipe.tokenizer.model_max_length,
+        truncation=True,
+        return_tensors="np",
+    ).input_ids
+    return pipe.text_encoder(input_ids=input_ids.astype(np.int32))[0]
+
+
+def get_backend(name: str, device: str, onnx_cache_dir: str) -> InferenceBackend:
+    """Return the backend called *name*, after checking it can run on *device*."""
+    if name == "eager":
+        backend: InferenceBackend = EagerBackend()
+    elif name == "compile":
+        backend = CompileBackend()
+    elif name == "bf16":
+        backend = BFloat16Backend()
+    elif name == "onnx":
+        backend = OnnxBackend(onnx_cache_dir)
+    else:
+        raise ValueError(f"Unknown inference backend {name!r}; expected one of {BACKEND_NAMES}")
+    backend.check(device)
+    return backend
@@ -0,0 +1,74 @@
+"""Memory budget: which savings to apply for ``memory_budget_mb``.
+
+Stable Diffusion's peak memory is dominated by the UNet's self-attention at
+large generation sizes and by the VAE decoding the whole batch at once, on
+top of the weights themselves (about 4.3 GB in float32 on CPU, 2.2 GB in
+float16 on CUDA).  The full-resolution copies of the input made while
+finishing a job add roughly :data:`BYTES_PER_INPUT_PIXEL` per input pixel.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+
+# Bytes held per input pixel while a style is finished: the original, mask,
+# restored and blended images plus the NumPy postprocessor's float32 buffers.
+BYTES_PER_INPUT_PIXEL = 80
+# Share of the budget the full-resolution images may take.
+IMAGE_BUDGET_SHARE = 0.25
+
+# Below these budgets (MiB) the VAE decodes in tiles, and on CUDA the models
+# are moved to the GPU one at a time ("model") or layer by layer ("sequential").
+VAE_TILING_BELOW_MB = 8192
+MODEL_OFFLOAD_BELOW_MB = 6144
+SEQUENTIAL_OFFLOAD_BELOW_MB = 3072
+
+
+@dataclass(frozen=True)
+class PipelineSavers:
+    attention_slicing: bool = False
+    vae_slicing: bool = False
+    vae_tiling: bool = False
+    offload: str = "none"  # "none" | "model" | "sequential"
+
+    @property
+    def enabled(self) -> list[str]:
+        names = [
+            name
+            for name in ("attention_slicing", "vae_slicing", "vae_tiling")
+            if getattr(self, name)
+        ]
+        if self.offload != "none":
+            names.append(f"{self.offload}_offload")
+        return names
+
+
+def pipeline_savers(budget_mb: int, device: str) -> PipelineSavers:
+    """
+    The pipeline's memory savings for *budget_mb* on *device*.
+
+    Any budget slices attention and VAE decoding (a few percent slower);
+    tighter ones tile the VAE and, on CUDA, offload models to the CPU.
+    Offloading is never used on CPU, where it would save nothing.
+    """
+    if budget_mb <= 0:
+        return PipelineSavers()
+    offload = "none"
+    if device == "cuda":
+        if budget_mb < SEQUENTIAL_OFFLOAD_BELOW_MB:
+            offload = "sequential"
+        elif budget_mb < MODEL_OFFLOAD_BELOW_MB:
+            offload = "model"
+    return PipelineSavers(
+        attention_slicing=True,
+        vae_slicing=True,
+        vae_tiling=budget_mb < VAE_TILING_BELOW_MB,
+        offload=offload,
+    )
+
+
+def input_pixel_cap(budget_mb: int, max_input_pixels: int = 0) -> int:
+    """Largest input in pixels (0 = no cap): explicit, or derived from the budget."""
+    if max_input_pixels > 0 or budget_mb <= 0:
+        return max_input_pixels
+    return int(budget_mb * 2**20 * IMAGE_BUDGET_SHARE / BYTES_PER_INPUT_PIXEL)
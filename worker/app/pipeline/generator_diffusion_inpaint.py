@@ -2,43 +2,182 @@
 
 from __future__ import annotations
 
+import math
+import time
+from collections import OrderedDict
+from typing import Any
+
 import torch
 from PIL import Image
 
-from app.pipeline.interfaces import Generator
+from shared.logging import get_logger
+
+from app.pipeline.backends import get_backend
+from app.pipeline.budget import pipeline_savers
+from app.pipeline.interfaces import Generator, PreviewCallback
+from app.pipeline.preview import latents_to_images
+from app.pipeline.styles import STYLE_PROMPTS
+from app.pipeline.tiers import DEFAULT_QUALITY, QUALITY_TIERS, get_tier
 from app.settings import settings
 
 try:
-    from diffusers import StableDiffusionInpaintPipeline
+    from diffusers import DPMSolverMultistepScheduler
     _diffusers_available = True
 except ImportError:  # pragma: no cover
     _diffusers_available = False
 
+logger = get_logger(__name__)
+
+
+def _build_scheduler(name: str, default: Any) -> Any:
+    if name == "default":
+        return default
+    if name == "dpmpp":
+        return DPMSolverMultistepScheduler.from_config(
+            default.config, algorithm_type="dpmsolver++", use_karras_sigmas=True
+        )
+    raise ValueError(f"Unknown scheduler {name!r}")
+
 
 class DiffusionInpaintGenerator(Generator):
     """Use a Stable Diffusion inpainting model to colourise masked regions."""
 
     def __init__(self) -> None:
-        if not _diffusers_available:
-            raise RuntimeError(
-                "diffusers is not installed. Run `pip install diffusers`."
-            )
         device = "cuda" if torch.cuda.is_available() else "cpu"
-        self._pipe = StableDiffusionInpaintPipeline.from_pretrained(
-            settings.inpaint_model_id,
-            torch_dtype=torch.float16 if device == "cuda" else torch.float32,
-        ).to(device)
+        # Raises at startup when the configured backend cannot run here.
+        self._backend = get_backend(
+            settings.inference_backend, device, settings.onnx_cache_dir
+        )
+        self._pipe = self._backend.load(settings.inpaint_model_id, device)
+        savers = pipeline_savers(settings.memory_budget_mb, device)
+        self._backend.reduce_memory(self._pipe, savers)
+        if savers.enabled:
+            logger.info(
+                "Memory budget %d MiB: %s", settings.memory_budget_mb, ", ".join(savers.enabled)
+            )
+
+        # One scheduler per tier, built from the model's scheduler config and
+        # swapped onto the pipeline per call; the weights are never reloaded.
+        self._schedulers = {
+            name: _build_scheduler(name, self._pipe.scheduler)
+            for name in {tier.scheduler for tier in QUALITY_TIERS.values()}
+        }
+
+        # Text-encoder outputs (conditional, unconditional) per prompt. Built-in
+        # styles are encoded once here; other prompts go through a bounded memo.
+        self._style_embeddings = {
+            prompt: self._encode_prompt(prompt) for prompt in STYLE_PROMPTS.values()
+        }
+        self._prompt_memo: OrderedDict[str, tuple[Any, Any]] = OrderedDict()
+
+    def _encode_prompt(self, prompt: str) -> tuple[Any, Any]:
+        return self._backend.encode_prompt(self._pipe, prompt)
+
+    def _prompt_embeddings(self, prompt: str) -> tuple[Any, Any]:
+        embeddings = self._style_embeddings.get(prompt)
+        if embeddings is not None:
+            return embeddings
+
+        embeddings = self._prompt_memo.get(prompt)
+        if embeddings is None:
+            embeddings = self._prompt_memo[prompt] = self._encode_prompt(prompt)
+            if len(self._prompt_memo) > settings.prompt_embedding_cache_size:
+                self._prompt_memo.popitem(last=False)
+        else:
+            self._prompt_memo.move_to_end(prompt)
+        return embeddings
+
+    @property
+    def native_resolution(self) -> int:
+        return self._backend.native_resolution(self._pipe)
+
+    def output_size(self, image: Image.Image) -> tuple[int, int]:
+        """The pipeline renders at the input size rounded down to a multiple of 8."""
+        return image.width - image.width % 8, image.height - image.height % 8
 
     def generate(
         self,
         image: Image.Image,
         mask: Image.Image,
         prompt: str,
+        quality: str = DEFAULT_QUALITY,
     ) -> Image.Image:
         """Run the inpainting pipeline and return the generated image."""
-        result = self._pipe(
-            prompt=prompt,
-            image=image.convert("RGB"),
-            mask_image=mask.convert("L"),
-        )
-        return result.images[0]
+        return self.generate_batch([image], [mask], [prompt], quality)[0]
+
+    def generate_batch(
+        self,
+        images: list[Image.Image],
+        masks: list[Image.Image],
+        prompts: list[str],
+        quality: str = DEFAULT_QUALITY,
+        preview: PreviewCallback | None = None,
+        step_times: list[float] | None = None,
+    ) -> list[Image.Image]:
+        """
+        Run one batched inpainting call; all images share a target size.
+
+        Prompts may differ: each row gets its cached text embeddings, so the
+        text encoder does not run per call. The *quality* tier picks the
+        scheduler, step count and guidance scale. *preview* receives
+        latent-space approximations once ``preview_step_fraction`` of the
+        steps have run; *step_times* collects per-step durations.
+        """
+        tier = get_tier(quality)
+        sizes = {self.output_size(image) for image in images}
+        if len(sizes) != 1:
+            raise ValueError(f"Cannot batch images with different target sizes: {sizes}")
+        width, height = sizes.pop()
+
+        embeddings = [self._prompt_embeddings(prompt) for prompt in prompts]
+        self._pipe.scheduler = self._schedulers[tier.scheduler]
+        callback_kwargs: dict[str, Any] = {}
+        if (preview is not None or step_times is not None) and (
+            self._backend.supports_step_callback
+        ):
+            callback_kwargs["callback_on_step_end"] = _step_callback(
+                tier.steps, preview, step_times
+            )
+        with self._backend.inference_context():
+            result = self._pipe(
+                prompt_embeds=self._backend.concat([cond for cond, _ in embeddings]),
+                negative_prompt_embeds=self._backend.concat(
+                    [uncond for _, uncond in embeddings]
+                ),
+                image=[image.convert("RGB") for image in images],
+                mask_image=[mask.convert("L") for mask in masks],
+                height=height,
+                width=width,
+                num_inference_steps=tier.steps,
+                guidance_scale=tier.guidance_scale,
+                **callback_kwargs,
+            )
+        return list(result.images)
+
+
+def _step_callback(
+    steps: int,
+    preview: PreviewCallback | None,
+    step_times: list[float] | None,
+) -> Any:
+    """
+    Build a ``callback_on_step_end`` that times every step and fires
+    *preview* once, part-way through.
+    """
+    at_step = max(1, math.ceil(steps * settings.preview_step_fraction)) - 1
+    last = time.perf_counter()
+
+    def callback(pipe: Any, step: int, timestep: Any, kwargs: dict[str, Any]) -> dict[str, Any]:
+        nonlocal last
+        if step_times is not None:
+            now = time.perf_counter()
+            step_times.append(now - last)
+            last = now
+        if preview is not None and step == at_step:
+            try:
+                preview(latents_to_images(kwargs["latents"]))
+            except Exception:
+                logger.exception("Preview callback failed")
+        return kwargs
+
+    return callback
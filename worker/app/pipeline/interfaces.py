@@ -3,9 +3,12 @@
 from __future__ import annotations
 
 from abc import ABC, abstractmethod
+from collections.abc import Callable
 
 from PIL import Image
 
+from app.pipeline.tiers import DEFAULT_QUALITY
+
 
 class Segmenter(ABC):
     """Produce a binary mask that isolates the subject (e.g. face/hair)."""
@@ -15,6 +18,10 @@ class Segmenter(ABC):
         """Return a greyscale mask image of the same size as *image*."""
 
 
+# Receives an approximate output per batch row while generation is running.
+PreviewCallback = Callable[[list[Image.Image]], None]
+
+
 class Generator(ABC):
     """Generate a colourised image given an input and mask."""
 
@@ -24,13 +31,72 @@ class Generator(ABC):
         image: Image.Image,
         mask: Image.Image,
         prompt: str,
+        quality: str = DEFAULT_QUALITY,
     ) -> Image.Image:
-        """Return the colourised image."""
+        """Return the colourised image, sampled per the *quality* tier."""
+
+    def generate_batch(
+        self,
+        images: list[Image.Image],
+        masks: list[Image.Image],
+        prompts: list[str],
+        quality: str = DEFAULT_QUALITY,
+        preview: PreviewCallback | None = None,
+        step_times: list[float] | None = None,
+    ) -> list[Image.Image]:
+        """
+        Colourise several images in one call, returning outputs in order.
+
+        All rows share one *quality* tier. Generators that can look inside
+        their run call *preview* at most once with approximate outputs, and
+        append the duration of each denoising step to *step_times*. The
+        default implementation loops over :meth:`generate` without either;
+        generators that can batch natively should override it.
+        """
+        return [
+            self.generate(image, mask, prompt, quality)
+            for image, mask, prompt in zip(images, masks, prompts)
+        ]
+
+    def output_size(self, image: Image.Image) -> tuple[int, int]:
+        """Return the (width, height) the generator will render *image* at."""
+        return image.size
+
+    @property
+    def native_resolution(self) -> int | None:
+        """Side of the square the model was trained at, if it has one."""
+        return None
 
 
 class Postprocessor(ABC):
     """Apply post-processing to the generated output."""
 
     @abstractmethod
-    def process(self, original: Image.Image, generated: Image.Image) -> Image.Image:
-        """Return the final blended/sharpened image."""
+    def process(
+        self,
+        original: Image.Image,
+        generated: Image.Image,
+        mask: Image.Image | None = None,
+    ) -> Image.Image:
+        """
+        Return the final blended/sharpened image.
+
+        With *mask*, generated colour is only applied where the mask is set.
+        """
+
+    def process_batch(
+        self,
+        originals: list[Image.Image],
+        generated: list[Image.Image],
+        masks: list[Image.Image | None] | None = None,
+    ) -> list[Image.Image]:
+        """
+        Post-process several images, returning results in order.
+
+        The default implementation loops over :meth:`process`.
+        """
+        masks = masks or [None] * len(originals)
+        return [
+            self.process(original, gen, mask)
+            for original, gen, mask in zip(originals, generated, masks)
+        ]
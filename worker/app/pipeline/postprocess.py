@@ -2,33 +2,276 @@
 
 from __future__ import annotations
 
+import threading
+
+import numpy as np
 from PIL import Image, ImageFilter
 
 from app.pipeline.interfaces import Postprocessor
 
+# PIL's RGB <-> LAB conversion: sRGB primaries adapted to a D50 white.
+# Rows of the forward matrix are divided by the white point, so it maps
+# linear RGB straight to white-relative XYZ; the inverse undoes both.
+_D50_WHITE = np.array([0.96422, 1.0, 0.82521])
+_RGB_TO_XYZ_D50 = np.array(
+    [
+        [0.4360747, 0.3850649, 0.1430804],
+        [0.2225045, 0.7168786, 0.0606169],
+        [0.0139322, 0.0971045, 0.7141733],
+    ]
+)
+_RGB_TO_XYZ = (_RGB_TO_XYZ_D50 / _D50_WHITE[:, None]).astype(np.float32)
+_XYZ_TO_RGB = (np.linalg.inv(_RGB_TO_XYZ_D50) * _D50_WHITE).astype(np.float32)
+_LAB_EPSILON = 216 / 24389
+_LAB_KAPPA = 24389 / 27
+
+# sRGB decoding of every 8-bit level.
+_SRGB_TO_LINEAR = np.array(
+    [c / 12.92 if c <= 0.04045 else ((c + 0.055) / 1.055) ** 2.4 for c in np.arange(256) / 255],
+    dtype=np.float32,
+)
+
+# PIL's ImageFilter.SHARPEN kernel (centre 32, neighbours -2, scale 16)
+# rewritten in terms of the 3×3 box sum, which includes the centre.
+_SHARPEN_CENTRE = 34 / 16
+_SHARPEN_BOX = 2 / 16
+
+
+def feather_mask(mask: Image.Image, radius: int) -> Image.Image:
+    """Soften the edges of a binary *mask* over about *radius* pixels."""
+    mask = mask.convert("L")
+    if radius <= 0:
+        return mask
+    return mask.filter(ImageFilter.BoxBlur(radius))
+
 
 class BlendPostprocessor(Postprocessor):
     """Composite the generated colours onto the original image and sharpen."""
 
-    def __init__(self, sharpen: bool = True) -> None:
+    def __init__(self, sharpen: bool = True, feather: int = 8) -> None:
         self._sharpen = sharpen
+        self._feather = feather
 
-    def process(self, original: Image.Image, generated: Image.Image) -> Image.Image:
+    def process(
+        self,
+        original: Image.Image,
+        generated: Image.Image,
+        mask: Image.Image | None = None,
+    ) -> Image.Image:
         """
         Blend *generated* colours onto *original* structure.
 
         The luminance channel is taken from *original* and colour channels
-        from *generated*, preserving fine detail.
+        from *generated*, preserving fine detail.  With *mask*, colour is
+        only taken from *generated* under a feathered copy of the mask.
         """
-        orig_lab = original.convert("LAB")
-        gen_lab = generated.convert("LAB")
-
-        orig_l, _, _ = orig_lab.split()
-        _, gen_a, gen_b = gen_lab.split()
-
+        # Only the needed bands are kept, so at most a few full-size copies
+        # are alive at any point.
+        orig_l = original.convert("LAB").getchannel("L")
+        _, gen_a, gen_b = generated.convert("LAB").split()
         blended = Image.merge("LAB", (orig_l, gen_a, gen_b)).convert("RGB")
+        del orig_l, gen_a, gen_b
+
+        if mask is not None:
+            base = original if original.mode == "RGB" else original.convert("RGB")
+            blended = Image.composite(blended, base, feather_mask(mask, self._feather))
 
         if self._sharpen:
             blended = blended.filter(ImageFilter.SHARPEN)
 
         return blended
+
+
+class NumpyBlendPostprocessor(Postprocessor):
+    """
+    Vectorised :class:`BlendPostprocessor`.
+
+    Performs the same LAB round trip as PIL, with L, a and b quantised to
+    PIL's 8-bit LAB, and leaves border pixels unsharpened as PIL does. On
+    photographs outputs match the PIL path to within a few levels (mostly
+    rounding); only colours pushed out of the sRGB gamut by the swap differ
+    more, as PIL maps those back less accurately. All arithmetic runs in
+    place on float32 buffers that are allocated once per thread and image
+    shape, and same-sized images in a batch are processed together. With *keep_buffers* off (memory-budgeted workers) the buffers
+    are freed after every call instead.
+    """
+
+    def __init__(self, sharpen: bool = True, feather: int = 8, keep_buffers: bool = True) -> None:
+        self._sharpen = sharpen
+        self._feather = feather
+        self._keep_buffers = keep_buffers
+        # Finishing runs on a thread pool in pipelined mode.
+        self._local = threading.local()
+
+    def process(
+        self,
+        original: Image.Image,
+        generated: Image.Image,
+        mask: Image.Image | None = None,
+    ) -> Image.Image:
+        return self.process_batch([original], [generated], [mask])[0]
+
+    def process_batch(
+        self,
+        originals: list[Image.Image],
+        generated: list[Image.Image],
+        masks: list[Image.Image | None] | None = None,
+    ) -> list[Image.Image]:
+        masks = masks or [None] * len(originals)
+        groups: dict[tuple, list[int]] = {}
+        for i, (original, gen, mask) in enumerate(zip(originals, generated, masks)):
+            if gen.size != original.size:
+                raise ValueError(
+                    f"Generated size {gen.size} does not match original {original.size}"
+                )
+            groups.setdefault((original.size, mask is not None), []).append(i)
+
+        results: list[Image.Image | None] = [None] * len(originals)
+        for (_, masked), indices in groups.items():
+            blended = self._blend(
+                [originals[i] for i in indices],
+                [generated[i] for i in indices],
+                [masks[i] for i in indices] if masked else None,
+            )
+            for i, pixels in zip(indices, blended):
+                # RGB images never share memory with the array, so the
+                # buffer can be reused by the next call.
+                results[i] = Image.fromarray(pixels)
+        if not self._keep_buffers:
+            self._local.buffers = None
+        return results
+
+    def _buffers(self, shape: tuple[int, int, int]) -> dict[str, np.ndarray]:
+        buffers = getattr(self._local, "buffers", None)
+        if buffers is None or buffers["original"].shape[:3] != shape:
+            n, h, w = shape
+            buffers = self._local.buffers = {
+                "original": np.empty((n, h, w, 3), dtype=np.uint8),
+                "generated": np.empty((n, h, w, 3), dtype=np.uint8),
+                "alpha": np.empty((n, h, w), dtype=np.float32),
+                "lightness": np.empty((n, h, w), dtype=np.float32),
+                "lab": np.empty((n, h, w, 3), dtype=np.float32),
+                "work": np.empty((n, h, w, 3), dtype=np.float32),
+                "low": np.empty((n, h, w, 3), dtype=bool),
+                "rows": np.empty((n, max(h - 2, 0), w, 3), dtype=np.float32),
+                "box": np.empty((n, max(h - 2, 0), max(w - 2, 0), 3), dtype=np.float32),
+                "out": np.empty((n, h, w, 3), dtype=np.uint8),
+            }
+        return buffers
+
+    def _blend(
+        self,
+        originals: list[Image.Image],
+        generated: list[Image.Image],
+        masks: list[Image.Image] | None,
+    ) -> np.ndarray:
+        width, height = originals[0].size
+        b = self._buffers((len(originals), height, width))
+        original, gen, lab, work, low = (
+            b["original"], b["generated"], b["lab"], b["work"], b["low"]
+        )
+
+        for k, (orig_image, gen_image) in enumerate(zip(originals, generated)):
+            original[k] = np.asarray(orig_image.convert("RGB"))
+            gen[k] = np.asarray(gen_image.convert("RGB"))
+
+        # f(Y) of the original, then f(X), f(Y), f(Z) of the generated image:
+        # L depends on f(Y) alone, a and b on differences between them.
+        lightness = b["lightness"]
+        np.take(_SRGB_TO_LINEAR, original, out=work, mode="clip")
+        np.matmul(work, _RGB_TO_XYZ[1], out=lightness)
+        _lab_f(lightness, low[..., 0])
+        np.take(_SRGB_TO_LINEAR, gen, out=work, mode="clip")
+        np.matmul(work, _RGB_TO_XYZ.T, out=lab)
+        _lab_f(lab, low)
+
+        # Original L with generated a/b, quantised as PIL's LAB bands are:
+        # L to 255 levels, a and b to signed integers.
+        fx, fy, fz = lab[..., 0], lab[..., 1], lab[..., 2]
+        fx -= fy
+        fz -= fy
+        _quantise(fx, 500, -128, 127)
+        _quantise(fz, 200, -127, 128)
+        lightness *= 116 * 2.55
+        lightness -= 16 * 2.55
+        np.rint(lightness, out=lightness)
+        lightness *= 1 / (116 * 2.55)
+        lightness += 16 / 116
+        fy[...] = lightness
+        fx += fy
+        fz += fy
+
+        _lab_f_inverse(lab, low)
+        np.matmul(lab, _XYZ_TO_RGB.T, out=work)
+        _linear_to_srgb(work, low)
+        np.rint(work, out=work)
+
+        if masks is not None:
+            alpha = b["alpha"]
+            for k, mask in enumerate(masks):
+                alpha[k] = np.asarray(feather_mask(mask, self._feather))
+            alpha *= 1 / 255
+            work -= original
+            work *= alpha[..., None]
+            work += original
+            np.rint(work, out=work)
+
+        if self._sharpen and height > 2 and width > 2:
+            self._sharpen_in_place(work, b)
+
+        np.clip(work, 0, 255, out=work)
+        np.rint(work, out=work)
+        np.copyto(b["out"], work, casting="unsafe")
+        return b["out"]
+
+    @staticmethod
+    def _sharpen_in_place(work: np.ndarray, b: dict[str, np.ndarray]) -> None:
+        """Apply PIL's SHARPEN kernel to *work*; like PIL, border pixels are kept."""
+        rows, box = b["rows"], b["box"]
+        np.add(work[:, :-2], work[:, 1:-1], out=rows)
+        rows += work[:, 2:]
+        np.add(rows[:, :, :-2], rows[:, :, 1:-1], out=box)
+        box += rows[:, :, 2:]
+
+        inner = work[:, 1:-1, 1:-1]
+        inner *= _SHARPEN_CENTRE
+        box *= _SHARPEN_BOX
+        inner -= box
+
+
+def _lab_f(t: np.ndarray, low: np.ndarray) -> np.ndarray:
+    """CIE LAB's f(t) in place: a cube root, linear near black."""
+    np.less_equal(t, _LAB_EPSILON, out=low)
+    linear = t[low] * (_LAB_KAPPA / 116) + 16 / 116
+    np.cbrt(t, out=t)
+    t[low] = linear
+    return t
+
+
+def _lab_f_inverse(f: np.ndarray, low: np.ndarray) -> np.ndarray:
+    """Inverse of :func:`_lab_f`, in place."""
+    np.less_equal(f, 6 / 29, out=low)
+    linear = f[low] * (116 / _LAB_KAPPA) - 16 / _LAB_KAPPA
+    np.power(f, 3, out=f)
+    f[low] = linear
+    return f
+
+
+def _quantise(delta: np.ndarray, scale: float, lowest: int, highest: int) -> None:
+    """Round *delta* × *scale* to an integer within [*lowest*, *highest*], in place."""
+    delta *= scale
+    np.rint(delta, out=delta)
+    np.clip(delta, lowest, highest, out=delta)
+    delta *= 1 / scale
+
+
+def _linear_to_srgb(c: np.ndarray, low: np.ndarray) -> np.ndarray:
+    """Encode linear light in [0, 1] (clipped) as sRGB levels 0-255, in place."""
+    np.clip(c, 0, 1, out=c)
+    np.less_equal(c, 0.0031308, out=low)
+    linear = c[low] * (12.92 * 255)
+    np.power(c, 1 / 2.4, out=c)
+    c *= 1.055 * 255
+    c -= 0.055 * 255
+    c[low] = linear
+    return c
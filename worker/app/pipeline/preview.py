@@ -0,0 +1,33 @@
+"""Cheap previews of in-progress diffusion from intermediate latents.
+
+Decoding latents through the VAE costs about as much as a few UNet steps,
+so previews use a fixed linear map from the four Stable Diffusion 1.x latent
+channels to RGB instead.  The result is 1/8 of the generation size and only
+roughly right in colour, which is all a preview needs: luminance comes from
+the original when the preview is composed.
+"""
+
+from __future__ import annotations
+
+import torch
+from PIL import Image
+
+# Least-squares fit of SD 1.x VAE latents (4 channels) to RGB in [-1, 1].
+LATENT_RGB_FACTORS = torch.tensor(
+    [
+        #   R        G        B
+        [0.3512, 0.2297, 0.3227],
+        [0.3250, 0.4974, 0.2350],
+        [-0.2829, 0.1762, 0.2721],
+        [-0.2120, -0.2616, -0.7177],
+    ]
+)
+
+
+@torch.no_grad()
+def latents_to_images(latents: torch.Tensor) -> list[Image.Image]:
+    """Approximate RGB images from a ``(batch, 4, h, w)`` latent tensor."""
+    factors = LATENT_RGB_FACTORS.to(device=latents.device, dtype=torch.float32)
+    rgb = latents.float().permute(0, 2, 3, 1) @ factors
+    pixels = ((rgb + 1.0) * 127.5).clamp(0, 255).to(torch.uint8).cpu().numpy()
+    return [Image.fromarray(row) for row in pixels]
@@ -0,0 +1,195 @@
+"""Staged worker loop that overlaps I/O with generation.
+
+Three stages run concurrently:
+
+* **prefetch** – a poller thread receives messages and a thread pool marks
+  jobs as processing, downloads, decodes and segments their inputs;
+* **generate** – the calling thread feeds prepared jobs to the generator in
+  micro-batches and never touches the network;
+* **finish** – a thread pool post-processes, encodes and uploads results,
+  updates job state and acknowledges the message.
+
+Memory stays bounded: at most ``pipeline_prefetch_jobs`` jobs are held between
+receive and generation, and at most ``pipeline_max_pending_uploads`` results
+wait to be finished.  When either limit is reached the upstream stage blocks.
+"""
+
+from __future__ import annotations
+
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from shared.logging import get_logger
+
+from app.batching import SQS_RECEIVE_LIMIT, MicroBatcher, batch_key
+from app.jobs import (
+    Job,
+    Task,
+    fail_job,
+    finish_job,
+    generate_tasks,
+    max_batch_rows,
+    prepare_job,
+    tasks_for,
+)
+from app.pipeline.interfaces import Generator, Postprocessor, Segmenter
+from app.queue.sqs_client import receive_messages
+from app.settings import settings
+
+logger = get_logger(__name__)
+
+
+class _Slots:
+    """Counter of free in-flight slots; a single consumer takes, anyone releases."""
+
+    def __init__(self, size: int) -> None:
+        self._free = size
+        self._cond = threading.Condition()
+
+    def wait_free(self) -> int:
+        """Block until at least one slot is free and return how many are."""
+        with self._cond:
+            while self._free == 0:
+                self._cond.wait()
+            return self._free
+
+    def take(self, n: int = 1) -> None:
+        with self._cond:
+            self._free -= n
+
+    def release(self, n: int = 1) -> None:
+        with self._cond:
+            self._free += n
+            self._cond.notify_all()
+
+
+class PipelinedWorker:
+    """Run prefetch, generation and finishing as overlapping stages."""
+
+    def __init__(
+        self,
+        segmenter: Segmenter,
+        generator: Generator,
+        postprocessor: Postprocessor,
+    ) -> None:
+        self._segmenter = segmenter
+        self._generator = generator
+        self._postprocessor = postprocessor
+
+        # Never prefetch less than a full batch, or batches could not fill.
+        prefetch = max(settings.pipeline_prefetch_jobs, settings.batch_max_size)
+        self._prefetch_slots = _Slots(prefetch)
+        self._ready: queue.Queue[Job] = queue.Queue(maxsize=prefetch)
+        self._finish_slots = threading.BoundedSemaphore(
+            settings.pipeline_max_pending_uploads
+        )
+
+        self._prefetch_pool = ThreadPoolExecutor(
+            max_workers=settings.pipeline_download_workers,
+            thread_name_prefix="prefetch",
+        )
+        self._finish_pool = ThreadPoolExecutor(
+            max_workers=settings.pipeline_upload_workers,
+            thread_name_prefix="finish",
+        )
+        # Segmenters wrap native graphs that are not safe to share across threads.
+        self._segment_lock = threading.Lock()
+
+        self._batcher: MicroBatcher[Task] = MicroBatcher(
+            max_batch_size=max_batch_rows(),
+            max_wait_seconds=settings.batch_max_wait_ms / 1000,
+        )
+
+    # -- prefetch ---------------------------------------------------------
+
+    def _poll(self) -> None:
+        while True:
+            free = self._prefetch_slots.wait_free()
+            try:
+                messages = receive_messages(
+                    max_messages=min(SQS_RECEIVE_LIMIT, free)
+                )
+            except Exception:
+                logger.exception("Error receiving messages from SQS – retrying in 5 s")
+                time.sleep(5)
+                continue
+
+            for msg in messages:
+                job = Job.from_message(msg)
+                self._prefetch_slots.take()
+                self._prefetch_pool.submit(self._prepare, job)
+
+    def _prepare(self, job: Job) -> None:
+        try:
+            if not prepare_job(
+                job, self._segmenter, self._generator, self._segment_lock
+            ):
+                self._prefetch_slots.release()
+                return
+        except Exception as exc:
+            fail_job(job, exc)
+            self._prefetch_slots.release()
+            return
+        self._ready.put(job)
+
+    # -- generate ---------------------------------------------------------
+
+    def _generate(self, batch: list[Task]) -> None:
+        logger.info("Generating batch of %d task(s)", len(batch))
+        ready, failed = generate_tasks(batch, self._generator)
+        # A job holds its prefetch slot until all its styles are generated.
+        self._prefetch_slots.release(len(ready) + len(failed))
+
+        for job in ready:
+            # Blocks while the finish stage is saturated (backpressure).
+            self._finish_slots.acquire()
+            self._finish_pool.submit(self._finish, job)
+
+    # -- finish -----------------------------------------------------------
+
+    def _finish(self, job: Job) -> None:
+        try:
+            finish_job(job, self._postprocessor)
+        except Exception as exc:
+            fail_job(job, exc)
+        finally:
+            self._finish_slots.release()
+
+    # ---------------------------------------------------------------------
+
+    def _enqueue_tasks(self, job: Job) -> None:
+        for task in tasks_for(job):
+            self._batcher.add(batch_key(task, self._generator), task)
+
+    def run(self) -> None:
+        """Start the poller and drive the generator from the calling thread."""
+        threading.Thread(target=self._poll, name="poller", daemon=True).start()
+
+        while True:
+            try:
+                job = self._ready.get(timeout=self._batcher.time_until_deadline())
+            except queue.Empty:
+                pass
+            else:
+                self._enqueue_tasks(job)
+                # Take whatever else is already prepared without waiting.
+                while True:
+                    try:
+                        job = self._ready.get_nowait()
+                    except queue.Empty:
+                        break
+                    self._enqueue_tasks(job)
+
+            for batch in self._batcher.pop_ready():
+                self._generate(batch)
+
+
+def run_pipelined(
+    segmenter: Segmenter,
+    generator: Generator,
+    postprocessor: Postprocessor,
+) -> None:
+    """Run the worker as overlapping prefetch / generate / finish stages."""
+    PipelinedWorker(segmenter, generator, postprocessor).run()
@@ -0,0 +1,179 @@
+"""In-flight messages: batched acknowledgements and visibility heartbeats.
+
+Every message is tracked from the moment it becomes a job until it is acked
+or released.  A background thread extends the visibility of tracked messages,
+and renews the lease of claimed jobs, every ``heartbeat_interval_seconds``, so
+that a slow CPU generation is never redelivered to another worker.  Acks are
+buffered and sent with DeleteMessageBatch as soon as ten are waiting for a
+queue, or ``ack_max_delay_ms`` after the oldest.  A lost ack only costs a
+redelivery, which the job claim then recognises as a duplicate.
+"""
+
+from __future__ import annotations
+
+import atexit
+import os
+import socket
+import threading
+import time
+from collections import defaultdict
+from dataclasses import dataclass
+
+from shared.logging import get_logger
+
+from app.db.dynamo_jobs import renew_lease
+from app.queue.sqs_client import SQS_BATCH_LIMIT, change_visibilities, delete_messages
+from app.settings import settings
+
+logger = get_logger(__name__)
+
+# Lease holder name written on claimed jobs.
+WORKER_ID = settings.worker_id or f"{socket.gethostname()}-{os.getpid()}"
+
+
+@dataclass
+class _Tracked:
+    job_id: str
+    queue_url: str
+    leased: bool = False
+
+
+class InFlight:
+    """Process-wide registry of received messages, keyed by receipt handle."""
+
+    def __init__(self) -> None:
+        self._cond = threading.Condition()
+        # Held while a heartbeat extends visibilities; release() waits for it,
+        # so that a short retry delay set after a release is never overwritten.
+        self._extending = threading.Lock()
+        self._tracked: dict[str, _Tracked] = {}
+        self._acks: dict[str, list[str]] = defaultdict(list)
+        self._oldest_ack: float | None = None
+        self._next_beat = time.monotonic() + settings.heartbeat_interval_seconds
+        self._thread: threading.Thread | None = None
+
+    def _start(self) -> None:
+        # Caller holds the lock.
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="in-flight", daemon=True)
+            self._thread.start()
+            atexit.register(self.flush)
+
+    def track(self, job_id: str, receipt_handle: str, queue_url: str) -> None:
+        """Keep a received message invisible until it is acked or released."""
+        with self._cond:
+            self._tracked[receipt_handle] = _Tracked(job_id, queue_url)
+            self._start()
+
+    def leased(self, receipt_handle: str) -> None:
+        """Also renew the lease of the message's job, which this worker claimed."""
+        with self._cond:
+            if (tracked := self._tracked.get(receipt_handle)) is not None:
+                tracked.leased = True
+
+    def release(self, receipt_handle: str) -> None:
+        """Stop the heartbeat: the message becomes visible when its timeout lapses."""
+        with self._extending, self._cond:
+            self._tracked.pop(receipt_handle, None)
+
+    def release_job(self, job_id: str) -> None:
+        """Release every message of *job_id* (used where only the job ID is known)."""
+        with self._extending, self._cond:
+            for handle in [h for h, t in self._tracked.items() if t.job_id == job_id]:
+                del self._tracked[handle]
+
+    def ack(self, receipt_handle: str, queue_url: str) -> None:
+        """Release the message and queue its deletion."""
+        with self._cond:
+            self._tracked.pop(receipt_handle, None)
+            self._acks[queue_url].append(receipt_handle)
+            if self._oldest_ack is None:
+                self._oldest_ack = time.monotonic()
+            self._start()
+            self._cond.notify()
+
+    def flush(self) -> None:
+        """Send every queued ack now."""
+        with self._cond:
+            acks = self._take_acks()
+        self._send_acks(acks)
+
+    def _take_acks(self) -> dict[str, list[str]]:
+        acks, self._acks, self._oldest_ack = self._acks, defaultdict(list), None
+        return acks
+
+    def _acks_due(self, now: float) -> bool:
+        if self._oldest_ack is None:
+            return False
+        if now - self._oldest_ack >= settings.ack_max_delay_ms / 1000:
+            return True
+        return any(len(handles) >= SQS_BATCH_LIMIT for handles in self._acks.values())
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while True:
+                    now = time.monotonic()
+                    acks_due = self._acks_due(now)
+                    if acks_due or now >= self._next_beat:
+                        break
+                    timeout = self._next_beat - now
+                    if self._oldest_ack is not None:
+                        ack_at = self._oldest_ack + settings.ack_max_delay_ms / 1000
+                        timeout = min(timeout, ack_at - now)
+                    self._cond.wait(timeout)
+                acks = self._take_acks() if acks_due else {}
+                beat: list[tuple[str, _Tracked]] = []
+                if now >= self._next_beat:
+                    self._next_beat = now + settings.heartbeat_interval_seconds
+                    beat = list(self._tracked.items())
+            try:
+                self._send_acks(acks)
+                self._beat(beat)
+            except Exception:
+                logger.exception("In-flight message upkeep failed")
+
+    def _send_acks(self, acks: dict[str, list[str]]) -> None:
+        for queue_url, handles in acks.items():
+            try:
+                failed = delete_messages(queue_url, handles)
+            except Exception:
+                logger.exception(
+                    "Could not ack %d message(s); they will be redelivered", len(handles)
+                )
+                continue
+            if failed:
+                logger.warning("%d ack(s) failed; the messages will be redelivered", len(failed))
+
+    def _beat(self, entries: list[tuple[str, _Tracked]]) -> None:
+        by_queue: dict[str, list[str]] = defaultdict(list)
+        for handle, tracked in entries:
+            by_queue[tracked.queue_url].append(handle)
+        for queue_url, handles in by_queue.items():
+            with self._extending:
+                # Skip messages released since the snapshot: their visibility
+                # now belongs to whoever released them.
+                with self._cond:
+                    handles = [h for h in handles if h in self._tracked]
+                if not handles:
+                    continue
+                failed = change_visibilities(
+                    queue_url, handles, settings.visibility_timeout_seconds
+                )
+                # Failures are messages acked meanwhile.
+                with self._cond:
+                    for handle in failed:
+                        self._tracked.pop(handle, None)
+        with self._cond:
+            leases = [
+                (handle, tracked)
+                for handle, tracked in entries
+                if tracked.leased and self._tracked.get(handle) is tracked
+            ]
+        for handle, tracked in leases:
+            if not renew_lease(tracked.job_id, WORKER_ID, settings.job_lease_seconds):
+                logger.warning("Lost the lease on job %s", tracked.job_id)
+                with self._cond:
+                    tracked.leased = False
+
+in_flight = InFlight()
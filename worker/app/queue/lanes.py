@@ -0,0 +1,103 @@
+"""Priority lanes: the order in which the worker polls its SQS queues.
+
+The API routes each job to the ``interactive``, ``standard`` or ``bulk``
+queue by its expected cost. Polling all of them from one loop, the worker
+takes the first lane of :meth:`LaneScheduler.order` that has messages, so a
+growing bulk backlog cannot delay interactive jobs beyond one receive.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from collections.abc import Callable
+from dataclasses import dataclass
+
+from app.settings import settings
+
+# Highest priority first.
+LANES = ("interactive", "standard", "bulk")
+
+
+@dataclass(frozen=True)
+class Lane:
+    name: str
+    queue_url: str
+    weight: int
+
+
+def configured_lanes() -> list[Lane]:
+    """The lanes with a queue URL, in priority order; lanes sharing a URL are one."""
+    urls = {
+        "interactive": settings.sqs_interactive_queue_url,
+        "standard": settings.sqs_queue_url,
+        "bulk": settings.sqs_bulk_queue_url,
+    }
+    lanes: list[Lane] = []
+    for name in LANES:
+        url = urls[name]
+        if url and all(lane.queue_url != url for lane in lanes):
+            lanes.append(Lane(name, url, max(0, settings.lane_weights.get(name, 1))))
+    return lanes or [Lane("standard", settings.sqs_queue_url, 1)]
+
+
+class LaneScheduler:
+    """
+    Order lanes for the next receive.
+
+    ``strict`` keeps priority order. ``weighted`` puts first the lane picked
+    by smooth weighted round robin, so that with every lane busy they are
+    served in proportion to their weights (a weight of 0 is only served when
+    the others are empty); the remaining lanes follow in priority order.
+    Under either policy, lanes that have not been polled for
+    *max_starve_seconds* move to the front, longest-waiting first.
+    """
+
+    def __init__(
+        self,
+        lanes: list[Lane],
+        policy: str = "weighted",
+        max_starve_seconds: float = 30.0,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.lanes = lanes
+        self._policy = policy
+        self._max_starve = max_starve_seconds
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._credit = {lane.name: 0 for lane in lanes}
+        now = clock()
+        self._checked = {lane.name: now for lane in lanes}
+
+    def order(self) -> list[Lane]:
+        with self._lock:
+            now = self._clock()
+            starved = sorted(
+                (lane for lane in self.lanes if now - self._checked[lane.name] > self._max_starve),
+                key=lambda lane: self._checked[lane.name],
+            )
+            ordered = list(self.lanes)
+            if self._policy == "weighted":
+                first = self._next_weighted()
+                ordered.remove(first)
+                ordered.insert(0, first)
+            return starved + [lane for lane in ordered if lane not in starved]
+
+    def _next_weighted(self) -> Lane:
+        total = sum(lane.weight for lane in self.lanes)
+        for lane in self.lanes:
+            self._credit[lane.name] += lane.weight
+        # max() keeps the first of equals, i.e. the higher-priority lane.
+        chosen = max(self.lanes, key=lambda lane: self._credit[lane.name])
+        self._credit[chosen.name] -= total
+        return chosen
+
+    def checked(self, lane: Lane) -> None:
+        """Record that *lane* was just polled, whether or not it had messages."""
+        with self._lock:
+            self._checked[lane.name] = self._clock()
+
+
+scheduler = LaneScheduler(
+    configured_lanes(), settings.lane_policy, settings.lane_max_starve_seconds
+)
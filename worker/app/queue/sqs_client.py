@@ -3,44 +3,126 @@
 from __future__ import annotations
 
 import json
+import time
+from collections.abc import Sequence
 
-import boto3
 from botocore.client import BaseClient
 
+from shared.aws import get_client
+from shared.iterutils import chunked
+
+from app.queue.lanes import Lane, scheduler
 from app.settings import settings
 
+# DeleteMessageBatch and ChangeMessageVisibilityBatch accept at most 10 entries.
+SQS_BATCH_LIMIT = 10
+
 
 def get_sqs_client() -> BaseClient:
-    kwargs: dict = {"region_name": settings.aws_region}
-    if settings.aws_endpoint_url:
-        kwargs["endpoint_url"] = settings.aws_endpoint_url
-    return boto3.client("sqs", **kwargs)
+    return get_client("sqs", settings)
 
 
-def receive_messages() -> list[dict]:
-    """Poll SQS and return a list of parsed message payloads with receipt handles."""
+def _receive(lane: Lane, wait_time_seconds: int, max_messages: int) -> list[dict]:
     client = get_sqs_client()
     response = client.receive_message(
-        QueueUrl=settings.sqs_queue_url,
-        MaxNumberOfMessages=settings.sqs_max_messages,
-        WaitTimeSeconds=settings.sqs_wait_time_seconds,
+        QueueUrl=lane.queue_url,
+        MaxNumberOfMessages=max_messages,
+        WaitTimeSeconds=wait_time_seconds,
+        VisibilityTimeout=settings.visibility_timeout_seconds,
         AttributeNames=["All"],
     )
+    scheduler.checked(lane)
+    received_at = time.time()
     messages = []
     for msg in response.get("Messages", []):
+        attributes = msg.get("Attributes", {})
+        sent_timestamp = attributes.get("SentTimestamp")
         messages.append(
             {
                 "receipt_handle": msg["ReceiptHandle"],
                 "body": json.loads(msg["Body"]),
+                "sent_at": int(sent_timestamp) / 1000 if sent_timestamp else None,
+                "received_at": received_at,
+                "receive_count": int(attributes.get("ApproximateReceiveCount", 1)),
+                "lane": lane.name,
+                "queue_url": lane.queue_url,
             }
         )
     return messages
 
 
-def delete_message(receipt_handle: str) -> None:
-    """Remove a successfully processed message from the queue."""
+def receive_messages(
+    wait_time_seconds: int | None = None,
+    max_messages: int | None = None,
+) -> list[dict]:
+    """
+    Poll SQS and return a list of parsed message payloads with receipt handles.
+
+    Each message also carries ``sent_at`` (the queue's ``SentTimestamp``) and
+    ``received_at``, both epoch seconds, from which queue wait is measured,
+    ``receive_count``, the number of times it has been delivered,
+    and the ``lane`` and ``queue_url`` it came from, to which it is acked.
+    *wait_time_seconds* and *max_messages* default to the configured values.
+
+    With several lanes, each is short-polled in the scheduler's order and the
+    first one with messages is returned; when all are empty the top lane is
+    long-polled for at most ``lane_idle_poll_seconds``.
+    """
+    wait = settings.sqs_wait_time_seconds if wait_time_seconds is None else wait_time_seconds
+    limit = max_messages or settings.sqs_max_messages
+    lanes = scheduler.lanes
+    if len(lanes) == 1:
+        return _receive(lanes[0], wait, limit)
+
+    for lane in scheduler.order():
+        if messages := _receive(lane, 0, limit):
+            return messages
+    if not wait:
+        return []
+    return _receive(lanes[0], min(wait, settings.lane_idle_poll_seconds), limit)
+
+
+def change_visibility(
+    receipt_handle: str, timeout_seconds: int, queue_url: str | None = None
+) -> None:
+    """Make a received message visible again after *timeout_seconds*."""
     client = get_sqs_client()
-    client.delete_message(
-        QueueUrl=settings.sqs_queue_url,
+    client.change_message_visibility(
+        QueueUrl=queue_url or settings.sqs_queue_url,
         ReceiptHandle=receipt_handle,
+        VisibilityTimeout=timeout_seconds,
     )
+
+
+def delete_messages(queue_url: str, receipt_handles: Sequence[str]) -> list[str]:
+    """Delete messages with DeleteMessageBatch; returns the handles that failed."""
+    client = get_sqs_client()
+    failed: list[str] = []
+    for chunk in chunked(receipt_handles, SQS_BATCH_LIMIT):
+        response = client.delete_message_batch(
+            QueueUrl=queue_url,
+            Entries=[{"Id": str(i), "ReceiptHandle": h} for i, h in enumerate(chunk)],
+        )
+        failed += [chunk[int(entry["Id"])] for entry in response.get("Failed", [])]
+    return failed
+
+
+def change_visibilities(
+    queue_url: str, receipt_handles: Sequence[str], timeout_seconds: int
+) -> list[str]:
+    """
+    Set the visibility timeout of many messages with ChangeMessageVisibilityBatch;
+    returns the handles that failed (e.g. messages deleted meanwhile).
+    """
+    client = get_sqs_client()
+    failed: list[str] = []
+    for chunk in chunked(receipt_handles, SQS_BATCH_LIMIT):
+        response = client.change_message_visibility_batch(
+            QueueUrl=queue_url,
+            Entries=[
+                {"Id": str(i), "ReceiptHandle": h, "VisibilityTimeout": timeout_seconds}
+                for i, h in enumerate(chunk)
+            ],
+        )
+        failed += [chunk[int(entry["Id"])] for entry in response.get("Failed", [])]
+    return failed
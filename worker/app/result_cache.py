@@ -0,0 +1,81 @@
+"""Content-addressed cache of finished results.
+
+A job's digest covers the decoded input pixels, the prompt and every setting
+that changes the generated output.  Results are indexed in S3 by small marker
+objects under ``results/{digest}`` that name the output key of the job that
+produced them; a job whose digest is already indexed is completed by pointing
+its record at that output, skipping segmentation and diffusion.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+from typing import Any
+
+from PIL import Image
+
+from app.settings import settings
+from app.storage.s3_client import object_exists, read_pointer, write_pointer
+
+RESULTS_PREFIX = "results/"
+
+# Bump to invalidate every cached result after a pipeline change that is not
+# captured by the settings below.
+CACHE_VERSION = 1
+
+
+def pipeline_params() -> dict[str, Any]:
+    """Settings that affect the generated output and so belong in the digest."""
+    return {
+        "version": CACHE_VERSION,
+        "model": settings.inpaint_model_id,
+        "backend": settings.inference_backend,
+        "resolution_mode": settings.resolution_mode,
+        "chroma_guide": [settings.chroma_guide_radius, settings.chroma_guide_eps],
+        "crop": [
+            settings.crop_to_mask,
+            settings.crop_padding,
+            settings.crop_max_coverage,
+            settings.crop_size_multiple,
+            settings.crop_min_side,
+            settings.crop_feather,
+        ],
+        "blend": [settings.postprocessor, settings.blend_feather, settings.blend_sharpen],
+    }
+
+
+def image_fingerprint(image: Image.Image) -> str:
+    """Hash the decoded pixels; computed once per job, whatever its styles."""
+    h = hashlib.blake2b(digest_size=32)
+    h.update(f"{image.mode}:{image.size[0]}x{image.size[1]}:".encode())
+    h.update(image.tobytes())
+    return h.hexdigest()
+
+
+def input_digest(fingerprint: str, prompt: str, quality: str) -> str:
+    """Combine an image fingerprint with the prompt, tier and pipeline parameters."""
+    header = {"image": fingerprint, "prompt": prompt, "quality": quality, **pipeline_params()}
+    return hashlib.blake2b(
+        json.dumps(header, sort_keys=True).encode(), digest_size=32
+    ).hexdigest()
+
+
+def pointer_key(digest: str) -> str:
+    return f"{RESULTS_PREFIX}{digest}"
+
+
+def lookup(digest: str) -> str | None:
+    """
+    Return the key of a cached result for *digest*, if there is one and the
+    output it points at still exists.
+    """
+    output_key = read_pointer(pointer_key(digest))
+    if output_key is None or not object_exists(output_key):
+        return None
+    return output_key
+
+
+def store(digest: str, output_key: str) -> None:
+    """Index *output_key* as the result for *digest*."""
+    write_pointer(pointer_key(digest), output_key)
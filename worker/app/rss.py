@@ -0,0 +1,72 @@
+"""Peak resident set size per job, from the kernel's high-water mark.
+
+Linux keeps a process's peak RSS as ``VmHWM`` in ``/proc/self/status`` and
+resets it when ``5`` is written to ``/proc/self/clear_refs``.  The mark is
+reset whenever a job starts while no other job is in flight, so the peak
+read when the job ends covers its whole lifetime.  With overlapping jobs
+(batched and pipelined modes) it is the process's peak over that time,
+shared by all of them.  Where the mark cannot be read or reset, the
+lifetime peak from ``getrusage`` is reported instead.
+"""
+
+from __future__ import annotations
+
+import resource
+import sys
+import threading
+from pathlib import Path
+
+_STATUS = Path("/proc/self/status")
+_CLEAR_REFS = Path("/proc/self/clear_refs")
+
+
+def _high_water_mark_kib() -> int | None:
+    try:
+        for line in _STATUS.read_text().splitlines():
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1])
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+
+def peak_rss_mb() -> int:
+    """Peak RSS in MiB since the last reset (or since the process started)."""
+    kib = _high_water_mark_kib()
+    if kib is None:
+        kib = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        if sys.platform == "darwin":  # reported in bytes there
+            kib //= 1024
+    return kib // 1024
+
+
+def _reset_high_water_mark() -> None:
+    try:
+        _CLEAR_REFS.write_text("5")
+    except OSError:
+        pass
+
+
+class PeakRSSTracker:
+    """Attribute the process's peak RSS to the jobs in flight."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._active: set[str] = set()
+
+    def job_started(self, job_id: str) -> None:
+        with self._lock:
+            if not self._active:
+                _reset_high_water_mark()
+            self._active.add(job_id)
+
+    def job_finished(self, job_id: str) -> int | None:
+        """The job's peak RSS in MiB, or None when it was not started here."""
+        with self._lock:
+            if job_id not in self._active:
+                return None
+            self._active.discard(job_id)
+            return peak_rss_mb()
+
+
+tracker = PeakRSSTracker()
@@ -1,5 +1,7 @@
 """Worker application settings loaded from environment variables."""
 
+from typing import Literal
+
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
@@ -11,20 +13,157 @@ class Settings(BaseSettings):
 
     # S3
     s3_bucket: str = "truetone-images"
+    # Outputs above this size are uploaded with parallel multipart upload
+    s3_multipart_threshold_mb: int = 16
+    s3_multipart_chunksize_mb: int = 8
 
     # DynamoDB
     dynamodb_jobs_table: str = "truetone-jobs"
 
-    # SQS
+    # SQS: sqs_queue_url is the "standard" lane
     sqs_queue_url: str = ""
     sqs_wait_time_seconds: int = 20
     sqs_max_messages: int = 1
 
+    # Priority lanes (see app/queue/lanes.py): the interactive and bulk
+    # queues are polled too when set. "weighted" shares receives between busy
+    # lanes by lane_weights, "strict" always takes the highest busy lane;
+    # either way a lane not looked at for lane_max_starve_seconds goes first.
+    # While every lane is empty the top lane is long-polled for
+    # lane_idle_poll_seconds at a time.
+    sqs_interactive_queue_url: str = ""
+    sqs_bulk_queue_url: str = ""
+    lane_policy: Literal["weighted", "strict"] = "weighted"
+    lane_weights: dict[str, int] = {"interactive": 6, "standard": 3, "bulk": 1}
+    lane_max_starve_seconds: float = 30.0
+    lane_idle_poll_seconds: int = 1
+
     # Optional LocalStack / custom endpoint for local dev
     aws_endpoint_url: str | None = None
 
+    # "memory" replaces S3, DynamoDB and SQS with in-process stand-ins shared
+    # with an API in the same process (see run_local.py)
+    aws_backend: Literal["boto3", "memory"] = "boto3"
+
+    # Shared boto3 client tuning (see shared/aws.py)
+    aws_max_pool_connections: int = 20
+    aws_connect_timeout: float = 5.0
+    aws_read_timeout: float = 60.0
+    aws_retry_mode: Literal["legacy", "standard", "adaptive"] = "standard"
+    aws_max_attempts: int = 3
+    aws_tcp_keepalive: bool = True
+
     # Diffusion model identifier (HuggingFace hub or local path)
     inpaint_model_id: str = "runwayml/stable-diffusion-inpainting"
 
+    # How the diffusion pipeline is executed: "eager" PyTorch, "compile"
+    # (torch.compile + channels_last), "bf16" autocast on CPUs with native
+    # bfloat16, or "onnx" (ONNX Runtime; the export is cached in onnx_cache_dir).
+    # Checked against the host when the worker starts.
+    inference_backend: Literal["eager", "compile", "bf16", "onnx"] = "eager"
+    onnx_cache_dir: str = "~/.cache/truetone/onnx"
+
+    # Memory budget of one worker process in MiB (0 = unbounded): RAM on CPU,
+    # VRAM on CUDA. Within a budget the pipeline slices attention and the VAE,
+    # tiles the VAE and offloads idle models to the CPU as the budget requires
+    # (see app/pipeline/budget.py), finishes one style at a time and caps
+    # input pixels. max_input_pixels sets the cap explicitly (0 = derived from
+    # the budget, or none without one); larger inputs are downscaled on decode.
+    memory_budget_mb: int = 0
+    max_input_pixels: int = 0
+
+    # "adaptive" generates at the model's pixel budget with the input's aspect
+    # ratio; "native" squashes every input to the model's native square. Either
+    # way chroma is upsampled to full size guided by the original luminance.
+    resolution_mode: Literal["native", "adaptive"] = "adaptive"
+    chroma_guide_radius: int = 4
+    chroma_guide_eps: float = 1e-3
+
+    # Generate only on the mask's bounding box (grown by crop_padding pixels and
+    # snapped to multiples of 8) unless it covers more than crop_max_coverage of
+    # the frame. Crop model sizes are rounded to crop_size_multiple so similar
+    # crops batch together; the result is pasted back over a crop_feather seam.
+    crop_to_mask: bool = True
+    crop_padding: int = 32
+    crop_max_coverage: float = 0.8
+    crop_size_multiple: int = 64
+    crop_min_side: int = 256
+    crop_feather: int = 16
+
+    # Blending of generated colour onto the original in LAB: "pil" is the
+    # reference, "numpy" a faster vectorised version on reused buffers that
+    # matches it to within rounding on photographs. Colour is applied under
+    # the segmentation mask feathered over blend_feather pixels.
+    postprocessor: Literal["pil", "numpy"] = "pil"
+    blend_feather: int = 8
+    blend_sharpen: bool = True
+
+    # Progressive previews: once preview_step_fraction of the denoising steps
+    # have run, the latents are approximated in RGB, blended onto a copy of the
+    # input scaled to preview_max_side and uploaded to previews/{job_id}.jpg.
+    previews_enabled: bool = True
+    preview_step_fraction: float = 0.3
+    preview_max_side: int = 512
+
+    # Text embeddings kept for prompts outside STYLE_PROMPTS (LRU)
+    prompt_embedding_cache_size: int = 64
+
+    # Prometheus /metrics sidecar port (0 disables it). Supervised children
+    # serve their own metrics on the following ports (metrics_port + 1..N).
+    metrics_port: int = 9100
+
+    # Reliable delivery (see app/queue/inflight.py): a heartbeat every
+    # heartbeat_interval_seconds keeps received messages invisible for another
+    # visibility_timeout_seconds and renews the job_lease_seconds lease of
+    # claimed jobs; acks are batched and sent within ack_max_delay_ms.
+    # worker_id names the lease holder (default: hostname-pid).
+    worker_id: str = ""
+    visibility_timeout_seconds: int = 120
+    heartbeat_interval_seconds: float = 30.0
+    job_lease_seconds: int = 120
+    ack_max_delay_ms: int = 200
+
+    # A job received before its record exists or its input was uploaded is
+    # handed back and retried after input_retry_delay_seconds, until
+    # input_wait_max_seconds after its creation (the upload URL's lifetime)
+    # when it fails (or, without a record, is discarded).
+    input_retry_delay_seconds: int = 2
+    input_wait_max_seconds: int = 3600
+
+    # A failed job stays on the queue and is retried on redelivery; its
+    # failure is final (and the message deleted) on its max_receive_count-th
+    # delivery.
+    max_receive_count: int = 5
+
+    # Skip generation for inputs already processed with the same parameters
+    result_cache_enabled: bool = True
+
+    # Processing loop: "serial" handles one job at a time, "batched" groups
+    # compatible jobs into a single generator call, "pipelined" additionally
+    # overlaps download/segmentation and upload with generation, "supervised"
+    # runs one pinned inference process per core group behind a single poller.
+    worker_mode: Literal["serial", "batched", "pipelined", "supervised"] = "serial"
+
+    # Micro-batching (batched and pipelined modes). batch_max_size also caps
+    # the styles of one job per generator call in every mode; within a memory
+    # budget each call renders a single row.
+    batch_max_size: int = 4
+    batch_max_wait_ms: int = 250
+
+    # Pipelined mode: thread pool sizes and in-flight limits
+    pipeline_download_workers: int = 4
+    pipeline_upload_workers: int = 2
+    pipeline_prefetch_jobs: int = 4
+    pipeline_max_pending_uploads: int = 4
+
+    # Supervised mode: the usable cores are split evenly between child
+    # processes (0 = one child per supervisor_threads_per_child cores), each
+    # pinned to its group with a matching torch thread count. A child holds at
+    # most supervisor_child_queue_depth jobs (one running, the rest staged).
+    supervisor_children: int = 0
+    supervisor_threads_per_child: int = 4
+    supervisor_child_queue_depth: int = 2
+    supervisor_restart_delay_seconds: float = 5.0
+
 
 settings = Settings()
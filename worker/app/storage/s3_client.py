@@ -2,28 +2,131 @@
 
 from __future__ import annotations
 
-from pathlib import Path
+import io
+import math
 
-import boto3
+from boto3.s3.transfer import TransferConfig
 from botocore.client import BaseClient
+from botocore.exceptions import ClientError
+from PIL import Image
+
+from shared.aws import get_client
 
 from app.settings import settings
 
 
 def get_s3_client() -> BaseClient:
-    kwargs: dict = {"region_name": settings.aws_region}
-    if settings.aws_endpoint_url:
-        kwargs["endpoint_url"] = settings.aws_endpoint_url
-    return boto3.client("s3", **kwargs)
+    return get_client("s3", settings)
+
+
+def download_object(key: str) -> bytes:
+    """Fetch the body of *key* with GetObject."""
+    client = get_s3_client()
+    response = client.get_object(Bucket=settings.s3_bucket, Key=key)
+    return response["Body"].read()
+
+
+def capped_size(size: tuple[int, int], max_pixels: int) -> tuple[int, int]:
+    """*size* scaled down, keeping its aspect ratio, to at most *max_pixels* (0 = no cap)."""
+    width, height = size
+    if max_pixels <= 0 or width * height <= max_pixels:
+        return size
+    scale = math.sqrt(max_pixels / (width * height))
+    return max(1, math.floor(width * scale)), max(1, math.floor(height * scale))
+
+
+def decode_image(data: bytes, max_pixels: int = 0) -> Image.Image:
+    """
+    Decode an encoded image held in memory, downscaled to at most
+    *max_pixels* pixels (0 = full size).
+
+    JPEGs over the cap are decoded in draft mode, straight at 1/2, 1/4 or
+    1/8 scale, so the full-size bitmap is never allocated.
+    """
+    # PIL needs a seekable stream; BytesIO wraps the payload without copying it.
+    image = Image.open(io.BytesIO(data))
+    target = capped_size(image.size, max_pixels)
+    if target != image.size:
+        image.draft(None, target)  # no-op for formats other than JPEG
+    image.load()
+    if target != image.size:
+        image = image.resize(target, Image.LANCZOS)
+    return image
+
 
+def encode_image(image: Image.Image, format: str = "JPEG") -> io.BytesIO:
+    """Encode *image* into an in-memory buffer positioned at its start."""
+    buffer = io.BytesIO()
+    image.save(buffer, format=format)
+    buffer.seek(0)
+    return buffer
 
-def download_image(key: str, local_path: Path) -> None:
-    """Download an S3 object to *local_path*."""
+
+def upload_buffer(buffer: io.BytesIO, key: str, format: str = "JPEG") -> None:
+    """
+    Upload an encoded image under *key*.
+
+    Small outputs go up in a single PutObject; outputs above the multipart
+    threshold use a parallel multipart upload.
+    """
+    size = buffer.getbuffer().nbytes
+    client = get_s3_client()
+    content_type = Image.MIME.get(format.upper(), "application/octet-stream")
+    threshold = settings.s3_multipart_threshold_mb * 1024 * 1024
+    if size < threshold:
+        client.put_object(
+            Bucket=settings.s3_bucket,
+            Key=key,
+            Body=buffer,
+            ContentType=content_type,
+        )
+        return
+
+    client.upload_fileobj(
+        buffer,
+        settings.s3_bucket,
+        key,
+        ExtraArgs={"ContentType": content_type},
+        Config=TransferConfig(
+            multipart_threshold=threshold,
+            multipart_chunksize=settings.s3_multipart_chunksize_mb * 1024 * 1024,
+        ),
+    )
+
+
+def write_image(image: Image.Image, key: str, format: str = "JPEG") -> None:
+    """Encode *image* into an in-memory buffer and upload it under *key*."""
+    upload_buffer(encode_image(image, format), key, format)
+
+
+def object_exists(key: str) -> bool:
+    """Return True when *key* exists in the bucket."""
     client = get_s3_client()
-    client.download_file(settings.s3_bucket, key, str(local_path))
+    try:
+        client.head_object(Bucket=settings.s3_bucket, Key=key)
+    except ClientError as exc:
+        if exc.response["Error"]["Code"] in ("404", "NoSuchKey", "NotFound"):
+            return False
+        raise
+    return True
 
 
-def upload_image(local_path: Path, key: str) -> None:
-    """Upload *local_path* to S3 under *key*."""
+def write_pointer(key: str, target_key: str) -> None:
+    """Write a small marker object under *key* whose body names *target_key*."""
     client = get_s3_client()
-    client.upload_file(str(local_path), settings.s3_bucket, key)
+    client.put_object(
+        Bucket=settings.s3_bucket,
+        Key=key,
+        Body=target_key.encode(),
+        ContentType="text/plain",
+    )
+
+
+def read_pointer(key: str) -> str | None:
+    """Return the key named by the marker under *key*, or None when there is none."""
+    try:
+        return download_object(key).decode()
+    except ClientError as exc:
+        if exc.response["Error"]["Code"] in ("404", "NoSuchKey", "NotFound"):
+            return None
+        raise
@@ -0,0 +1,389 @@
+"""Multi-process worker: one pinned inference process per group of cores.
+
+A single torch process does not scale across a many-core host, so in
+supervised mode the usable cores are split into groups and each group runs
+its own child process with its own pipeline, pinned to those cores with a
+matching torch thread count.
+
+The supervisor is the only SQS consumer.  It claims and downloads each job,
+then hands the decoded pixels to the least-loaded child through a
+shared-memory block – only a small descriptor crosses the process queue.
+Children run the remaining stages (cache check, segmentation, generation,
+upload, acknowledgement) and report back; until then the supervisor keeps
+the message's visibility and the job's lease alive.  A child that dies is
+restarted, and the messages it held become visible again after the SQS
+visibility timeout.
+"""
+
+from __future__ import annotations
+
+import contextlib
+import multiprocessing as mp
+import os
+import queue
+import threading
+import time
+from collections.abc import Callable, Iterator
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from multiprocessing import shared_memory
+from typing import Any
+
+import numpy as np
+from PIL import Image
+
+from shared.aws import clear_clients
+from shared.logging import get_logger
+
+from app.batching import SQS_RECEIVE_LIMIT
+from app.jobs import Job, fail_job, load_input, process
+from app.metrics import start_metrics_server
+from app.pipeline.interfaces import Generator, Postprocessor, Segmenter
+from app.queue.inflight import in_flight
+from app.queue.sqs_client import change_visibility, receive_messages
+from app.settings import settings
+
+try:
+    import torch
+    _torch_available = True
+except ImportError:  # pragma: no cover
+    _torch_available = False
+
+logger = get_logger(__name__)
+
+PipelineFactory = Callable[[], tuple[Segmenter, Generator, Postprocessor]]
+
+# Modes whose pixels round-trip through a uint8 array unchanged.
+_ARRAY_MODES = frozenset({"L", "RGB", "RGBA"})
+
+# Thread-pool variables read by torch/OpenMP/MKL when a child first imports them.
+_THREAD_ENV_VARS = ("OMP_NUM_THREADS", "MKL_NUM_THREADS")
+
+
+@dataclass(frozen=True)
+class ImageHandoff:
+    """Descriptor of decoded pixels published in a shared-memory block."""
+
+    name: str
+    shape: tuple[int, ...]
+
+    @classmethod
+    def publish(cls, image: Image.Image) -> tuple[ImageHandoff, shared_memory.SharedMemory]:
+        """Copy *image* into a new block; the caller owns (and unlinks) it."""
+        if image.mode not in _ARRAY_MODES:
+            image = image.convert("RGB")
+        pixels = np.asarray(image)
+        block = shared_memory.SharedMemory(create=True, size=max(1, pixels.nbytes))
+        np.ndarray(pixels.shape, dtype=np.uint8, buffer=block.buf)[...] = pixels
+        return cls(block.name, pixels.shape), block
+
+    def load(self) -> Image.Image:
+        """Copy the pixels out of the block into a new image."""
+        block = shared_memory.SharedMemory(name=self.name)
+        try:
+            pixels = np.array(np.ndarray(self.shape, dtype=np.uint8, buffer=block.buf))
+        finally:
+            block.close()
+        return Image.fromarray(pixels)
+
+
+def partition_cores(cores: list[int], children: int) -> list[list[int]]:
+    """Split *cores* into *children* contiguous groups of near-equal size."""
+    children = max(1, min(children, len(cores)))
+    size, extra = divmod(len(cores), children)
+    groups, start = [], 0
+    for i in range(children):
+        end = start + size + (1 if i < extra else 0)
+        groups.append(cores[start:end])
+        start = end
+    return groups
+
+
+def _usable_cores() -> list[int]:
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+@contextlib.contextmanager
+def _thread_env(threads: int) -> Iterator[None]:
+    """Temporarily set thread-pool sizes so a spawned child inherits them."""
+    saved = {name: os.environ.get(name) for name in _THREAD_ENV_VARS}
+    os.environ.update({name: str(threads) for name in _THREAD_ENV_VARS})
+    try:
+        yield
+    finally:
+        for name, value in saved.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+
+
+def _pin_to_cores(cores: list[int]) -> None:
+    if hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cores)
+    if _torch_available:
+        torch.set_num_threads(len(cores))
+        with contextlib.suppress(RuntimeError):  # already set by an earlier import
+            torch.set_num_interop_threads(1)
+
+
+def _child_main(
+    index: int,
+    cores: list[int],
+    build_pipeline: PipelineFactory,
+    inbox: mp.Queue,
+    events: mp.Queue,
+) -> None:
+    """Entry point of an inference child process."""
+    pid = os.getpid()
+    _pin_to_cores(cores)
+    clear_clients()  # never reuse connections inherited from the parent
+    start_metrics_server(offset=index + 1)
+    segmenter, generator, postprocessor = build_pipeline()
+    logger.info("Inference child %d (pid %d) ready on cores %s", index, pid, cores)
+    events.put((index, pid, "ready", None))
+
+    while (item := inbox.get()) is not None:
+        job, handoff = item
+        try:
+            job.image = handoff.load()
+        except Exception as exc:
+            fail_job(job, exc)
+            events.put((index, pid, "done", job.job_id))
+            continue
+        events.put((index, pid, "received", job.job_id))
+
+        try:
+            process(job, segmenter, generator, postprocessor)
+        except Exception as exc:
+            fail_job(job, exc)
+        events.put((index, pid, "done", job.job_id))
+
+
+@dataclass
+class _Child:
+    index: int
+    cores: list[int]
+    process: Any
+    inbox: mp.Queue
+    ready: bool = False
+    # Job ID -> shared-memory block, until the child has copied the pixels out
+    jobs: dict[str, shared_memory.SharedMemory | None] = field(default_factory=dict)
+    died_at: float | None = None
+
+
+class Supervisor:
+    """Poll SQS once and fan jobs out to pinned inference processes."""
+
+    def __init__(self, build_pipeline: PipelineFactory) -> None:
+        self._build_pipeline = build_pipeline
+        self._ctx = mp.get_context("spawn")
+        self._events: mp.Queue = self._ctx.Queue()
+
+        cores = _usable_cores()
+        children = settings.supervisor_children or max(
+            1, len(cores) // settings.supervisor_threads_per_child
+        )
+        self._children = [
+            self._spawn(index, group)
+            for index, group in enumerate(partition_cores(cores, children))
+        ]
+        self._depth = settings.supervisor_child_queue_depth
+        self._cond = threading.Condition()
+        self._stage_pool = ThreadPoolExecutor(
+            max_workers=settings.pipeline_download_workers,
+            thread_name_prefix="stage",
+        )
+
+    def _spawn(self, index: int, cores: list[int]) -> _Child:
+        inbox = self._ctx.Queue()
+        proc = self._ctx.Process(
+            target=_child_main,
+            args=(index, cores, self._build_pipeline, inbox, self._events),
+            name=f"inference-{index}",
+            daemon=True,
+        )
+        with _thread_env(len(cores)):
+            proc.start()
+        return _Child(index=index, cores=cores, process=proc, inbox=inbox)
+
+    # -- dispatch ---------------------------------------------------------
+
+    def _free_slots(self) -> int:
+        return sum(
+            self._depth - len(child.jobs) for child in self._children if child.ready
+        )
+
+    def _reserve(self, job_id: str) -> _Child | None:
+        """
+        Assign *job_id* to the least-loaded ready child (caller holds the
+        lock); None when no child is ready, e.g. the last one just died.
+        """
+        child = min(
+            (child for child in self._children if child.ready),
+            key=lambda c: len(c.jobs),
+            default=None,
+        )
+        if child is not None:
+            child.jobs[job_id] = None
+        return child
+
+    def _dispatch(self, msg: dict) -> None:
+        job = Job.from_message(msg)
+        with self._cond:
+            child = self._reserve(job.job_id)
+        if child is None:
+            logger.warning("No inference child is ready; handing job %s back", job.job_id)
+            _hand_back(msg)
+            return
+        try:
+            self._stage_pool.submit(self._stage, job, child)
+        except Exception:
+            with self._cond:
+                child.jobs.pop(job.job_id, None)
+                self._cond.notify_all()
+            raise
+
+    def _poll(self) -> None:
+        while True:
+            with self._cond:
+                while (free := self._free_slots()) <= 0:
+                    self._cond.wait()
+            try:
+                messages = receive_messages(max_messages=min(SQS_RECEIVE_LIMIT, free))
+            except Exception:
+                logger.exception("Error receiving messages from SQS – retrying in 5 s")
+                time.sleep(5)
+                continue
+
+            for msg in messages:
+                # One bad message must not stop the only poller.
+                try:
+                    self._dispatch(msg)
+                except Exception:
+                    logger.exception("Could not dispatch message; handing it back")
+                    _hand_back(msg)
+
+    def _stage(self, job: Job, child: _Child) -> None:
+        """Claim and download *job*, then hand its pixels to *child*."""
+        try:
+            load_input(job)
+            handoff, block = ImageHandoff.publish(job.image)
+        except Exception as exc:
+            fail_job(job, exc)
+            with self._cond:
+                child.jobs.pop(job.job_id, None)
+                self._cond.notify_all()
+            return
+
+        job.image = None  # the pixels travel through shared memory
+        with self._cond:
+            if child.died_at is not None or job.job_id not in child.jobs:
+                # The child died meanwhile; the message will be redelivered.
+                _release(block)
+                return
+            child.jobs[job.job_id] = block
+            child.inbox.put((job, handoff))
+
+    # -- bookkeeping ------------------------------------------------------
+
+    def _handle(self, index: int, pid: int, kind: str, job_id: str | None) -> None:
+        with self._cond:
+            child = self._children[index]
+            if child.process.pid != pid:
+                return  # stale event from a child that was restarted
+            if kind == "ready":
+                child.ready = True
+            elif kind == "received":
+                block = child.jobs.get(job_id)
+                if block is not None:
+                    _release(block)
+                    child.jobs[job_id] = None
+            elif kind == "done":
+                # The child acked (or released) the message itself.
+                in_flight.release_job(job_id)
+                block = child.jobs.pop(job_id, None)
+                if block is not None:
+                    _release(block)
+            self._cond.notify_all()
+
+    def _reap(self) -> None:
+        """Restart children that exited, after a short back-off."""
+        now = time.monotonic()
+        with self._cond:
+            for index, child in enumerate(self._children):
+                if child.died_at is None and not child.process.is_alive():
+                    logger.error(
+                        "Inference child %d exited with code %s; %d job(s) will be "
+                        "redelivered by SQS",
+                        index,
+                        child.process.exitcode,
+                        len(child.jobs),
+                    )
+                    child.died_at = now
+                    child.ready = False
+                    for job_id, block in child.jobs.items():
+                        in_flight.release_job(job_id)
+                        if block is not None:
+                            _release(block)
+                    child.jobs.clear()
+                elif (
+                    child.died_at is not None
+                    and now - child.died_at >= settings.supervisor_restart_delay_seconds
+                ):
+                    logger.info("Restarting inference child %d", index)
+                    self._children[index] = self._spawn(index, child.cores)
+
+    def run(self) -> None:
+        """Start the poller and supervise children from the calling thread."""
+        logger.info(
+            "Supervising %d inference process(es) on core groups %s",
+            len(self._children),
+            [child.cores for child in self._children],
+        )
+        threading.Thread(target=self._poll, name="poller", daemon=True).start()
+        try:
+            while True:
+                try:
+                    event = self._events.get(timeout=1.0)
+                except queue.Empty:
+                    pass
+                else:
+                    self._handle(*event)
+                self._reap()
+        finally:
+            self.shutdown()
+
+    def shutdown(self) -> None:
+        for child in self._children:
+            with contextlib.suppress(Exception):
+                child.inbox.put(None)
+        for child in self._children:
+            child.process.join(timeout=10)
+            if child.process.is_alive():
+                child.process.terminate()
+            for block in child.jobs.values():
+                if block is not None:
+                    _release(block)
+
+
+def _release(block: shared_memory.SharedMemory) -> None:
+    block.close()
+    with contextlib.suppress(FileNotFoundError):
+        block.unlink()
+
+
+def _hand_back(msg: dict) -> None:
+    """Stop tracking a received message and make it visible to any worker now."""
+    in_flight.release(msg["receipt_handle"])
+    try:
+        change_visibility(msg["receipt_handle"], 0, msg.get("queue_url"))
+    except Exception:
+        logger.exception("Could not hand back message; it reappears after its timeout")
+
+
+def run_supervised(build_pipeline: PipelineFactory) -> None:
+    """Run one pinned inference process per core group behind a single poller."""
+    Supervisor(build_pipeline).run()
@@ -3,98 +3,99 @@
 from __future__ import annotations
 
 import sys
-import tempfile
 import time
 from pathlib import Path
 
 sys.path.insert(0, str(Path(__file__).resolve().parents[2]))  # worker/ on PYTHONPATH
 
-from PIL import Image
-
 from shared.logging import get_logger
 
-from app.db.dynamo_jobs import update_job_status
-from app.pipeline.generator_diffusion_inpaint import DiffusionInpaintGenerator
-from app.pipeline.postprocess import BlendPostprocessor
-from app.pipeline.segmenter_mediapipe import MediaPipeSegmenter
-from app.pipeline.styles import get_prompt
-from app.queue.sqs_client import delete_message, receive_messages
+from app.batching import run_batched
+from app.jobs import Job, fail_job, process
+from app.metrics import start_metrics_server
+from app.pipeline.interfaces import Generator, Postprocessor, Segmenter
+from app.pipeline.postprocess import BlendPostprocessor, NumpyBlendPostprocessor
+from app.pipelined import run_pipelined
+from app.supervisor import PipelineFactory, run_supervised
+from app.queue.lanes import scheduler
+from app.queue.sqs_client import receive_messages
 from app.settings import settings
-from app.storage.s3_client import download_image, upload_image
 
 logger = get_logger(__name__)
 
 
-def process_job(
-    job_id: str,
-    input_key: str,
-    style: str,
-    segmenter: MediaPipeSegmenter,
-    generator: DiffusionInpaintGenerator,
-    postprocessor: BlendPostprocessor,
+def run_serial(
+    segmenter: Segmenter,
+    generator: Generator,
+    postprocessor: Postprocessor,
 ) -> None:
-    """Download, run the ML pipeline, upload the result, update job state."""
-    logger.info("Processing job %s (style=%s)", job_id, style)
-    update_job_status(job_id, status="processing")
+    """Polling loop that processes one job at a time."""
+    while True:
+        try:
+            messages = receive_messages()
+        except Exception:
+            logger.exception("Error receiving messages from SQS – retrying in 5 s")
+            time.sleep(5)
+            continue
 
-    with tempfile.TemporaryDirectory() as tmp:
-        tmp_path = Path(tmp)
-        input_path = tmp_path / "input.jpg"
-        output_path = tmp_path / "output.jpg"
+        for msg in messages:
+            # Process the job parsed from the message, so its quality tier
+            # and queue-wait timing are kept.
+            job = Job.from_message(msg)
+            try:
+                process(job, segmenter, generator, postprocessor)
+            except Exception as exc:
+                fail_job(job, exc)
 
-        download_image(input_key, input_path)
 
-        image = Image.open(input_path)
+def build_postprocessor() -> Postprocessor:
+    if settings.postprocessor == "pil":
+        return BlendPostprocessor(sharpen=settings.blend_sharpen, feather=settings.blend_feather)
+    return NumpyBlendPostprocessor(
+        sharpen=settings.blend_sharpen,
+        feather=settings.blend_feather,
+        keep_buffers=settings.memory_budget_mb <= 0,
+    )
 
-        mask = segmenter.segment(image)
-        prompt = get_prompt(style)
-        generated = generator.generate(image, mask, prompt)
-        result = postprocessor.process(image, generated)
 
-        result.save(str(output_path), format="JPEG")
+def build_pipeline() -> tuple[Segmenter, Generator, Postprocessor]:
+    """Initialise the ML pipeline components (once per process)."""
+    # Imported here so that stub pipelines run without torch or mediapipe.
+    from app.pipeline.generator_diffusion_inpaint import DiffusionInpaintGenerator
+    from app.pipeline.segmenter_mediapipe import MediaPipeSegmenter
 
-        output_key = f"outputs/{job_id}.jpg"
-        upload_image(output_path, output_key)
+    return MediaPipeSegmenter(), DiffusionInpaintGenerator(), build_postprocessor()
 
-    update_job_status(job_id, status="completed", output_key=output_key)
-    logger.info("Job %s completed – output at %s", job_id, output_key)
 
+def run(build: PipelineFactory = build_pipeline) -> None:
+    """
+    Main polling loop.
 
-def run() -> None:
-    """Main polling loop."""
+    *build* creates the pipeline components; benchmarks pass stubs here. In
+    supervised mode it runs in every child, so it must be picklable.
+    """
     logger.info(
-        "Worker started. Polling SQS queue: %s", settings.sqs_queue_url or "(not set)"
+        "Worker started (mode=%s, lanes=%s). Polling SQS: %s",
+        settings.worker_mode,
+        settings.lane_policy,
+        ", ".join(f"{lane.name}={lane.queue_url or '(not set)'}" for lane in scheduler.lanes),
     )
+    start_metrics_server()
 
-    # Initialise ML pipeline components once at startup to avoid per-job overhead.
-    segmenter = MediaPipeSegmenter()
-    generator = DiffusionInpaintGenerator()
-    postprocessor = BlendPostprocessor()
+    if settings.worker_mode == "supervised":
+        # Each child process builds its own pipeline after pinning its cores.
+        run_supervised(build)
+        return
 
-    while True:
-        try:
-            messages = receive_messages()
-        except Exception:
-            logger.exception("Error receiving messages from SQS – retrying in 5 s")
-            time.sleep(5)
-            continue
-
-        for msg in messages:
-            body = msg["body"]
-            job_id = body.get("job_id", "unknown")
-            try:
-                process_job(
-                    job_id=job_id,
-                    input_key=body["input_key"],
-                    style=body.get("style", "natural"),
-                    segmenter=segmenter,
-                    generator=generator,
-                    postprocessor=postprocessor,
-                )
-                delete_message(msg["receipt_handle"])
-            except Exception as exc:
-                logger.exception("Failed to process job %s", job_id)
-                update_job_status(job_id, status="failed", error=str(exc))
+    # Initialise ML pipeline components once at startup to avoid per-job overhead.
+    segmenter, generator, postprocessor = build()
+
+    if settings.worker_mode == "batched":
+        run_batched(segmenter, generator, postprocessor)
+    elif settings.worker_mode == "pipelined":
+        run_pipelined(segmenter, generator, postprocessor)
+    else:
+        run_serial(segmenter, generator, postprocessor)
 
 
 if __name__ == "__main__":